@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Состояние отправленных уведомлений для подавления повторов.
+
+Для каждого получателя хранится снимок последнего отправленного анализа
+остатков, его отпечаток (sha256) и время отправки. Неизменившийся отчет
+повторно не отправляется, пока не пройдет ALERT_RENOTIFY_MINUTES с
+последнего полного отчета; при изменениях отправляется короткая сводка:
+новые проблемы, устраненные проблемы и изменение минимального остатка.
+
+В режиме ALERT_EDIT_IN_PLACE хранятся и message_id последнего отчета в
+чате: отчет обновляется на месте, а новое сообщение отправляется только
+при росте серьезности (escalated).
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from config import ALERT_CONFIG
+
+KIND_TITLES = {
+    'negative': "отрицательный остаток",
+    'threatening': "угрожающий остаток",
+}
+
+# Серьезность проблемы счета: отрицательный остаток хуже угрожающего
+SEVERITY = {
+    'threatening': 1,
+    'negative': 2,
+}
+
+
+def build_snapshot(analysis_result):
+    """
+    Снимок результата analyze_all_accounts_balances() в виде, пригодном для JSON:
+    {'negative': {account_id: {'name', 'intervals'}}, 'threatening': {...}}
+    """
+    accounts_info = analysis_result['accounts_info']
+    snapshot = {}
+    for kind, key in (('negative', 'negative_balances'), ('threatening', 'threatening_balances')):
+        snapshot[kind] = {
+            str(account_id): {
+                'name': accounts_info.get(account_id, {}).get('name', str(account_id)),
+                'intervals': [list(interval) for interval in intervals],
+            }
+            for account_id, intervals in analysis_result[key].items()
+        }
+    return snapshot
+
+
+def snapshot_fingerprint(snapshot):
+    """Отпечаток снимка (не зависит от порядка счетов)"""
+    canonical = json.dumps(snapshot, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def has_problems(snapshot):
+    return bool(snapshot and (snapshot.get('negative') or snapshot.get('threatening')))
+
+
+def worst_point(intervals):
+    """(минимальный остаток, дата) по всем интервалам счета"""
+    _, _, min_balance, min_date = min(intervals, key=lambda interval: interval[2])
+    return min_balance, min_date
+
+
+def account_severity(snapshot):
+    """{account_id: серьезность} - худшая проблема каждого счета в снимке"""
+    severity = {}
+    for kind, rank in SEVERITY.items():
+        for account_id in (snapshot or {}).get(kind, {}):
+            severity[account_id] = max(severity.get(account_id, 0), rank)
+    return severity
+
+
+def escalated(previous, current):
+    """Стало ли хуже: новый проблемный счет или угрожающий остаток стал отрицательным"""
+    before = account_severity(previous)
+    return any(rank > before.get(account_id, 0) for account_id, rank in account_severity(current).items())
+
+
+def diff_snapshots(previous, current):
+    """
+    Изменения между снимками.
+
+    Returns:
+        dict: {'new': [...], 'resolved': [...], 'changed': [...]} -
+              элементы (kind, name, current_entry, previous_entry)
+    """
+    diff = {'new': [], 'resolved': [], 'changed': []}
+    previous = previous or {}
+    for kind in KIND_TITLES:
+        before = previous.get(kind, {})
+        after = current.get(kind, {})
+        for account_id, entry in after.items():
+            if account_id not in before:
+                diff['new'].append((kind, entry['name'], entry, None))
+            elif entry['intervals'] != before[account_id]['intervals']:
+                diff['changed'].append((kind, entry['name'], entry, before[account_id]))
+        for account_id, entry in before.items():
+            if account_id not in after:
+                diff['resolved'].append((kind, entry['name'], None, entry))
+    return diff
+
+
+def format_diff_message(diff):
+    """Короткое сообщение об изменениях с прошлого уведомления"""
+    message = "🔄 <b>Изменения в остатках счетов</b>\n\n"
+    if diff['new']:
+        message += "🆕 <b>Новые проблемы:</b>\n"
+        for kind, name, entry, _ in diff['new']:
+            min_balance, min_date = worst_point(entry['intervals'])
+            first_start = entry['intervals'][0][0]
+            message += f"   • {name}: {KIND_TITLES[kind]} с {first_start}, минимум {min_balance:,.0f} р. ({min_date})\n"
+        message += "\n"
+    if diff['changed']:
+        message += "📊 <b>Изменилось:</b>\n"
+        for kind, name, entry, previous_entry in diff['changed']:
+            min_balance, min_date = worst_point(entry['intervals'])
+            previous_min, _ = worst_point(previous_entry['intervals'])
+            if round(min_balance) != round(previous_min):
+                arrow = "📉" if min_balance < previous_min else "📈"
+                message += (f"   • {arrow} {name} ({KIND_TITLES[kind]}): минимум {previous_min:,.0f} → "
+                            f"{min_balance:,.0f} р. ({min_date})\n")
+            else:
+                message += f"   • {name} ({KIND_TITLES[kind]}): изменились периоды, минимум {min_balance:,.0f} р.\n"
+        message += "\n"
+    if diff['resolved']:
+        message += "✅ <b>Устранено:</b>\n"
+        for kind, name, _, _ in diff['resolved']:
+            message += f"   • {name}: {KIND_TITLES[kind]}\n"
+        message += "\n"
+    return message.rstrip("\n")
+
+
+class AlertState:
+    """Последние отправленные снимки по получателям (JSON файл)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.recipients = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.recipients = json.load(f).get('recipients', {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Не удалось прочитать состояние уведомлений {self.path}: {e}")
+
+    @classmethod
+    def for_label(cls, label):
+        """Состояние для бота/бизнеса label (файл alert_state_<label>.json)"""
+        return cls(Path(ALERT_CONFIG['state_dir']) / f"alert_state_{label}.json")
+
+    def get(self, chat_id):
+        return self.recipients.get(str(chat_id))
+
+    def is_renotify_due(self, chat_id, now=None):
+        """Прошел ли интервал повтора с последнего полного отчета (или отправок не было)"""
+        entry = self.get(chat_id)
+        if entry is None:
+            return True
+        now = now or datetime.now()
+        renotify = timedelta(minutes=ALERT_CONFIG['renotify_minutes'])
+        return now - datetime.fromisoformat(entry.get('full_sent_at', entry['sent_at'])) >= renotify
+
+    def record(self, chat_id, snapshot, fingerprint, now=None, message_ids=None, edited=False, full=True):
+        """
+        Запомнить отправленный получателю снимок.
+
+        message_ids - сообщения отчета в чате (для редактирования на месте);
+        при edited=True время отправки не меняется: интервал повтора
+        считается от последнего нового сообщения. full=False - отправлена
+        только сводка изменений: время полного отчета (full_sent_at), от
+        которого считается интервал повтора, не меняется.
+        """
+        now = (now or datetime.now()).isoformat(timespec='seconds')
+        previous = self.get(chat_id)
+        if (full and not edited) or not previous:
+            full_sent_at = now
+        else:
+            full_sent_at = previous.get('full_sent_at', previous['sent_at'])
+        entry = {
+            'fingerprint': fingerprint,
+            'snapshot': snapshot,
+            'sent_at': previous['sent_at'] if edited and previous else now,
+            'full_sent_at': full_sent_at,
+        }
+        if message_ids:
+            entry['message_ids'] = message_ids
+        if edited:
+            entry['edited_at'] = now
+        self.recipients[str(chat_id)] = entry
+
+    def save(self):
+        """Атомарно записать состояние (temp + rename)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'recipients': self.recipients}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
@@ -4,96 +4,396 @@
 Функции для работы с API Finolog и расчетов
 """
 
-import urllib.request
-import urllib.parse
-import json
+import http.client
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from config import FINOLOG_CONFIG, THREATENING_CONFIG
+from config import FINOLOG_CONFIG, THREATENING_CONFIG, FETCH_CONFIG, ANALYSIS_CONFIG
+from balance_engine import (
+    numpy_available,
+    build_balance_matrix,
+    find_breach_intervals,
+    compare_with_reference,
+    BreachIntervalBuilder,
+    total_interval_days
+)
+from http_client import get_shared_client
+from rate_limiter import AdaptiveTokenBucket, backoff_delay
+from compact_transactions import build_compact_index, compact_breach_intervals
+from forecast_cache import ForecastCache, account_input_key
+from fetch_planner import FetchStats, plan_shards, tune_pagesize
+
+# Коды ответа, после которых запрос имеет смысл повторить
+_RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Сетевые ошибки (таймауты, разрывы соединения, битый gzip)
+_NETWORK_ERRORS = (OSError, http.client.HTTPException, EOFError)
+
+# Общий на процесс лимит запросов к Finolog: его делят все потоки загрузки страниц
+_request_bucket = AdaptiveTokenBucket(FETCH_CONFIG['rate'])
+
+# Число повторов запросов к Finolog за процесс (для метрики finolog_retries)
+_retry_count = 0
+_retry_lock = threading.Lock()
+
+
+def finolog_retry_count():
+    """Сколько раз make_request повторял запрос с начала процесса"""
+    return _retry_count
+
+
+class FinologRequestError(Exception):
+    """Запрос к Finolog не удался (в том числе после всех повторов)"""
+
+    def __init__(self, url, reason, status=None):
+        super().__init__(f"{reason}: {url}")
+        self.url = url
+        self.reason = reason
+        self.status = status
+
 
 def make_request(url, timeout=30):
-    """Выполнить API запрос к Finolog с таймаутом"""
-    # Пауза 3 секунды перед каждым запросом
-    #time.sleep(1)
+    """
+    Выполнить API запрос к Finolog с ограничением частоты и повторами.
     
-    try:
-        req = urllib.request.Request(url)
-        req.add_header('Api-Token', FINOLOG_CONFIG['api_key'])
+    Перед каждой попыткой берется токен из общего _request_bucket. Ответы 429
+    и 5xx, таймауты и сетевые ошибки повторяются до FETCH_CONFIG['max_retries']
+    раз с экспоненциальной паузой и разбросом; Retry-After соблюдается, а 429
+    дополнительно снижает частоту запросов для всех потоков.
+    
+    Returns:
+        разобранный JSON ответа
+    
+    Raises:
+        FinologRequestError: ошибка 4xx, некорректный JSON или исчерпаны повторы
+    """
+    global _retry_count
+    max_retries = FETCH_CONFIG['max_retries']
+    for attempt in range(max_retries + 1):
+        _request_bucket.acquire()
+        status = None
+        retry_after = None
+        try:
+            response = get_shared_client().get(
+                url,
+                headers={'Api-Token': FINOLOG_CONFIG['api_key']},
+                timeout=timeout
+            )
+        except _NETWORK_ERRORS as e:
+            reason = f"{type(e).__name__}: {e}"
+        else:
+            status = response.status
+            if status < 400:
+                _request_bucket.on_success()
+                try:
+                    return response.json()
+                except ValueError as e:
+                    raise FinologRequestError(url, f"некорректный JSON в ответе: {e}", status) from e
+            reason = f"HTTP {status}"
+            if status not in _RETRYABLE_STATUSES:
+                raise FinologRequestError(url, reason, status)
+            retry_after = response.retry_after()
+        
+        if attempt == max_retries:
+            raise FinologRequestError(url, f"{reason} (попыток: {attempt + 1})", status)
+        if retry_after is not None and retry_after > FETCH_CONFIG['max_retry_wait']:
+            raise FinologRequestError(url, f"{reason}, Retry-After {retry_after:.0f} с", status)
         
-        with urllib.request.urlopen(req, timeout=timeout) as response:
-            return json.loads(response.read().decode('utf-8'))
-    except Exception as e:
-        print(f"Ошибка API запроса: {e}")
-        return None
+        delay = retry_after if retry_after is not None else backoff_delay(attempt, FETCH_CONFIG['backoff_base'])
+        with _retry_lock:
+            _retry_count += 1
+        print(f"⚠️ Ошибка API запроса ({reason}), повтор через {delay:.1f} с")
+        if status == 429:
+            # Притормаживаем все потоки, а не только текущий
+            _request_bucket.on_throttled(delay)
+        else:
+            time.sleep(delay)
 
 
-def get_all_transactions_for_all_accounts(account_ids, start_date):
-    """Получить все транзакции для нескольких счетов одним запросом"""
-    # Диапазон дат на год вперед от указанной даты
+def iter_transaction_pages(base_url, pagesize=None, max_workers=None):
+    """
+    Последовательно отдает страницы транзакций по запросу base_url.
+    
+    При max_workers > 1 страницы запрашиваются параллельно: в работе всегда
+    держится до max_workers следующих страниц, а результаты отдаются строго
+    по порядку номеров. Остановка та же, что и в последовательном режиме:
+    пустая страница либо страница короче pagesize.
+    Лишние запросы за концом выборки отменяются или отбрасываются.
+    
+    Неудачная страница не считается концом выборки: FinologRequestError
+    пробрасывается, чтобы прогноз не строился по неполным данным.
+    
+    Args:
+        base_url: URL запроса без параметров page и pagesize
+        pagesize: размер страницы (по умолчанию FETCH_CONFIG['pagesize'])
+        max_workers: число параллельных запросов (по умолчанию FETCH_CONFIG['max_workers'])
+    
+    Yields:
+        list: транзакции очередной страницы
+    """
+    if pagesize is None:
+        pagesize = FETCH_CONFIG['pagesize']
+    if max_workers is None:
+        max_workers = FETCH_CONFIG['max_workers']
+    
+    def fetch_page(page):
+        url = f"{base_url}&page={page}&pagesize={pagesize}"
+        page_transactions = make_request(url)
+        if not isinstance(page_transactions, list):
+            raise FinologRequestError(url, "ожидался список транзакций")
+        return page_transactions
+    
+    if max_workers <= 1:
+        page = 1
+        while True:
+            page_transactions = fetch_page(page)
+            if not page_transactions:
+                return
+            yield page_transactions
+            # Если получили меньше транзакций чем pagesize, значит это последняя страница
+            if len(page_transactions) < pagesize:
+                return
+            page += 1
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+        next_page = 1
+        current_page = 1
+        try:
+            while True:
+                # Держим очередь из max_workers запросов наперед
+                while len(in_flight) < max_workers:
+                    in_flight[next_page] = executor.submit(fetch_page, next_page)
+                    next_page += 1
+                
+                page_transactions = in_flight.pop(current_page).result()
+                if not page_transactions:
+                    return
+                yield page_transactions
+                if len(page_transactions) < pagesize:
+                    return
+                current_page += 1
+        finally:
+            for future in in_flight.values():
+                future.cancel()
+
+
+def is_counted_transaction(tx):
+    """
+    Учитывается ли транзакция в расчете остатков.
+    
+    Включаем только:
+    1. Неразбитые операции (split_id = null, is_splitted = false)
+    2. Суммирующие операции (is_splitted = true)
+    Исключаем части разбитых операций (split_id ≠ null, is_splitted = false)
+    """
+    is_splitted = tx.get('is_splitted', False)
+    split_id = tx.get('split_id')
+    return (split_id is None and not is_splitted) or is_splitted
+
+
+def _planned_transactions_url(account_ids, date_from, date_to):
+    """URL запроса плановых транзакций счетов без параметров page и pagesize"""
+    # Объединяем ID счетов через запятую
+    account_ids_str = ','.join(map(str, account_ids))
+    
+    return f"{FINOLOG_CONFIG['base_url']}/biz/{FINOLOG_CONFIG['biz_id']}/transaction?account_ids={account_ids_str}&date={date_from}%2C{date_to}&status=planned&with_splitted=false&without_closed_accounts=false"
+
+
+def iter_planned_transactions(account_ids, date_from, date_to, pagesize=None):
+    """
+    Генератор учитываемых плановых транзакций счетов за диапазон дат (включительно).
+    
+    Каждая страница фильтруется сразу по мере загрузки, без накопления
+    промежуточных списков; транзакции отдаются в порядке API.
+    
+    Args:
+        account_ids: список ID счетов
+        date_from: начальная дата "YYYY-MM-DD"
+        date_to: конечная дата "YYYY-MM-DD"
+        pagesize: размер страницы (по умолчанию FETCH_CONFIG['pagesize'])
+    
+    Yields:
+        dict: транзакция, прошедшая is_counted_transaction()
+    """
+    base_url = _planned_transactions_url(account_ids, date_from, date_to)
+    
+    for page_transactions in iter_transaction_pages(base_url, pagesize=pagesize):
+        # Фильтруем транзакции по типу операции
+        for tx in page_transactions:
+            if is_counted_transaction(tx):
+                yield tx
+
+
+def get_planned_transactions_range(account_ids, date_from, date_to, pagesize=None):
+    """
+    Получить плановые транзакции счетов за диапазон дат (включительно).
+    
+    Returns:
+        list: учитываемые транзакции (см. is_counted_transaction) в порядке API
+    """
+    return list(iter_planned_transactions(account_ids, date_from, date_to, pagesize))
+
+
+def group_transactions_by_account(transactions):
+    """Сгруппировать транзакции по account_id с сохранением порядка"""
+    transactions_by_account = {}
+    for tx in transactions:
+        account_id = tx.get('account_id')
+        if account_id not in transactions_by_account:
+            transactions_by_account[account_id] = []
+        transactions_by_account[account_id].append(tx)
+    return transactions_by_account
+
+
+def get_transactions_window(start_date):
+    """Диапазон дат загрузки транзакций: год назад и год вперед от start_date"""
     try:
         start_dt = datetime.strptime(str(start_date), "%Y-%m-%d")
     except ValueError as exc:
         raise ValueError("start_date must be in 'YYYY-MM-DD' format") from exc
 
     start_dt_in_past = start_dt - timedelta(days=365)
-    start_date_in_past = start_dt_in_past.strftime("%Y-%m-%d")
     end_dt = start_dt + timedelta(days=365)
-    end_date = end_dt.strftime("%Y-%m-%d")
+    return start_dt_in_past.strftime("%Y-%m-%d"), end_dt.strftime("%Y-%m-%d")
+
+
+def iter_sharded_transactions(account_ids, date_from, date_to):
+    """
+    Загрузка транзакций группами счетов (см. fetch_planner.py).
     
-    # Объединяем ID счетов через запятую
-    account_ids_str = ','.join(map(str, account_ids))
+    Группы загружаются параллельно (FETCH_CONFIG['shard_workers']), каждая
+    отдельным запросом с подобранным pagesize. Страницы групп передаются
+    через ограниченную очередь и отдаются по мере прихода, поэтому в памяти
+    держится несколько страниц, а не группа целиком. Страницы одной группы
+    идут по порядку, а каждый счет входит ровно в одну группу, поэтому
+    транзакции счета идут в том же порядке, что и в общем запросе.
+    После успешной загрузки обновляется статистика для следующего плана.
+    
+    Yields:
+        tuple: (account_id, transaction)
+    """
+    stats = FetchStats.for_business()
+    shards = plan_shards(account_ids, stats.counts)
+    pagesize = tune_pagesize(stats.bytes_per_transaction)
+    print(f"📦 Загрузка транзакций: {len(shards)} групп счетов, pagesize {pagesize}")
     
-    all_transactions = []
-    page = 1
-    pagesize = 200  # Максимальный размер страницы
+    counts = {account_id: 0 for account_id in account_ids}
+    response_bytes = [0]
+    lock = threading.Lock()
     
-    while True:
-        # Запрос транзакций для всех счетов одним запросом
-        url = f"{FINOLOG_CONFIG['base_url']}/biz/{FINOLOG_CONFIG['biz_id']}/transaction?account_ids={account_ids_str}&date={start_date_in_past}%2C{end_date}&status=planned&with_splitted=false&without_closed_accounts=false&page={page}&pagesize={pagesize}"
-        
-        page_transactions = make_request(url)
-        
-        if not page_transactions:
-            break
-            
-        all_transactions.extend(page_transactions)
-        
-        # Если получили меньше транзакций чем pagesize, значит это последняя страница
-        if len(page_transactions) < pagesize:
-            break
-            
-        page += 1
-    
-    if not all_transactions:
-        return {}
-    
-    # Фильтруем транзакции по типу операции
-    filtered_transactions = []
-    for tx in all_transactions:
-        is_splitted = tx.get('is_splitted', False)
-        split_id = tx.get('split_id')
-        
-        # Включаем только:
-        # 1. Неразбитые операции (split_id = null, is_splitted = false)
-        # 2. Суммирующие операции (is_splitted = true)
-        # Исключаем части разбитых операций (split_id ≠ null, is_splitted = false)
-        if (split_id is None and not is_splitted) or is_splitted:
-            filtered_transactions.append(tx)
-    
-    # Группируем транзакции по счетам
+    def on_response(response):
+        if response.path.endswith('/transaction'):
+            with lock:
+                response_bytes[0] += len(response.body)
+    
+    max_workers = max(1, min(FETCH_CONFIG['shard_workers'], len(shards)))
+    # Страница транзакций, None (группа загружена) или исключение загрузки
+    pages = queue.Queue(maxsize=max_workers)
+    stop = threading.Event()
+    
+    def put(item):
+        # Потребитель мог прекратить чтение - тогда не ждем место в очереди вечно
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def fetch_shard(ids):
+        try:
+            for page_transactions in iter_transaction_pages(_planned_transactions_url(ids, date_from, date_to),
+                                                            pagesize=pagesize):
+                if not put(page_transactions):
+                    return
+            put(None)
+        except Exception as e:
+            put(e)
+    
+    client = get_shared_client()
+    client.add_listener(on_response)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for ids, _ in shards:
+            executor.submit(fetch_shard, ids)
+        remaining = len(shards)
+        while remaining:
+            page_transactions = pages.get()
+            if page_transactions is None:
+                remaining -= 1
+                continue
+            if isinstance(page_transactions, Exception):
+                raise page_transactions
+            for tx in page_transactions:
+                if not is_counted_transaction(tx):
+                    continue
+                account_id = tx.get('account_id')
+                counts[account_id] = counts.get(account_id, 0) + 1
+                yield account_id, tx
+    finally:
+        stop.set()
+        client.remove_listener(on_response)
+        executor.shutdown(wait=True, cancel_futures=True)
+    
+    stats.update(counts, response_bytes[0], sum(counts.values()))
+    try:
+        stats.save()
+    except OSError as e:
+        print(f"⚠️ Не удалось сохранить статистику загрузки: {e}")
+
+
+def iter_transactions_for_all_accounts(account_ids, start_date):
+    """
+    Потоковая загрузка транзакций всех счетов: (account_id, transaction) по мере
+    прихода страниц. Позволяет начинать расчет до загрузки последней страницы.
+    При FETCH_CONFIG['sharding'] счета загружаются группами (iter_sharded_transactions).
+    """
+    # Диапазон дат на год вперед от указанной даты
+    start_date_in_past, end_date = get_transactions_window(start_date)
+    
+    if FETCH_CONFIG['sharding'] and len(account_ids) > 1:
+        yield from iter_sharded_transactions(account_ids, start_date_in_past, end_date)
+        return
+    
+    for tx in iter_planned_transactions(account_ids, start_date_in_past, end_date):
+        yield tx.get('account_id'), tx
+
+
+def get_all_transactions_for_all_accounts(account_ids, start_date, on_transaction=None):
+    """
+    Получить все транзакции для нескольких счетов одним запросом
+    
+    Args:
+        account_ids: список ID счетов
+        start_date: дата "YYYY-MM-DD", от которой берется год назад и год вперед
+        on_transaction: необязательный callback(account_id, transaction),
+                        вызывается для каждой транзакции сразу после загрузки страницы
+    
+    Returns:
+        dict: {account_id: [transaction, ...]}
+    """
+    # Группируем транзакции по счетам по мере загрузки
     transactions_by_account = {}
-    for tx in filtered_transactions:
-        account_id = tx.get('account_id')
+    for account_id, tx in iter_transactions_for_all_accounts(account_ids, start_date):
         if account_id not in transactions_by_account:
             transactions_by_account[account_id] = []
         transactions_by_account[account_id].append(tx)
+        if on_transaction is not None:
+            on_transaction(account_id, tx)
     
     return transactions_by_account
 
 def get_all_accounts():
-    """Получить список всех счетов"""
+    """Получить список всех счетов (FinologRequestError, если запрос не удался)"""
     url = f"{FINOLOG_CONFIG['base_url']}/biz/{FINOLOG_CONFIG['biz_id']}/account"
-    return make_request(url, timeout=30)
+    accounts = make_request(url, timeout=30)
+    if not isinstance(accounts, list):
+        raise FinologRequestError(url, "ожидался список счетов")
+    return accounts
 
 def get_current_balances(accounts):
     """
@@ -171,7 +471,101 @@ def calculate_daily_balances(current_balance, planned_transactions, start_date,
     
     return daily_balances
 
-def analyze_all_accounts_balances(transactions_by_account, accounts, current_balances):
+def _find_breach_intervals(daily_balances, threatening_threshold, check_threatening):
+    """
+    Найти интервалы отрицательных (balance < 0) и угрожающих (0 < balance < threshold)
+    остатков за один проход по результату calculate_daily_balances().
+    
+    Returns:
+        tuple: (negative_intervals, threatening_intervals) -
+               списки [(start_date, end_date, min_balance, min_date), ...]
+    """
+    negative = BreachIntervalBuilder()
+    threatening = BreachIntervalBuilder()
+    for date_str, balance in daily_balances.items():
+        # Форматируем дату для вывода
+        formatted_date = date_str[:10]
+        negative.add(formatted_date, balance, balance < 0)
+        if check_threatening:
+            threatening.add(formatted_date, balance, 0 < balance < threatening_threshold)
+    return negative.finish(), threatening.finish()
+
+
+def _resolve_balance_engine():
+    """Выбрать движок расчета остатков по ANALYSIS_CONFIG['engine']"""
+    engine = ANALYSIS_CONFIG['engine']
+    if engine == 'auto':
+        return 'numpy' if numpy_available() else 'python'
+    if engine in ('numpy', 'verify') and not numpy_available():
+        print("⚠️ NumPy не установлен - используем расчет остатков на чистом Python")
+        return 'python'
+    return engine
+
+
+def _compute_breaches(engine, account_rows, current_date, days_ahead, threatening_threshold,
+                      threatening_account_ids, accumulator=None, compact_index=None):
+    """
+    Интервалы отрицательных и угрожающих остатков для строк
+    (account_id, name, current_balance, year_transactions) выбранным движком.
+    
+    Returns:
+        list: [(negative_intervals, threatening_intervals), ...] в порядке account_rows
+    """
+    if engine == 'compact':
+        # Целочисленный расчет в копейках по компактным массивам
+        breaches = [
+            compact_breach_intervals(
+                compact_index.get(int(account_id)), current_balance, current_date, days_ahead,
+                threatening_threshold, account_id in threatening_account_ids
+            )
+            for account_id, _, current_balance, _ in account_rows
+        ]
+    elif engine == 'stream':
+        # Дневные изменения уже накоплены во время загрузки страниц
+        breaches = [
+            accumulator.breach_intervals(
+                int(account_id), current_balance, threatening_threshold,
+                account_id in threatening_account_ids
+            )
+            for account_id, _, current_balance, _ in account_rows
+        ]
+    elif engine == 'python':
+        # Эталонный расчет: ежедневные остатки по каждому счету отдельно
+        breaches = []
+        for account_id, _, current_balance, year_transactions in account_rows:
+            daily_balances = calculate_daily_balances(
+                current_balance=current_balance,
+                planned_transactions=year_transactions,
+                start_date=current_date,
+                days_ahead=days_ahead
+            )
+            breaches.append(_find_breach_intervals(
+                daily_balances, threatening_threshold, account_id in threatening_account_ids
+            ))
+    else:
+        # Векторный расчет: одна матрица счета × дни для всех счетов
+        balance_matrix = build_balance_matrix(
+            [row[2] for row in account_rows],
+            [row[3] for row in account_rows],
+            current_date,
+            days_ahead
+        )
+        threatening_rows = {
+            index for index, row in enumerate(account_rows) if row[0] in threatening_account_ids
+        }
+        breaches = find_breach_intervals(balance_matrix, current_date, threatening_threshold, threatening_rows)
+        
+        if engine == 'verify':
+            for index, (account_id, account_name, current_balance, year_transactions) in enumerate(account_rows):
+                reference = calculate_daily_balances(current_balance, year_transactions, current_date, days_ahead)
+                mismatches = compare_with_reference(balance_matrix[index], reference)
+                if mismatches:
+                    print(f"❌ Расхождение движков в {account_name}: {len(mismatches)} дней, первое {mismatches[0]}")
+    return breaches
+
+
+def analyze_all_accounts_balances(transactions_by_account, accounts, current_balances, accumulator=None,
+                                  compact_index=None):
     """
     Анализирует все счета на отрицательные и угрожающие остатки
     
@@ -179,11 +573,15 @@ def analyze_all_accounts_balances(transactions_by_account, accounts, current_bal
         transactions_by_account: словарь транзакций по счетам
         accounts: список счетов
         current_balances: словарь текущих остатков по счетам
+        accumulator: необязательный DailyDeltaAccumulator, заполненный при потоковой
+                     загрузке; если задан, transactions_by_account не используется
+        compact_index: необязательный CompactTransactionIndex, построенный при загрузке;
+                       при BALANCE_ENGINE=compact строится из transactions_by_account
     
     Returns:
         dict: {
-            'negative_balances': {account_id: [(date, balance), ...]},
-            'threatening_balances': {account_id: [(date, balance), ...]},
+            'negative_balances': {account_id: [(start_date, end_date, min_balance, min_date), ...]},
+            'threatening_balances': {account_id: [(start_date, end_date, min_balance, min_date), ...]},
             'accounts_info': {account_id: {'name': str, 'current_balance': float}}
         }
     """
@@ -194,7 +592,7 @@ def analyze_all_accounts_balances(transactions_by_account, accounts, current_bal
         return {'negative_balances': {}, 'threatening_balances': {}, 'accounts_info': {}}
     
     # Текущая дата
-    current_date = datetime.now().strftime("%Y-%m-%d")
+    current_date = accumulator.start_date if accumulator else datetime.now().strftime("%Y-%m-%d")
     
     # Настройки из конфига
     threatening_account_ids = THREATENING_CONFIG['account_ids']
@@ -206,7 +604,8 @@ def analyze_all_accounts_balances(transactions_by_account, accounts, current_bal
     threatening_balances = {}
     accounts_info = {}
     
-    # Анализ для каждого счета
+    # Исходные данные по каждому счету
+    account_rows = []
     for account in accounts:
         account_id = account.get('id')
         account_name = account.get('name', 'Без названия')
@@ -226,40 +625,63 @@ def analyze_all_accounts_balances(transactions_by_account, accounts, current_bal
             # По этому счету не было движений - используем пустой список
             year_transactions = []
         
-        # Рассчитываем ежедневные остатки
-        daily_balances = calculate_daily_balances(
-            current_balance=current_balance,
-            planned_transactions=year_transactions,
-            start_date=current_date,
-            days_ahead=days_ahead
+        account_rows.append((account_id, account_name, current_balance, year_transactions))
+    
+    if accumulator:
+        engine = 'stream'
+    elif compact_index is not None:
+        engine = 'compact'
+    else:
+        engine = _resolve_balance_engine()
+    if engine == 'compact' and compact_index is None:
+        compact_index = build_compact_index(transactions_by_account)
+    
+    # Кеш прогноза: пересчитываем только счета с изменившимися входными данными.
+    # Потоковый движок не хранит транзакции, а verify должен сверять все счета.
+    cache = None
+    if ANALYSIS_CONFIG['forecast_cache'] and engine not in ('stream', 'verify'):
+        cache = ForecastCache.for_business()
+    
+    breaches = [None] * len(account_rows)
+    input_keys = [None] * len(account_rows)
+    if cache is not None:
+        for index, (account_id, _, current_balance, year_transactions) in enumerate(account_rows):
+            input_keys[index] = account_input_key(
+                current_balance, year_transactions, current_date, days_ahead, threatening_threshold,
+                account_id in threatening_account_ids, engine,
+                compact=compact_index.get(int(account_id)) if engine == 'compact' else None
+            )
+            breaches[index] = cache.get(account_id, input_keys[index])
+    
+    dirty = [index for index, cached in enumerate(breaches) if cached is None]
+    if dirty:
+        computed = _compute_breaches(
+            engine, [account_rows[index] for index in dirty], current_date, days_ahead,
+            threatening_threshold, threatening_account_ids, accumulator, compact_index
         )
+        for index, result in zip(dirty, computed):
+            breaches[index] = result
+            if cache is not None:
+                cache.put(account_rows[index][0], input_keys[index], result)
+    
+    if cache is not None:
+        print(f"♻️ Кеш прогноза: пересчитано {len(dirty)} из {len(account_rows)} счетов")
+        cache.retain(row[0] for row in account_rows)
+        try:
+            cache.save()
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить кеш прогноза: {e}")
+    
+    # Анализ для каждого счета
+    for (account_id, account_name, _, _), (negative_intervals, threatening_intervals) in zip(account_rows, breaches):
+        if negative_intervals:
+            negative_balances[account_id] = negative_intervals
+            print(f"⚠️ Найдены отрицательные остатки в {account_name}: {total_interval_days(negative_intervals)} дней")
         
-        # Ищем отрицательные дни (balance < 0)
-        negative_days = []
-        for date_str, balance in daily_balances.items():
-            if balance < 0:
-                # Форматируем дату для вывода
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d 00:00:00")
-                formatted_date = date_obj.strftime("%Y-%m-%d")
-                negative_days.append((formatted_date, balance))
-        
-        if negative_days:
-            negative_balances[account_id] = negative_days
-            print(f"⚠️ Найдены отрицательные остатки в {account_name}: {len(negative_days)} дней")
-        
-        # Ищем угрожающие дни (0 < balance < threshold) для определенных счетов
-        if account_id in threatening_account_ids:
-            threatening_days = []
-            for date_str, balance in daily_balances.items():
-                if 0 < balance < threatening_threshold:
-                    # Форматируем дату для вывода
-                    date_obj = datetime.strptime(date_str, "%Y-%m-%d 00:00:00")
-                    formatted_date = date_obj.strftime("%Y-%m-%d")
-                    threatening_days.append((formatted_date, balance))
-            
-            if threatening_days:
-                threatening_balances[account_id] = threatening_days
-                print(f"⚠️ Найдены угрожающие остатки в {account_name}: {len(threatening_days)} дней")
+        # Угрожающие дни ищутся только для счетов из THREATENING_CONFIG
+        if threatening_intervals:
+            threatening_balances[account_id] = threatening_intervals
+            print(f"⚠️ Найдены угрожающие остатки в {account_name}: {total_interval_days(threatening_intervals)} дней")
     
     print(f"✅ Анализ завершен: {len(negative_balances)} счетов с отрицательными остатками, {len(threatening_balances)} счетов с угрожающими остатками")
     
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Векторный расчет ежедневных остатков на NumPy.
+
+Транзакции переводятся в целые смещения дней от начальной даты, затем
+матрица счета × дни заполняется через np.add.at и накапливается cumsum.
+Отрицательные и угрожающие дни находятся булевыми масками и сворачиваются
+в интервалы (start_date, end_date, min_balance, min_date).
+NumPy - опциональная зависимость: без него используется эталонный
+calculate_daily_balances() из api_functions.
+"""
+
+from array import array
+from datetime import date
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy опционален
+    np = None
+
+# Допустимое расхождение с эталоном: полкопейки (порядок сложения float отличается)
+REFERENCE_TOLERANCE = 0.005
+
+
+class BreachIntervalBuilder:
+    """
+    Потоковое построение интервалов нарушения за один проход по дням.
+
+    Дни подаются подряд; каждая непрерывная серия дней с in_breach=True
+    становится кортежем (start_date, end_date, min_balance, min_date).
+    """
+
+    __slots__ = ('intervals', '_start', '_end', '_min_balance', '_min_date')
+
+    def __init__(self):
+        self.intervals = []
+        self._start = None
+        self._end = None
+        self._min_balance = None
+        self._min_date = None
+
+    def add(self, date_str, balance, in_breach):
+        """Учесть очередной день"""
+        if not in_breach:
+            self._close()
+            return
+        if self._start is None:
+            self._start = date_str
+            self._min_balance = balance
+            self._min_date = date_str
+        elif balance < self._min_balance:
+            self._min_balance = balance
+            self._min_date = date_str
+        self._end = date_str
+
+    def _close(self):
+        if self._start is not None:
+            self.intervals.append((self._start, self._end, self._min_balance, self._min_date))
+            self._start = None
+
+    def finish(self):
+        """Закрыть незавершенный интервал и вернуть список интервалов"""
+        self._close()
+        return self.intervals
+
+
+def interval_days(interval):
+    """Количество дней в интервале (start_date, end_date, ...) включительно"""
+    start_date, end_date = interval[0], interval[1]
+    return (date.fromisoformat(end_date) - date.fromisoformat(start_date)).days + 1
+
+
+def total_interval_days(intervals):
+    """Суммарное количество дней во всех интервалах"""
+    return sum(interval_days(interval) for interval in intervals)
+
+
+class DailyDeltaAccumulator:
+    """
+    Потоковый накопитель дневных изменений остатков по счетам.
+
+    Транзакции подаются по одной по мере загрузки страниц (add подходит как
+    on_transaction для get_all_transactions_for_all_accounts); на счет хранится
+    только массив сумм по дням горизонта, поэтому память не растет с числом
+    транзакций. Остатки получаются накопительной суммой после загрузки.
+    """
+
+    def __init__(self, start_date, days_ahead):
+        self.start_date = start_date
+        self.days_ahead = days_ahead
+        self._start_ordinal = date.fromisoformat(start_date).toordinal()
+        self._n_days = days_ahead + 1
+        self._deltas = {}
+        self.transactions_seen = 0
+
+    def add(self, account_id, tx):
+        """Учесть одну транзакцию (вне горизонта и неизвестных типов - пропускаются)"""
+        self.transactions_seen += 1
+        if tx.get('type', '') not in ('in', 'out'):
+            return
+        offset = transaction_day_offset(tx.get('date', ''), self._start_ordinal)
+        if offset is None or offset < 0 or offset >= self._n_days:
+            return
+        deltas = self._deltas.get(account_id)
+        if deltas is None:
+            deltas = self._deltas[account_id] = array('d', bytes(8 * self._n_days))
+        deltas[offset] += tx.get('value', 0)
+
+    def daily_balances(self, account_id, current_balance):
+        """Остатки по дням горизонта: список из days_ahead + 1 значений"""
+        deltas = self._deltas.get(account_id)
+        if deltas is None:
+            return [current_balance] * self._n_days
+        return list(accumulate(deltas, initial=current_balance))[1:]
+
+    def breach_intervals(self, account_id, current_balance, threshold, check_threatening):
+        """
+        Интервалы отрицательных и угрожающих остатков за один проход.
+
+        Returns:
+            tuple: (negative_intervals, threatening_intervals)
+        """
+        negative = BreachIntervalBuilder()
+        threatening = BreachIntervalBuilder()
+        for offset, balance in enumerate(self.daily_balances(account_id, current_balance)):
+            in_negative = balance < 0
+            in_threatening = check_threatening and 0 < balance < threshold
+            # Дата нужна только для дней с нарушением
+            date_str = None
+            if in_negative or in_threatening:
+                date_str = date.fromordinal(self._start_ordinal + offset).isoformat()
+            negative.add(date_str, balance, in_negative)
+            threatening.add(date_str, balance, in_threatening)
+        return negative.finish(), threatening.finish()
+
+
+def numpy_available():
+    """Доступен ли NumPy для векторного расчета"""
+    return np is not None
+
+
+def transaction_day_offset(tx_date, start_ordinal):
+    """
+    Смещение дня транзакции от начальной даты.
+
+    Как и эталон, учитывает только даты вида "YYYY-MM-DD 00:00:00".
+
+    Returns:
+        int | None: смещение в днях или None, если дата не распознана
+    """
+    if not tx_date or len(tx_date) != 19 or not tx_date.endswith(" 00:00:00"):
+        return None
+    try:
+        return date.fromisoformat(tx_date[:10]).toordinal() - start_ordinal
+    except ValueError:
+        return None
+
+
+def build_balance_matrix(opening_balances, planned_transactions_by_row, start_date, days_ahead):
+    """
+    Построить матрицу остатков счета × дни.
+
+    Args:
+        opening_balances: текущие остатки по строкам матрицы
+        planned_transactions_by_row: списки плановых транзакций по строкам матрицы
+        start_date: начальная дата "YYYY-MM-DD"
+        days_ahead: горизонт расчета (в матрице days_ahead + 1 столбец)
+
+    Returns:
+        numpy.ndarray: float64 матрица формы (len(opening_balances), days_ahead + 1)
+    """
+    start_ordinal = date.fromisoformat(start_date).toordinal()
+    n_days = days_ahead + 1
+
+    rows = []
+    offsets = []
+    values = []
+    for row, transactions in enumerate(planned_transactions_by_row):
+        for tx in transactions:
+            if tx.get('type', '') not in ('in', 'out'):
+                continue
+            offset = transaction_day_offset(tx.get('date', ''), start_ordinal)
+            if offset is None or offset < 0 or offset >= n_days:
+                continue
+            rows.append(row)
+            offsets.append(offset)
+            values.append(tx.get('value', 0))
+
+    deltas = np.zeros((len(opening_balances), n_days), dtype=np.float64)
+    # Остаток на начало - в первый столбец, чтобы cumsum сразу дал остатки
+    deltas[:, 0] = np.asarray(opening_balances, dtype=np.float64)
+    if values:
+        np.add.at(
+            deltas,
+            (np.asarray(rows, dtype=np.intp), np.asarray(offsets, dtype=np.intp)),
+            np.asarray(values, dtype=np.float64)
+        )
+    return np.cumsum(deltas, axis=1)
+
+
+def mask_to_intervals(mask, balances, start_date):
+    """
+    Свернуть булеву маску дней в интервалы нарушения.
+
+    Returns:
+        list: [(start_date, end_date, min_balance, min_date), ...]
+    """
+    start_ordinal = date.fromisoformat(start_date).toordinal()
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    intervals = []
+    for run_start, run_end in zip(edges[0::2], edges[1::2]):
+        worst = run_start + int(np.argmin(balances[run_start:run_end]))
+        intervals.append((
+            date.fromordinal(start_ordinal + int(run_start)).isoformat(),
+            date.fromordinal(start_ordinal + int(run_end) - 1).isoformat(),
+            float(balances[worst]),
+            date.fromordinal(start_ordinal + int(worst)).isoformat(),
+        ))
+    return intervals
+
+
+def find_breach_intervals(balance_matrix, start_date, threshold, threatening_rows):
+    """
+    Найти интервалы отрицательных и угрожающих остатков по матрице остатков.
+
+    Args:
+        balance_matrix: результат build_balance_matrix()
+        start_date: начальная дата "YYYY-MM-DD"
+        threshold: порог угрожающего остатка
+        threatening_rows: множество строк, для которых ищутся угрожающие дни
+
+    Returns:
+        list: по строкам матрицы пары (negative_intervals, threatening_intervals)
+    """
+    negative_mask = balance_matrix < 0
+    threatening_mask = (balance_matrix > 0) & (balance_matrix < threshold)
+
+    result = []
+    for row in range(balance_matrix.shape[0]):
+        balances = balance_matrix[row]
+        negative_intervals = mask_to_intervals(negative_mask[row], balances, start_date)
+
+        threatening_intervals = []
+        if row in threatening_rows:
+            threatening_intervals = mask_to_intervals(threatening_mask[row], balances, start_date)
+        result.append((negative_intervals, threatening_intervals))
+    return result
+
+
+def compare_with_reference(balance_row, reference_daily_balances, tolerance=REFERENCE_TOLERANCE):
+    """
+    Сверить строку матрицы с эталонным результатом calculate_daily_balances().
+
+    Returns:
+        list: расхождения [(date_str, engine_balance, reference_balance), ...]
+    """
+    mismatches = []
+    reference_items = list(reference_daily_balances.items())
+    if len(reference_items) != len(balance_row):
+        return [("length", len(balance_row), len(reference_items))]
+    for (date_str, reference_balance), engine_balance in zip(reference_items, balance_row):
+        if abs(float(engine_balance) - reference_balance) > tolerance:
+            mismatches.append((date_str, float(engine_balance), reference_balance))
+    return mismatches
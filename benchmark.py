@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк этапов check_and_notify на локальной заглушке Finolog/Telegram.
+
+Для каждого размера синтетических данных (транзакции:счета) запускается
+finolog_stub.py в отдельном процессе, после чего по очереди замеряются этапы:
+get_all_accounts, загрузка транзакций, get_current_balances,
+analyze_all_accounts_balances и рассылка отчета. Для каждого этапа
+печатается время, число HTTP запросов, объем ответов и пиковая память.
+Сеть не нужна, поэтому регрессии ловятся локально и в CI.
+
+Использование:
+    python3 benchmark.py
+    python3 benchmark.py --sizes 1000:10,100000:500 --latency 0.05 --error-rate 0.01
+    python3 benchmark.py --json bench_output.txt
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Заглушки обязательных переменных: бенчмарк не обращается к настоящим сервисам
+for _name, _value in (
+    ("FINOLOG_API_KEY", "bench"),
+    ("FINOLOG_BIZ_ID", "1"),
+    ("MAIN_BOT_TOKEN", "bench"),
+    ("MAIN_BOT_ALLOWED_USERS", "1"),
+    ("TEST_BOT_TOKEN", "bench"),
+    ("TEST_BOT_ALLOWED_USERS", "1"),
+):
+    os.environ.setdefault(_name, _value)
+
+from config import FINOLOG_CONFIG, THREATENING_CONFIG, TELEGRAM_CONFIG, ANALYSIS_CONFIG, FETCH_CONFIG
+from http_client import get_shared_client
+from api_functions import (
+    get_all_accounts,
+    get_all_transactions_for_all_accounts,
+    get_current_balances,
+    analyze_all_accounts_balances
+)
+from telegram_functions import send_balance_analysis_report, send_telegram_message
+
+DEFAULT_SIZES = "10:1,1000:10,10000:50,100000:500"
+
+
+class RequestCounter:
+    """Счетчик HTTP запросов и байт через слушатель общего клиента"""
+
+    def __init__(self):
+        self.requests = 0
+        self.wire_bytes = 0
+
+    def __call__(self, response):
+        self.requests += 1
+        self.wire_bytes += response.wire_bytes
+
+
+def start_stub_process(transactions, accounts, latency, error_rate, throttle_rate=0.0):
+    """Запустить finolog_stub.py в отдельном процессе и вернуть (process, port)"""
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve().parent / "finolog_stub.py"),
+         "--transactions", str(transactions), "--accounts", str(accounts),
+         "--latency", str(latency), "--error-rate", str(error_rate),
+         "--throttle-rate", str(throttle_rate)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    port = int(process.stdout.readline())
+    return process, port
+
+
+def measure_stage(name, func, counter, trace_memory):
+    """Выполнить этап и вернуть (результат, метрики этапа)"""
+    requests_before, bytes_before = counter.requests, counter.wire_bytes
+    if trace_memory:
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] - memory_before if trace_memory else None
+    return result, {
+        'stage': name,
+        'seconds': elapsed,
+        'requests': counter.requests - requests_before,
+        'wire_bytes': counter.wire_bytes - bytes_before,
+        'peak_memory_bytes': peak,
+    }
+
+
+def run_size(transactions, accounts, args, counter):
+    """Прогнать все этапы для одного размера данных"""
+    process, port = start_stub_process(transactions, accounts, args.latency, args.error_rate, args.throttle_rate)
+    base = f"http://127.0.0.1:{port}"
+    FINOLOG_CONFIG['base_url'] = base
+    TELEGRAM_CONFIG['api_url'] = base
+    recipients = list(range(1, args.recipients + 1))
+    start_date = datetime.datetime.now().strftime("%Y-%m-%d")
+    stages = []
+    try:
+        accounts_list, stage = measure_stage("get_all_accounts", get_all_accounts, counter, args.memory)
+        stages.append(stage)
+        accounts_list = accounts_list or []
+        account_ids = [account.get('id') for account in accounts_list]
+        THREATENING_CONFIG['account_ids'] = account_ids[:max(1, len(account_ids) // 10)]
+
+        transactions_by_account, stage = measure_stage(
+            "get_all_transactions",
+            lambda: get_all_transactions_for_all_accounts(account_ids, start_date),
+            counter, args.memory
+        )
+        stage['transactions'] = sum(len(items) for items in transactions_by_account.values())
+        stages.append(stage)
+
+        current_balances, stage = measure_stage(
+            "get_current_balances", lambda: get_current_balances(accounts_list), counter, args.memory
+        )
+        stages.append(stage)
+
+        analysis_result, stage = measure_stage(
+            "analyze_all_accounts_balances",
+            lambda: analyze_all_accounts_balances(transactions_by_account, accounts_list, current_balances),
+            counter, args.memory
+        )
+        stages.append(stage)
+
+        _, stage = measure_stage(
+            "send_balance_analysis_report",
+            lambda: send_balance_analysis_report(
+                analysis_result,
+                lambda chat_id, text: send_telegram_message("bench", chat_id, text, detailed=True),
+                recipients
+            ),
+            counter, args.memory
+        )
+        stages.append(stage)
+    finally:
+        process.stdin.close()
+        process.wait(timeout=10)
+        get_shared_client().close()
+
+    for stage in stages:
+        stage['size_transactions'] = transactions
+        stage['size_accounts'] = accounts
+    return stages
+
+
+def print_table(stages):
+    """Печать результатов таблицей"""
+    print(f"{'размер':>14} {'этап':<32} {'время, мс':>10} {'запросы':>8} {'ответы, КБ':>11} {'пик, МБ':>8}")
+    for stage in stages:
+        size = f"{stage['size_transactions']}:{stage['size_accounts']}"
+        peak = stage['peak_memory_bytes']
+        peak_text = f"{peak / 1024 / 1024:8.1f}" if peak is not None else f"{'-':>8}"
+        print(f"{size:>14} {stage['stage']:<32} {stage['seconds'] * 1000:10.1f} "
+              f"{stage['requests']:8d} {stage['wire_bytes'] / 1024:11.1f} {peak_text}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк этапов мониторинга на локальной заглушке")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f"список транзакции:счета через запятую (по умолчанию {DEFAULT_SIZES})")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка заглушки, секунд")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 500 (0..1)")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="доля ответов 429 с Retry-After (0..1)")
+    parser.add_argument('--recipients', type=int, default=3, help="число получателей отчета")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="не замерять память (tracemalloc замедляет этапы)")
+    parser.add_argument('--json', help="записать результаты в файл JSON lines")
+    args = parser.parse_args(argv)
+
+    sizes = []
+    for item in args.sizes.split(','):
+        transactions, _, accounts = item.partition(':')
+        sizes.append((int(transactions), int(accounts or 1)))
+
+    # Каждый прогон считается с нуля: без кеша прогноза и статистики прошлых загрузок
+    ANALYSIS_CONFIG['forecast_cache'] = False
+    stats_dir = tempfile.TemporaryDirectory()
+    FETCH_CONFIG['stats_dir'] = stats_dir.name
+
+    counter = RequestCounter()
+    get_shared_client().add_listener(counter)
+    if args.memory:
+        tracemalloc.start()
+
+    all_stages = []
+    for transactions, accounts in sizes:
+        all_stages.extend(run_size(transactions, accounts, args, counter))
+    print_table(all_stages)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            for stage in all_stages:
+                f.write(json.dumps(stage, ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Команды бота по запросу пользователя (long polling getUpdates).
+
+Ответы на /balance, /forecast <счет> и /breaches строятся из последнего
+рассчитанного анализа (AnalysisCache), поэтому занимают миллисекунды и не
+обращаются к Finolog. Когда анализ старше BOT_CACHE_TTL_SECONDS, запрос
+отвечает текущими данными и запускает обновление в фоне; одновременно
+идет не больше одного обновления, так что поток команд не превращается в
+поток запросов к API. Отвечаем только allowed_users бота.
+
+Использование:
+    python3 bot_commands.py          # основной бот
+    python3 bot_commands.py --test   # тестовый бот
+"""
+
+import datetime
+import html
+import signal
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from config import BOT_COMMANDS_CONFIG, SYNC_CONFIG, THREATENING_CONFIG
+
+HELP_TEXT = (
+    "🤖 <b>Команды бота</b>\n\n"
+    "/balance - текущие остатки по счетам\n"
+    "/forecast &lt;счет&gt; - прогноз по счету (ID или часть названия)\n"
+    "/breaches - отрицательные и угрожающие остатки в прогнозе"
+)
+
+
+class AnalysisSnapshot:
+    """Результат одного расчета: остатки, анализ и сводка прогноза по счетам"""
+
+    def __init__(self, start_date, current_balances, analysis_result, forecasts, computed_at=None):
+        self.start_date = start_date
+        self.current_balances = current_balances
+        self.analysis_result = analysis_result
+        # {account_id: {'min_balance', 'min_date', 'end_balance', 'end_date'}}
+        self.forecasts = forecasts
+        self.computed_at = computed_at or datetime.datetime.now()
+
+
+def load_analysis_snapshot():
+    """Загрузить данные Finolog и посчитать анализ для команд (одна полная загрузка)"""
+    from api_functions import (
+        get_all_accounts,
+        get_all_transactions_for_all_accounts,
+        get_current_balances,
+        analyze_all_accounts_balances
+    )
+    from compact_transactions import CompactTransactionIndex, build_compact_index, to_kopecks
+
+    start_date = datetime.date.today().isoformat()
+    days_ahead = THREATENING_CONFIG['days_ahead']
+    accounts = get_all_accounts()
+    account_ids = [account.get('id') for account in accounts]
+
+    if SYNC_CONFIG['mode'] == 'incremental':
+        from transaction_store import sync_transactions_for_all_accounts
+        transactions_by_account = sync_transactions_for_all_accounts(account_ids, start_date)
+        compact_index = build_compact_index(transactions_by_account)
+    else:
+        compact_index = CompactTransactionIndex()
+        transactions_by_account = get_all_transactions_for_all_accounts(
+            account_ids, start_date, on_transaction=compact_index.add
+        )
+
+    current_balances = get_current_balances(accounts)
+    analysis_result = analyze_all_accounts_balances(transactions_by_account, accounts, current_balances)
+
+    # Сводка ряда остатков на счет - чтобы /forecast не строил ряд при каждом запросе
+    start_ordinal = datetime.date.fromisoformat(start_date).toordinal()
+    forecasts = {}
+    for account_id in account_ids:
+        balances = compact_index.get(int(account_id)).daily_balances_kopecks(
+            to_kopecks(current_balances[account_id]['balance']), start_ordinal, days_ahead
+        )
+        min_offset = min(range(len(balances)), key=balances.__getitem__)
+        forecasts[account_id] = {
+            'min_balance': balances[min_offset] / 100,
+            'min_date': datetime.date.fromordinal(start_ordinal + min_offset).isoformat(),
+            'end_balance': balances[-1] / 100,
+            'end_date': datetime.date.fromordinal(start_ordinal + len(balances) - 1).isoformat(),
+        }
+    return AnalysisSnapshot(start_date, current_balances, analysis_result, forecasts)
+
+
+class AnalysisCache:
+    """
+    Последний рассчитанный анализ с TTL и фоновым обновлением.
+
+    get() не ждет обновления, если есть хоть какие-то данные; устаревшие
+    данные запускают обновление в фоне. Параллельные запросы разделяют одно
+    обновление, новое не начнется, пока текущее не закончится.
+    """
+
+    def __init__(self, loader=load_analysis_snapshot, ttl=None):
+        self.loader = loader
+        self.ttl = BOT_COMMANDS_CONFIG['cache_ttl_seconds'] if ttl is None else ttl
+        self.refreshes = 0
+        self.last_error = None
+        self._snapshot = None
+        self._loaded_at = None
+        self._failed_at = None
+        self._future = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analysis-refresh')
+
+    def _is_stale(self, now):
+        if self._failed_at is not None and now - self._failed_at < BOT_COMMANDS_CONFIG['error_retry_seconds']:
+            # После ошибки не повторяем загрузку на каждую команду
+            return False
+        return self._snapshot is None or now - self._loaded_at >= self.ttl
+
+    def _refresh_locked(self):
+        if self._future is None:
+            self._future = self._executor.submit(self._run_refresh)
+        return self._future
+
+    def _run_refresh(self):
+        try:
+            snapshot = self.loader()
+        except Exception as e:
+            print(f"❌ Ошибка обновления анализа для команд: {e}")
+            traceback.print_exc()
+            with self._lock:
+                self.last_error = e
+                self._failed_at = time.monotonic()
+                self._future = None
+            raise
+        with self._lock:
+            self._snapshot = snapshot
+            self._loaded_at = time.monotonic()
+            self.last_error = None
+            self._failed_at = None
+            self.refreshes += 1
+            self._future = None
+        return snapshot
+
+    def refresh(self):
+        """Запустить обновление (если еще не идет); возвращает Future"""
+        with self._lock:
+            return self._refresh_locked()
+
+    def put(self, snapshot):
+        """Подставить уже рассчитанный анализ"""
+        with self._lock:
+            self._snapshot = snapshot
+            self._loaded_at = time.monotonic()
+
+    def get(self, wait=False, timeout=None):
+        """
+        Текущий анализ; устаревший анализ обновляется в фоне.
+
+        Args:
+            wait: если данных еще нет - дождаться первого обновления
+            timeout: сколько ждать при wait, секунд
+
+        Returns:
+            AnalysisSnapshot | None: None, если данных нет и wait=False
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            future = self._refresh_locked() if self._is_stale(time.monotonic()) else None
+        if snapshot is None and wait and future is not None:
+            return future.result(timeout)
+        return snapshot
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_command(text):
+    """'/forecast@bot 190104' -> ('forecast', '190104'); не команда -> (None, '')"""
+    if not text or not text.startswith('/'):
+        return None, ''
+    command, _, args = text[1:].partition(' ')
+    return command.split('@', 1)[0].lower(), args.strip()
+
+
+def _data_age_line(snapshot):
+    return f"\n\n🕒 Данные на {snapshot.computed_at:%d.%m %H:%M}"
+
+
+def format_balance_reply(snapshot):
+    """Ответ на /balance"""
+    lines = ["💰 <b>Текущие остатки</b>\n"]
+    total = 0
+    for info in snapshot.current_balances.values():
+        lines.append(f"📊 {info['name']}: {info['balance']:,.0f} р.")
+        total += info['balance']
+    lines.append(f"\nИтого: {total:,.0f} р.")
+    return "\n".join(lines) + _data_age_line(snapshot)
+
+
+def find_accounts(snapshot, query):
+    """Счета по ID или части названия (без учета регистра)"""
+    query = query.strip()
+    if query.isdigit() and int(query) in snapshot.current_balances:
+        return [int(query)]
+    query = query.lower()
+    return [account_id for account_id, info in snapshot.current_balances.items()
+            if query in str(info['name']).lower()]
+
+
+def format_forecast_reply(snapshot, query):
+    """Ответ на /forecast <счет>"""
+    from telegram_functions import format_breach_intervals
+
+    if not query:
+        return "Укажите счет: /forecast &lt;ID или часть названия&gt;"
+    matches = find_accounts(snapshot, query)
+    if not matches:
+        return f"Счет «{html.escape(query)}» не найден"
+    if len(matches) > 1:
+        names = "\n".join(f"• {account_id} - {snapshot.current_balances[account_id]['name']}"
+                          for account_id in matches[:20])
+        return f"Найдено несколько счетов, уточните ID:\n{names}"
+
+    account_id = matches[0]
+    info = snapshot.current_balances[account_id]
+    forecast = snapshot.forecasts[account_id]
+    negative = snapshot.analysis_result['negative_balances'].get(account_id)
+    threatening = snapshot.analysis_result['threatening_balances'].get(account_id)
+
+    message = f"📈 <b>Прогноз: {info['name']}</b>\n\n"
+    message += f"Сейчас: {info['balance']:,.0f} р.\n"
+    message += f"Минимум: {forecast['min_balance']:,.0f} р. ({forecast['min_date']})\n"
+    message += f"На {forecast['end_date']}: {forecast['end_balance']:,.0f} р.\n"
+    if negative:
+        message += "\n🔴 <b>Отрицательные остатки:</b>\n" + format_breach_intervals(negative)
+    if threatening:
+        message += "\n🟡 <b>Угрожающие остатки:</b>\n" + format_breach_intervals(threatening)
+    if not negative and not threatening:
+        message += "\n✅ Проблем в прогнозе нет"
+    return message.rstrip("\n") + _data_age_line(snapshot)
+
+
+def format_breaches_reply(snapshot):
+    """Ответ на /breaches"""
+    from telegram_functions import format_balance_analysis_message
+
+    analysis_result = snapshot.analysis_result
+    if not analysis_result['negative_balances'] and not analysis_result['threatening_balances']:
+        return "✅ <b>Все счета в порядке!</b>\n\nОтрицательных и угрожающих остатков в прогнозе нет" \
+            + _data_age_line(snapshot)
+    return format_balance_analysis_message(analysis_result) + _data_age_line(snapshot)
+
+
+def answer_command(text, cache):
+    """
+    Текст ответа на команду (None - не команда или неизвестная команда).
+    Данные берутся только из cache, Finolog здесь не вызывается.
+    """
+    command, args = parse_command(text)
+    if command in ('start', 'help'):
+        return HELP_TEXT
+    if command not in ('balance', 'forecast', 'breaches'):
+        return None
+
+    snapshot = cache.get()
+    if snapshot is None:
+        if cache.last_error is not None:
+            return "❌ Не удалось получить данные Finolog, попробуйте позже"
+        return "⏳ Данные загружаются, повторите команду через минуту"
+    if command == 'balance':
+        return format_balance_reply(snapshot)
+    if command == 'forecast':
+        return format_forecast_reply(snapshot, args)
+    return format_breaches_reply(snapshot)
+
+
+def reply_for_update(update, allowed_users, cache):
+    """
+    Ответ на update Telegram.
+
+    Returns:
+        tuple: (chat_id, текст) или None, если отвечать не нужно
+    """
+    message = update.get('message') or update.get('edited_message')
+    if not isinstance(message, dict) or not isinstance(message.get('text'), str):
+        return None
+    sender = message.get('from') if isinstance(message.get('from'), dict) else {}
+    chat = message.get('chat') if isinstance(message.get('chat'), dict) else {}
+    user_id = sender.get('id')
+    chat_id = chat.get('id', user_id)
+    if user_id not in allowed_users:
+        print(f"⚠️ Команда от неразрешенного пользователя {user_id} проигнорирована")
+        return None
+    # Ответ уходит в chat.id: в группе остатки увидели бы все участники
+    if chat_id not in allowed_users and chat.get('type') != 'private':
+        print(f"⚠️ Команда в чате {chat_id} ({chat.get('type')}) проигнорирована: отвечаем только в личных чатах")
+        return None
+    text = answer_command(message['text'], cache)
+    return (chat_id, text) if text else None
+
+
+def deliver_reply(send_func, chat_id, text):
+    """
+    Отправить ответ на команду частями не длиннее предела Telegram (как отчеты),
+    каждую - с лимитами и повторами deliver_message; после неудачной части
+    остальные не отправляются.
+
+    Returns:
+        dict: результат последней отправленной части (см. deliver_message)
+    """
+    from telegram_delivery import deliver_message
+    from telegram_functions import split_message
+
+    result = None
+    for chunk in split_message(text):
+        result = deliver_message(send_func, chat_id, chunk)
+        if not result['ok']:
+            break
+    return result
+
+
+class CommandPoller:
+    """Цикл long polling getUpdates для одного бота"""
+
+    def __init__(self, bot_token, allowed_users, cache, is_test=False):
+        self.bot_token = bot_token
+        self.allowed_users = allowed_users
+        self.cache = cache
+        self.is_test = is_test
+        self.offset = None
+        self.stop_event = threading.Event()
+
+    def request_stop(self, signum=None, frame=None):
+        """Обработчик SIGTERM/SIGINT: выйти после текущего getUpdates"""
+        print(f"🛑 Получен сигнал {signum}, завершаем работу...", flush=True)
+        self.stop_event.set()
+
+    def _send(self, chat_id, text):
+        from telegram_functions import send_telegram_message_wrapper
+        return send_telegram_message_wrapper(self.bot_token, chat_id, text, self.is_test, detailed=True)
+
+    def poll_once(self):
+        """Один запрос getUpdates и ответы на полученные команды; возвращает число updates"""
+        from telegram_functions import call_telegram_api
+
+        poll_timeout = BOT_COMMANDS_CONFIG['poll_timeout']
+        data = {'timeout': poll_timeout, 'allowed_updates': '["message"]'}
+        if self.offset is not None:
+            data['offset'] = self.offset
+        result = call_telegram_api(self.bot_token, 'getUpdates', data, timeout=poll_timeout + 10)
+        if not result['ok']:
+            raise RuntimeError(f"getUpdates: {result['description']}")
+
+        updates = result['result'] or []
+        for update in updates:
+            self.offset = update['update_id'] + 1
+            reply = reply_for_update(update, self.allowed_users, self.cache)
+            if reply:
+                chat_id, text = reply
+                # Через общие лимиты и повторы рассылки (telegram_delivery), длинный ответ - частями
+                result = deliver_reply(self._send, chat_id, text)
+                if not result['ok']:
+                    print(f"❌ Ответ в чат {chat_id} не доставлен: {result.get('description', '')}", flush=True)
+        return len(updates)
+
+    def run(self):
+        """Основной цикл до сигнала остановки"""
+        bot_type = "ТЕСТОВОГО" if self.is_test else "ОСНОВНОГО"
+        print(f"🚀 Команды {bot_type} бота: long polling, данные обновляются раз в "
+              f"{self.cache.ttl} с", flush=True)
+        # Прогреваем кеш, чтобы первая команда не ждала загрузки
+        self.cache.refresh()
+
+        attempt = 0
+        while not self.stop_event.is_set():
+            try:
+                self.poll_once()
+                attempt = 0
+            except Exception as e:
+                from rate_limiter import backoff_delay
+                print(f"❌ Ошибка получения команд: {e}", flush=True)
+                self.stop_event.wait(min(backoff_delay(attempt, 1.0), 60))
+                attempt += 1
+
+        self.cache.close()
+        print("👋 Команды бота остановлены", flush=True)
+
+
+def main(argv=None):
+    """Запуск команд основного (или с --test тестового) бота"""
+    from contacts import MAIN_BOT_CONFIG, TEST_BOT_CONFIG
+
+    argv = sys.argv[1:] if argv is None else argv
+    is_test = '--test' in argv
+    bot_config = TEST_BOT_CONFIG if is_test else MAIN_BOT_CONFIG
+    poller = CommandPoller(bot_config['bot_token'], bot_config['allowed_users'], AnalysisCache(), is_test=is_test)
+
+    signal.signal(signal.SIGTERM, poller.request_stop)
+    signal.signal(signal.SIGINT, poller.request_stop)
+    poller.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Компактное представление плановых транзакций для расчета остатков.
+
+Для расчета нужны только дата и сумма, поэтому на каждый счет хранятся два
+параллельных массива: array('i') порядковых номеров дней и array('q') сумм
+в копейках (12 байт на транзакцию вместо полного JSON словаря). Целые копейки
+убирают накопление ошибок округления float в остатках. Исходные словари
+Finolog остаются отдельно и нужны только для отчетов.
+"""
+
+from array import array
+from datetime import date
+from itertools import accumulate
+
+from balance_engine import BreachIntervalBuilder, numpy_available, transaction_day_offset
+
+if numpy_available():
+    import numpy as np
+
+
+def to_kopecks(value):
+    """Сумма в рублях (float/int/str) -> целые копейки"""
+    return int(round(float(value) * 100))
+
+
+class CompactTransactions:
+    """Транзакции одного счета: параллельные массивы дней и сумм в копейках"""
+
+    __slots__ = ('days', 'amounts')
+
+    def __init__(self):
+        self.days = array('i')
+        self.amounts = array('q')
+
+    def __len__(self):
+        return len(self.days)
+
+    def append(self, day_ordinal, amount_kopecks):
+        self.days.append(day_ordinal)
+        self.amounts.append(amount_kopecks)
+
+    def daily_balances_kopecks(self, opening_kopecks, start_ordinal, days_ahead):
+        """Остатки в копейках на days_ahead + 1 дней начиная с start_ordinal"""
+        n_days = days_ahead + 1
+        if numpy_available() and len(self.days) > 0:
+            offsets = np.frombuffer(self.days, dtype=np.int32).astype(np.int64) - start_ordinal
+            amounts = np.frombuffer(self.amounts, dtype=np.int64)
+            in_horizon = (offsets >= 0) & (offsets < n_days)
+            deltas = np.zeros(n_days, dtype=np.int64)
+            np.add.at(deltas, offsets[in_horizon], amounts[in_horizon])
+            deltas[0] += opening_kopecks
+            return np.cumsum(deltas).tolist()
+
+        deltas = [0] * n_days
+        for day, amount in zip(self.days, self.amounts):
+            offset = day - start_ordinal
+            if 0 <= offset < n_days:
+                deltas[offset] += amount
+        return list(accumulate(deltas, initial=opening_kopecks))[1:]
+
+    def horizon_bytes(self, start_ordinal, days_ahead):
+        """Дни и суммы только транзакций горизонта [start_ordinal, start_ordinal + days_ahead] - для отпечатка"""
+        last_ordinal = start_ordinal + days_ahead
+        if numpy_available() and len(self.days) > 0:
+            days = np.frombuffer(self.days, dtype=np.int32)
+            in_horizon = (days >= start_ordinal) & (days <= last_ordinal)
+            return days[in_horizon].tobytes() + np.frombuffer(self.amounts, dtype=np.int64)[in_horizon].tobytes()
+
+        days = array('i')
+        amounts = array('q')
+        for day, amount in zip(self.days, self.amounts):
+            if start_ordinal <= day <= last_ordinal:
+                days.append(day)
+                amounts.append(amount)
+        return days.tobytes() + amounts.tobytes()
+
+
+class CompactTransactionIndex:
+    """
+    Компактные транзакции по счетам, заполняемые при загрузке.
+
+    add(account_id, tx) подходит как on_transaction для
+    get_all_transactions_for_all_accounts().
+    """
+
+    def __init__(self):
+        self.accounts = {}
+
+    def add(self, account_id, tx):
+        """Добавить транзакцию (неизвестные типы и нераспознанные даты пропускаются)"""
+        if tx.get('type', '') not in ('in', 'out'):
+            return
+        day = transaction_day_offset(tx.get('date', ''), 0)
+        if day is None:
+            return
+        compact = self.accounts.get(account_id)
+        if compact is None:
+            compact = self.accounts[account_id] = CompactTransactions()
+        compact.append(day, to_kopecks(tx.get('value', 0)))
+
+    def get(self, account_id):
+        """Компактные транзакции счета (пустые, если движений не было)"""
+        return self.accounts.get(account_id) or CompactTransactions()
+
+    def __len__(self):
+        return sum(len(compact) for compact in self.accounts.values())
+
+
+def build_compact_index(transactions_by_account):
+    """Построить CompactTransactionIndex из уже загруженных {account_id: [tx, ...]}"""
+    index = CompactTransactionIndex()
+    for account_id, transactions in (transactions_by_account or {}).items():
+        for tx in transactions:
+            index.add(account_id, tx)
+    return index
+
+
+def compact_breach_intervals(compact, current_balance, start_date, days_ahead, threshold, check_threatening):
+    """
+    Интервалы отрицательных и угрожающих остатков по компактным транзакциям.
+    Сравнения выполняются в целых копейках, min_balance возвращается в рублях.
+
+    Returns:
+        tuple: (negative_intervals, threatening_intervals)
+    """
+    start_ordinal = date.fromisoformat(start_date).toordinal()
+    threshold_kopecks = to_kopecks(threshold)
+    balances = compact.daily_balances_kopecks(to_kopecks(current_balance), start_ordinal, days_ahead)
+
+    negative = BreachIntervalBuilder()
+    threatening = BreachIntervalBuilder()
+    for offset, balance in enumerate(balances):
+        in_negative = balance < 0
+        in_threatening = check_threatening and 0 < balance < threshold_kopecks
+        date_str = None
+        if in_negative or in_threatening:
+            date_str = date.fromordinal(start_ordinal + offset).isoformat()
+        negative.add(date_str, balance, in_negative)
+        threatening.add(date_str, balance, in_threatening)
+
+    def to_rubles(intervals):
+        return [(start, end, min_balance / 100, min_date) for start, end, min_balance, min_date in intervals]
+
+    return to_rubles(negative.finish()), to_rubles(threatening.finish())
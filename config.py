@@ -2,79 +2,126 @@
 # -*- coding: utf-8 -*-
 """
 Конфигурационный файл для мониторинга Финолога.
-Секреты считываются из переменных окружения или .env файла.
+Секреты считываются из переменных окружения или .env файла (см. settings.py).
 """
 
-import os
-from pathlib import Path
+from settings import BASE_DIR as _base_dir
+from settings import get_env as _get_env, get_int as _get_int, get_int_list as _get_int_list
 
 
-def _load_dotenv(path: Path) -> None:
-    """Load key=value pairs from a local .env file without extra deps."""
-    try:
-        for raw_line in path.read_text(encoding="utf-8").splitlines():
-            line = raw_line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" not in line:
-                continue
-            key, value = line.split("=", 1)
-            os.environ.setdefault(key.strip(), value.strip())
-    except Exception as exc:  # pragma: no cover - defensive
-        raise RuntimeError(f"Не удалось прочитать файл окружения {path}") from exc
+FINOLOG_CONFIG = {
+    "api_key": _get_env("FINOLOG_API_KEY", required=True),
+    "biz_id": _get_env("FINOLOG_BIZ_ID", required=True),
+    "base_url": _get_env("FINOLOG_BASE_URL", default="https://api.finolog.ru/v1"),
+}
+
+THREATENING_CONFIG = {
+    "account_ids": _get_int_list("THREATENING_ACCOUNT_IDS"),
+    "threshold": _get_int("THREATENING_THRESHOLD", default=100_000),
+    "days_ahead": _get_int("THREATENING_DAYS_AHEAD", default=356),
+}
 
+TELEGRAM_CONFIG = {
+    "api_url": _get_env("TELEGRAM_API_URL", default="https://api.telegram.org"),
+}
 
-_base_dir = Path(__file__).resolve().parent
-_env_file = _base_dir / ".env"
-if _env_file.exists():
-    _load_dotenv(_env_file)
+FETCH_CONFIG = {
+    "max_workers": _get_int("FINOLOG_FETCH_WORKERS", default=4),
+    "pagesize": _get_int("FINOLOG_PAGESIZE", default=200),
+    # Общий лимит запросов к Finolog (запросов/с); после 429 частота снижается автоматически
+    "rate": _get_int("FINOLOG_RATE", default=10),
+    "max_retries": _get_int("FINOLOG_MAX_RETRIES", default=4),
+    "backoff_base": 0.5,
+    # Retry-After длиннее этого значения (секунд) не ждем - запуск завершается ошибкой
+    "max_retry_wait": _get_int("FINOLOG_MAX_RETRY_WAIT", default=60),
+    # Загрузка группами счетов (fetch_planner.py) вместо одного запроса со всеми account_ids
+    "sharding": _get_int("FINOLOG_FETCH_SHARDING", default=1) == 1,
+    "shard_target_transactions": _get_int("FETCH_SHARD_TARGET_TRANSACTIONS", default=5000),
+    "shard_max_accounts": _get_int("FETCH_SHARD_MAX_ACCOUNTS", default=50),
+    "shard_workers": _get_int("FETCH_SHARD_WORKERS", default=4),
+    "max_page_bytes": _get_int("FETCH_MAX_PAGE_BYTES", default=512 * 1024),
+    "stats_dir": _get_env("FETCH_STATS_DIR", default=str(_base_dir / "data")),
+}
 
+SYNC_CONFIG = {
+    # full - полная загрузка каждый запуск, incremental - локальное хранилище SQLite
+    "mode": _get_env("TRANSACTION_SYNC_MODE", default="full"),
+    "db_path": _get_env("TRANSACTION_STORE_PATH", default=str(_base_dir / "data" / "transactions.sqlite3")),
+    "near_days": _get_int("TRANSACTION_SYNC_NEAR_DAYS", default=31),
+    "slice_days": _get_int("TRANSACTION_SYNC_SLICE_DAYS", default=60),
+    "full_resync_hours": _get_int("TRANSACTION_SYNC_FULL_RESYNC_HOURS", default=24),
+}
 
-def _get_env(name: str, *, default=None, required: bool = False) -> str:
-    value = os.getenv(name)
-    if value is None or value.strip() == "":
-        if required and default is None:
-            raise RuntimeError(f"Не задана обязательная переменная окружения {name}")
-        return default
-    return value.strip()
+ANALYSIS_CONFIG = {
+    # auto | numpy | python | verify (numpy со сверкой против эталона на Python)
+    # | stream (потоковый расчет во время загрузки страниц, без хранения транзакций)
+    # | compact (целые копейки в массивах array, без ошибок округления float)
+    "engine": _get_env("BALANCE_ENGINE", default="auto"),
+    # Кеш интервалов по счетам: пересчитываются только счета с изменившимися данными
+    "forecast_cache": _get_int("FORECAST_CACHE", default=1) == 1,
+    "forecast_cache_dir": _get_env("FORECAST_CACHE_DIR", default=str(_base_dir / "data")),
+    # История прогнозов (forecast_history.py): ряды остатков плановых запусков основного бота
+    "history": _get_int("FORECAST_HISTORY", default=0) == 1,
+    "history_dir": _get_env("FORECAST_HISTORY_DIR", default=str(_base_dir / "data")),
+    # Сколько дней хранить историю (0 - без ограничения)
+    "history_days": _get_int("FORECAST_HISTORY_DAYS", default=90),
+}
 
+DAEMON_CONFIG = {
+    "interval_minutes": _get_int("DAEMON_INTERVAL_MINUTES", default=60),
+    "start_hour": _get_int("DAEMON_START_HOUR", default=9),
+    "end_hour": _get_int("DAEMON_END_HOUR", default=18),
+}
 
-def _get_int(name: str, *, default=None, required: bool = False) -> int:
-    raw_value = _get_env(name, default=None, required=required)
-    if raw_value is None:
-        return default
-    try:
-        return int(raw_value)
-    except ValueError as exc:
-        raise RuntimeError(f"Переменная окружения {name} должна быть целым числом") from exc
+TELEGRAM_DELIVERY_CONFIG = {
+    "max_workers": _get_int("TELEGRAM_DELIVERY_WORKERS", default=8),
+    # Лимиты Telegram: ~30 сообщений/с на бота и ~1 сообщение/с в один чат
+    "global_rate": _get_int("TELEGRAM_GLOBAL_RATE", default=30),
+    "per_chat_rate": _get_int("TELEGRAM_PER_CHAT_RATE", default=1),
+    "max_retries": _get_int("TELEGRAM_MAX_RETRIES", default=3),
+    "backoff_base": 0.5,
+}
 
+METRICS_CONFIG = {
+    "enabled": _get_int("METRICS_ENABLED", default=1) == 1,
+    # Каталог textfile collector node_exporter: файл watchdog_<bot>.prom на каждый бот
+    "textfile_dir": _get_env("METRICS_TEXTFILE_DIR", default=str(_base_dir / "logs" / "metrics")),
+    "jsonl_path": _get_env("METRICS_JSONL_PATH", default=str(_base_dir / "logs" / "runs.jsonl")),
+}
 
-def _get_int_list(name: str, *, default=None) -> list[int]:
-    raw_value = _get_env(name, default=None, required=False)
-    if raw_value is None:
-        return default if default is not None else []
-    result = []
-    for item in raw_value.split(","):
-        item = item.strip()
-        if not item:
-            continue
-        try:
-            result.append(int(item))
-        except ValueError as exc:
-            raise RuntimeError(
-                f"Переменная окружения {name} должна содержать список целых через запятую"
-            ) from exc
-    return result
+MULTI_BUSINESS_CONFIG = {
+    # JSON со списком бизнесов для multi_business.py
+    "file": _get_env("BUSINESSES_FILE", default=str(_base_dir / "businesses.json")),
+    "max_workers": _get_int("MULTI_BUSINESS_WORKERS", default=4),
+    "timeout_seconds": _get_int("MULTI_BUSINESS_TIMEOUT_SECONDS", default=600),
+}
 
+BOT_COMMANDS_CONFIG = {
+    # Сколько секунд ответы на команды (bot_commands.py) берутся из последнего анализа
+    "cache_ttl_seconds": _get_int("BOT_CACHE_TTL_SECONDS", default=300),
+    # Длительность long polling getUpdates, секунд
+    "poll_timeout": _get_int("BOT_POLL_TIMEOUT", default=25),
+    # Пауза перед повторной загрузкой после ошибки, секунд
+    "error_retry_seconds": 60,
+}
 
-FINOLOG_CONFIG = {
-    "api_key": _get_env("FINOLOG_API_KEY", required=True),
-    "biz_id": _get_env("FINOLOG_BIZ_ID", required=True),
-    "base_url": _get_env("FINOLOG_BASE_URL", default="https://api.finolog.ru/v1"),
+WEBHOOK_CONFIG = {
+    # Адрес локального сервера webhook_server.py (обычно за reverse proxy с TLS)
+    "host": _get_env("WEBHOOK_HOST", default="127.0.0.1"),
+    "port": _get_int("WEBHOOK_PORT", default=8080),
+    # secret_token из setWebhook; пусто - заголовок не проверяется
+    "secret": _get_env("WEBHOOK_SECRET"),
+    # Очередь обновлений: при переполнении сервер отвечает 503 и Telegram повторит доставку
+    "queue_size": _get_int("WEBHOOK_QUEUE_SIZE", default=1000),
+    "workers": _get_int("WEBHOOK_WORKERS", default=8),
 }
 
-THREATENING_CONFIG = {
-    "account_ids": _get_int_list("THREATENING_ACCOUNT_IDS"),
-    "threshold": _get_int("THREATENING_THRESHOLD", default=100_000),
-    "days_ahead": _get_int("THREATENING_DAYS_AHEAD", default=356),
+ALERT_CONFIG = {
+    # 1 - не повторять неизменившийся отчет и присылать только изменения
+    "dedup": _get_int("ALERT_DEDUP", default=1) == 1,
+    # Через сколько минут неизменившийся отчет отправляется повторно целиком
+    "renotify_minutes": _get_int("ALERT_RENOTIFY_MINUTES", default=240),
+    # 1 - обновлять прошлый отчет в чате (editMessageText), новое сообщение - только при росте серьезности
+    "edit_in_place": _get_int("ALERT_EDIT_IN_PLACE", default=0) == 1,
+    "state_dir": _get_env("ALERT_STATE_DIR", default=str(_base_dir / "data")),
 }
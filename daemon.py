@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Резидентный режим бота мониторинга Финолога.
+
+Вместо запуска нового процесса launcher.py на каждый тик cron один процесс
+живет постоянно: конфигурация читается один раз, HTTP соединения остаются
+открытыми, календарь кешируется в holiday_checker_json. Внутренний планировщик запускает
+check_and_notify() по расписанию DAEMON_CONFIG только в рабочие дни.
+SIGTERM/SIGINT завершают процесс после текущей проверки.
+
+Использование:
+    python3 daemon.py          # основной бот
+    python3 daemon.py --test   # тестовый бот
+"""
+
+import datetime
+import signal
+import sys
+import threading
+import traceback
+
+from config import DAEMON_CONFIG
+from contacts import MAIN_BOT_CONFIG, TEST_BOT_CONFIG
+from holiday_checker_json import is_working_day
+from http_client import get_shared_client
+from telegram_bot import check_and_notify
+
+
+def next_run_time(now, interval_minutes, start_hour, end_hour, is_working, max_days=31):
+    """
+    Найти ближайшее время запуска строго после now.
+
+    Запуски выровнены по interval_minutes от start_hour:00 и идут до end_hour:00
+    включительно (как cron "0 start-end * * *"), только в рабочие дни.
+
+    Returns:
+        datetime.datetime | None: время запуска или None, если за max_days рабочих дней нет
+    """
+    interval = datetime.timedelta(minutes=interval_minutes)
+    for day_offset in range(max_days + 1):
+        day = now.date() + datetime.timedelta(days=day_offset)
+        if not is_working(day):
+            continue
+        slot = datetime.datetime.combine(day, datetime.time(hour=start_hour))
+        last_slot = datetime.datetime.combine(day, datetime.time(hour=end_hour))
+        if slot <= now:
+            # Пропускаем уже прошедшие слоты этого дня
+            passed = (now - slot) // interval + 1
+            slot += passed * interval
+        if slot <= last_slot:
+            return slot
+    return None
+
+
+class MonitoringDaemon:
+    """Планировщик проверок остатков в одном долгоживущем процессе"""
+
+    def __init__(self, bot_token, allowed_users, is_test=False):
+        self.bot_token = bot_token
+        self.allowed_users = allowed_users
+        self.is_test = is_test
+        self.stop_event = threading.Event()
+
+    def request_stop(self, signum=None, frame=None):
+        """Обработчик SIGTERM/SIGINT: завершиться после текущей проверки"""
+        print(f"🛑 Получен сигнал {signum}, завершаем работу...", flush=True)
+        self.stop_event.set()
+
+    def run_once(self):
+        """Одна проверка остатков; ошибки не останавливают демон"""
+        started = datetime.datetime.now()
+        print(f"{started}: Запуск проверки остатков", flush=True)
+        try:
+            check_and_notify(self.bot_token, self.allowed_users, self.is_test)
+        except Exception as e:
+            print(f"❌ Ошибка проверки остатков: {e}")
+            traceback.print_exc()
+        print(f"{datetime.datetime.now()}: Проверка завершена за {datetime.datetime.now() - started}", flush=True)
+        print("---", flush=True)
+
+    def run(self):
+        """Основной цикл до сигнала остановки"""
+        bot_type = "ТЕСТОВОГО" if self.is_test else "ОСНОВНОГО"
+        print(f"🚀 Запуск демона {bot_type} бота: каждые {DAEMON_CONFIG['interval_minutes']} мин, "
+              f"{DAEMON_CONFIG['start_hour']}:00-{DAEMON_CONFIG['end_hour']}:00", flush=True)
+
+        while not self.stop_event.is_set():
+            now = datetime.datetime.now()
+            run_at = next_run_time(
+                now,
+                DAEMON_CONFIG['interval_minutes'],
+                DAEMON_CONFIG['start_hour'],
+                DAEMON_CONFIG['end_hour'],
+                is_working_day
+            )
+            if run_at is None:
+                print("⚠️ Нет рабочих дней в ближайший месяц, повторная проверка через сутки", flush=True)
+                self.stop_event.wait(24 * 60 * 60)
+                continue
+
+            print(f"⏰ Следующая проверка: {run_at}", flush=True)
+            # Спим до запуска, но не дольше часа: переживаем смену календаря и перевод часов
+            wait_seconds = min((run_at - now).total_seconds(), 60 * 60)
+            if self.stop_event.wait(max(wait_seconds, 0)):
+                break
+            if datetime.datetime.now() >= run_at:
+                self.run_once()
+
+        get_shared_client().close()
+        print("👋 Демон остановлен", flush=True)
+
+
+def main(argv=None):
+    """Запуск демона основного (или с --test тестового) бота"""
+    argv = sys.argv[1:] if argv is None else argv
+
+    is_test = '--test' in argv
+    bot_config = TEST_BOT_CONFIG if is_test else MAIN_BOT_CONFIG
+    daemon = MonitoringDaemon(bot_config['bot_token'], bot_config['allowed_users'], is_test=is_test)
+
+    signal.signal(signal.SIGTERM, daemon.request_stop)
+    signal.signal(signal.SIGINT, daemon.request_stop)
+    daemon.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Планировщик загрузки транзакций по группам счетов.
+
+Вместо одного запроса со всеми account_ids счета делятся на группы так,
+чтобы в каждой было примерно FETCH_SHARD_TARGET_TRANSACTIONS транзакций
+(по числу транзакций счетов в прошлых запусках) и не больше
+FETCH_SHARD_MAX_ACCOUNTS счетов. Группы загружаются параллельно, каждая
+своей короткой цепочкой страниц. Размер страницы подбирается по среднему
+объему транзакции в ответах, чтобы ответ не превышал FETCH_MAX_PAGE_BYTES.
+
+Статистика (число транзакций по счетам и байт на транзакцию) хранится
+в data/fetch_stats_<biz_id>.json и обновляется после каждой загрузки.
+"""
+
+import json
+import os
+from pathlib import Path
+
+from config import FETCH_CONFIG, FINOLOG_CONFIG
+
+# Меньше этого размер страницы не опускаем: иначе растет число запросов
+MIN_PAGESIZE = 20
+
+
+def plan_shards(account_ids, counts, target=None, max_accounts=None):
+    """
+    Разбить счета на группы (first-fit decreasing по ожидаемому числу транзакций).
+
+    Args:
+        account_ids: ID счетов
+        counts: {account_id: число транзакций в прошлый раз}; для неизвестных
+                счетов берется среднее по известным
+        target: желаемое число транзакций в группе
+        max_accounts: максимум счетов в группе (ограничивает длину URL)
+
+    Returns:
+        list: [(ids, expected_transactions), ...]; ids в исходном порядке
+    """
+    target = target or FETCH_CONFIG['shard_target_transactions']
+    max_accounts = max_accounts or FETCH_CONFIG['shard_max_accounts']
+    account_ids = list(account_ids)
+    known = [counts[str(account_id)] for account_id in account_ids if str(account_id) in counts]
+    default = sum(known) / len(known) if known else target / max_accounts
+    expected = {account_id: counts.get(str(account_id), default) for account_id in account_ids}
+    position = {account_id: index for index, account_id in enumerate(account_ids)}
+
+    shards = []
+    for account_id in sorted(account_ids, key=lambda item: -expected[item]):
+        for shard in shards:
+            if len(shard[0]) < max_accounts and shard[1] + expected[account_id] <= target:
+                shard[0].append(account_id)
+                shard[1] += expected[account_id]
+                break
+        else:
+            shards.append([[account_id], expected[account_id]])
+
+    return [(sorted(ids, key=position.get), round(total)) for ids, total in shards]
+
+
+def tune_pagesize(bytes_per_transaction, max_page_bytes=None, max_pagesize=None):
+    """
+    Размер страницы, при котором ответ укладывается в max_page_bytes.
+    Больше FETCH_CONFIG['pagesize'] не поднимаем: это проверенный предел API.
+    """
+    max_page_bytes = max_page_bytes or FETCH_CONFIG['max_page_bytes']
+    max_pagesize = max_pagesize or FETCH_CONFIG['pagesize']
+    if not bytes_per_transaction:
+        return max_pagesize
+    return max(min(MIN_PAGESIZE, max_pagesize), min(max_pagesize, int(max_page_bytes // bytes_per_transaction)))
+
+
+class FetchStats:
+    """Статистика прошлых загрузок (JSON файл)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.counts = {}
+        self.bytes_per_transaction = None
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.counts = data.get('counts', {})
+                self.bytes_per_transaction = data.get('bytes_per_transaction')
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Не удалось прочитать статистику загрузки {self.path}: {e}")
+
+    @classmethod
+    def for_business(cls, biz_id=None):
+        biz_id = biz_id or FINOLOG_CONFIG['biz_id']
+        return cls(Path(FETCH_CONFIG['stats_dir']) / f"fetch_stats_{biz_id}.json")
+
+    def update(self, counts, response_bytes, transactions):
+        """Запомнить число транзакций по счетам и средний объем транзакции"""
+        self.counts = {str(account_id): count for account_id, count in counts.items()}
+        if transactions:
+            self.bytes_per_transaction = response_bytes / transactions
+
+    def save(self):
+        """Атомарно записать статистику (temp + rename)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'counts': self.counts, 'bytes_per_transaction': self.bytes_per_transaction}, f)
+        os.replace(temp_path, self.path)
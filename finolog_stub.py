@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальная заглушка Finolog и Telegram для бенчмарков и тестов без сети.
+
+Имитирует:
+- GET  /biz/{biz_id}/account              - список счетов с summary
+- GET  /biz/{biz_id}/transaction          - плановые транзакции с фильтрами
+                                            account_ids, date и пагинацией page/pagesize
+- POST /bot{token}/{method}               - методы Telegram Bot API (sendMessage и др.)
+
+Задержка, доля ошибок 500 и ответов 429 (с Retry-After), число счетов и транзакций настраиваются параметрами.
+Синтетические данные детерминированы (seed).
+
+Использование:
+    python3 finolog_stub.py --accounts 50 --transactions 10000 --latency 0.05
+"""
+
+import argparse
+import datetime
+import gzip
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def generate_fixture(accounts_count, transactions_count, start_date=None, seed=1):
+    """
+    Сгенерировать синтетические счета и плановые транзакции.
+
+    Даты транзакций равномерно распределены на год назад и год вперед
+    от start_date; около 5% транзакций - разбитые операции (сумма + части).
+
+    Returns:
+        tuple: (accounts, transactions) в формате ответов Finolog
+    """
+    rng = random.Random(seed)
+    start = start_date or datetime.date.today()
+    accounts = []
+    for index in range(accounts_count):
+        account_id = 100000 + index
+        accounts.append({
+            'id': account_id,
+            'name': f"Счет {index + 1}",
+            'currency_id': 1,
+            'summary': [{'currency_id': 1, 'balance': round(rng.uniform(-50_000, 2_000_000), 2)}],
+        })
+
+    transactions = []
+    next_id = 1
+    while len(transactions) < transactions_count:
+        account = accounts[rng.randrange(accounts_count)]
+        tx_type = rng.choice(('in', 'out'))
+        value = round(rng.uniform(100, 300_000), 2)
+        if tx_type == 'out':
+            value = -value
+        tx_date = start + datetime.timedelta(days=rng.randint(-365, 365))
+        tx = {
+            'id': next_id,
+            'account_id': account['id'],
+            'date': tx_date.strftime('%Y-%m-%d 00:00:00'),
+            'value': value,
+            'type': tx_type,
+            'status': 'planned',
+            'split_id': None,
+            'is_splitted': False,
+            'category_id': rng.randint(1, 40),
+            'contractor_id': rng.randint(1, 200),
+            'description': f"Плановая операция {next_id}",
+        }
+        next_id += 1
+        transactions.append(tx)
+        if rng.random() < 0.05 and len(transactions) + 2 <= transactions_count:
+            # Разбитая операция: сумма и две части, которые клиент должен отфильтровать
+            tx['is_splitted'] = True
+            for part_value in (round(value / 2, 2), round(value - round(value / 2, 2), 2)):
+                transactions.append(dict(tx, id=next_id, value=part_value, split_id=tx['id'], is_splitted=False))
+                next_id += 1
+
+    transactions.sort(key=lambda item: (item['date'], item['id']))
+    return accounts, transactions
+
+
+class StubState:
+    """Данные и счетчики заглушки"""
+
+    def __init__(self, accounts, transactions, latency=0.0, error_rate=0.0, max_pagesize=200, seed=1,
+                 throttle_rate=0.0, retry_after=1):
+        self.accounts = accounts
+        self.transactions = transactions
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.max_pagesize = max_pagesize
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.messages = []
+        self._filtered_cache = {}
+
+    def count(self, endpoint):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    def should_throttle(self):
+        if not self.throttle_rate:
+            return False
+        with self.lock:
+            return self.rng.random() < self.throttle_rate
+
+    def filtered_transactions(self, account_ids, date_range):
+        """Транзакции по фильтру (результат кешируется на время жизни заглушки)"""
+        key = (account_ids, date_range)
+        with self.lock:
+            cached = self._filtered_cache.get(key)
+        if cached is not None:
+            return cached
+        result = self.transactions
+        if account_ids:
+            wanted = {int(item) for item in account_ids.split(',') if item}
+            result = [tx for tx in result if tx['account_id'] in wanted]
+        if date_range:
+            date_from, _, date_to = date_range.partition(',')
+            result = [tx for tx in result if date_from <= tx['date'][:10] <= (date_to or '9999-12-31')]
+        with self.lock:
+            self._filtered_cache[key] = result
+        return result
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов Finolog / Telegram"""
+
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело пишутся отдельно: без TCP_NODELAY keep-alive ответ ждет delayed ACK (~40 мс)
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            headers = dict(headers or {}, **{'Content-Encoding': 'gzip'})
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self, endpoint):
+        self.state.count(endpoint)
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.state.should_throttle():
+            self._send_json(429, {'error': 'too many requests'}, {'Retry-After': str(self.state.retry_after)})
+            return False
+        if self.state.should_fail():
+            self._send_json(500, {'error': 'stub failure'})
+            return False
+        return True
+
+    def do_GET(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        parts = [part for part in parsed.path.split('/') if part]
+
+        if len(parts) >= 3 and parts[-3] == 'biz' and parts[-1] == 'account':
+            if self._simulate('account'):
+                self._send_json(200, self.state.accounts)
+            return
+
+        if len(parts) >= 3 and parts[-3] == 'biz' and parts[-1] == 'transaction':
+            if not self._simulate('transaction'):
+                return
+            transactions = self.state.filtered_transactions(query.get('account_ids', ''), query.get('date', ''))
+            page = max(int(query.get('page', 1)), 1)
+            pagesize = min(int(query.get('pagesize', 50)), self.state.max_pagesize)
+            self._send_json(200, transactions[(page - 1) * pagesize:page * pagesize])
+            return
+
+        self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        parts = [part for part in parsed.path.split('/') if part]
+        length = int(self.headers.get('Content-Length', 0))
+        form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode('utf-8')))
+
+        if len(parts) == 2 and parts[0].startswith('bot'):
+            method = parts[1]
+            if not self._simulate(f"telegram:{method}"):
+                return
+            with self.state.lock:
+                self.state.messages.append((method, form))
+                message_id = len(self.state.messages)
+            self._send_json(200, {'ok': True, 'result': {'message_id': message_id, 'chat': {'id': form.get('chat_id')}}})
+            return
+
+        self._send_json(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+
+def start_stub_server(state, host='127.0.0.1', port=0):
+    """
+    Запустить заглушку в фоновом потоке.
+
+    Returns:
+        ThreadingHTTPServer: сервер (адрес в server.server_address, остановка - shutdown())
+    """
+    handler = type('BoundStubHandler', (StubHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main(argv=None):
+    """Запуск заглушки как отдельного процесса; печатает порт в первой строке"""
+    parser = argparse.ArgumentParser(description="Заглушка Finolog/Telegram")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--accounts', type=int, default=10)
+    parser.add_argument('--transactions', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа, секунд")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 500 (0..1)")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="доля ответов 429 (0..1)")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After для ответов 429, секунд")
+    parser.add_argument('--max-pagesize', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    accounts, transactions = generate_fixture(args.accounts, args.transactions, seed=args.seed)
+    state = StubState(accounts, transactions, args.latency, args.error_rate, args.max_pagesize, args.seed,
+                      args.throttle_rate, args.retry_after)
+    server = start_stub_server(state, args.host, args.port)
+    print(server.server_address[1], flush=True)
+    try:
+        sys.stdin.read()
+    except KeyboardInterrupt:
+        pass
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Кеш рассчитанных интервалов остатков по счетам.
+
+Для каждого счета хранится отпечаток входных данных расчета (текущий
+остаток, плановые транзакции в пределах горизонта, начало и длина
+горизонта, порог и движок) и найденные интервалы. Транзакции прошлого года
+в отпечаток не входят: их правка на прогноз не влияет. Если отпечаток не изменился, интервалы
+берутся из кеша, и пересчитываются только изменившиеся счета.
+"""
+
+import hashlib
+import json
+import os
+from datetime import date
+from pathlib import Path
+
+from balance_engine import transaction_day_offset
+
+from config import ANALYSIS_CONFIG, FINOLOG_CONFIG
+
+
+def account_input_key(current_balance, transactions, start_date, days_ahead, threshold, check_threatening,
+                      engine, compact=None):
+    """
+    Отпечаток входных данных расчета одного счета.
+
+    Args:
+        transactions: плановые транзакции счета (используются дата, сумма и тип
+                      транзакций со смещением дня в [0, days_ahead])
+        compact: CompactTransactions счета - если задан, хешируются его массивы
+                 в пределах горизонта
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((current_balance, start_date, days_ahead, threshold, check_threatening, engine)).encode())
+    start_ordinal = date.fromisoformat(start_date).toordinal()
+    if compact is not None:
+        digest.update(compact.horizon_bytes(start_ordinal, days_ahead))
+    else:
+        parts = []
+        for tx in transactions:
+            offset = transaction_day_offset(tx.get('date'), start_ordinal)
+            if offset is not None and 0 <= offset <= days_ahead:
+                parts.append(f"{tx['date']}|{tx.get('value', 0)!r}|{tx.get('type', '')};")
+        digest.update("".join(parts).encode())
+    return digest.hexdigest()
+
+
+class ForecastCache:
+    """Интервалы по счетам с отпечатками входных данных (JSON файл)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Кеш прогноза {self.path} поврежден, пересчитываем все счета: {e}")
+
+    @classmethod
+    def for_business(cls, biz_id=None):
+        """Кеш бизнеса (файл forecast_cache_<biz_id>.json)"""
+        biz_id = biz_id or FINOLOG_CONFIG['biz_id']
+        return cls(Path(ANALYSIS_CONFIG['forecast_cache_dir']) / f"forecast_cache_{biz_id}.json")
+
+    def get(self, account_id, key):
+        """(negative_intervals, threatening_intervals) из кеша или None"""
+        entry = self.entries.get(str(account_id))
+        if entry is None or entry['key'] != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return (
+            [tuple(interval) for interval in entry['negative']],
+            [tuple(interval) for interval in entry['threatening']],
+        )
+
+    def put(self, account_id, key, breaches):
+        negative_intervals, threatening_intervals = breaches
+        self.entries[str(account_id)] = {
+            'key': key,
+            'negative': [list(interval) for interval in negative_intervals],
+            'threatening': [list(interval) for interval in threatening_intervals],
+        }
+
+    def retain(self, account_ids):
+        """Удалить записи счетов, которых больше нет"""
+        keep = {str(account_id) for account_id in account_ids}
+        self.entries = {account_id: entry for account_id, entry in self.entries.items() if account_id in keep}
+
+    def save(self):
+        """Атомарно записать кеш (temp + rename)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
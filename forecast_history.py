@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+История прогнозов остатков: append-only бинарное хранилище с отображением в память.
+
+Каждый запуск дописывает в data/forecast_history_<biz_id>.bin блок
+фиксированной ширины:
+    [ID счетов: int64 × n][остатки в копейках: int64 × n × days]
+и запись в индекс forecast_history_<biz_id>.idx (RECORD_FORMAT):
+    время запуска, смещение блока, n счетов, days, порядковый номер первого дня.
+Индекс упорядочен по времени, поэтому диапазон запусков находится бинарным
+поиском. Чтение идет через mmap: запрос по одному счету затрагивает только
+его строки в нужных блоках, а не весь файл.
+
+Запись и чтение согласуются блокировкой flock на файле .lock: запись
+(дописывание и очистка) - монопольно, чтение - совместно. Запуски старше
+FORECAST_HISTORY_DAYS удаляются перезаписью файлов (prune).
+
+Использование:
+    python3 forecast_history.py runs
+    python3 forecast_history.py account 190104 [--since 2026-09-01] [--threshold 0]
+    python3 forecast_history.py prune [--days 90]
+"""
+
+import argparse
+import contextlib
+import datetime
+import fcntl
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+from config import ANALYSIS_CONFIG, FINOLOG_CONFIG
+
+# time (double), data offset (int64), accounts, days, start ordinal, резерв
+RECORD_FORMAT = struct.Struct('<dqiiii')
+ITEM_SIZE = 8
+
+
+class HistoryRun:
+    """Запись индекса: один запуск"""
+
+    __slots__ = ('timestamp', 'offset', 'accounts', 'days', 'start_ordinal')
+
+    def __init__(self, timestamp, offset, accounts, days, start_ordinal):
+        self.timestamp = timestamp
+        self.offset = offset
+        self.accounts = accounts
+        self.days = days
+        self.start_ordinal = start_ordinal
+
+    @property
+    def start_date(self):
+        return datetime.date.fromordinal(self.start_ordinal).isoformat()
+
+    @property
+    def run_time(self):
+        return datetime.datetime.fromtimestamp(self.timestamp)
+
+
+class _IndexView:
+    """Записи индекса поверх mmap как последовательность HistoryRun"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def __len__(self):
+        return len(self.buffer) // RECORD_FORMAT.size
+
+    def __getitem__(self, position):
+        timestamp, offset, accounts, days, start_ordinal, _ = RECORD_FORMAT.unpack_from(
+            self.buffer, position * RECORD_FORMAT.size
+        )
+        return HistoryRun(timestamp, offset, accounts, days, start_ordinal)
+
+
+class _TimestampView:
+    """Только время запусков из индекса - ключ для bisect"""
+
+    def __init__(self, view):
+        self.view = view
+
+    def __len__(self):
+        return len(self.view)
+
+    def __getitem__(self, position):
+        return RECORD_FORMAT.unpack_from(self.view.buffer, position * RECORD_FORMAT.size)[0]
+
+
+def _map(path):
+    """Отобразить файл в память только для чтения (None для пустого/отсутствующего)"""
+    try:
+        with open(path, 'rb') as f:
+            if f.seek(0, 2) == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+class ForecastHistory:
+    """Хранилище истории прогнозов одного бизнеса"""
+
+    def __init__(self, base_path):
+        base_path = Path(base_path)
+        self.data_path = base_path.with_suffix('.bin')
+        self.index_path = base_path.with_suffix('.idx')
+        self.lock_path = base_path.with_suffix('.lock')
+
+    @classmethod
+    def for_business(cls, biz_id=None):
+        biz_id = biz_id or FINOLOG_CONFIG['biz_id']
+        return cls(Path(ANALYSIS_CONFIG['history_dir']) / f"forecast_history_{biz_id}")
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive):
+        """flock на файле .lock: монопольно для записи, совместно для чтения"""
+        with open(self.lock_path, 'ab') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def append(self, account_ids, balance_rows, start_date, timestamp=None):
+        """
+        Дописать прогноз запуска.
+
+        Args:
+            account_ids: ID счетов (порядок строк)
+            balance_rows: по строке остатков в копейках на каждый счет, одинаковой длины
+            start_date: дата первого дня "YYYY-MM-DD"
+            timestamp: время запуска (по умолчанию сейчас)
+
+        Returns:
+            HistoryRun: записанная запись индекса
+        """
+        days = len(balance_rows[0]) if balance_rows else 0
+        block = array('q', account_ids)
+        for row in balance_rows:
+            if len(row) != days:
+                raise ValueError("строки прогноза должны быть одинаковой длины")
+            block.extend(row)
+
+        self.data_path.parent.mkdir(parents=True, exist_ok=True)
+        # Смещение блока и запись индекса - под одной блокировкой: основной и тестовый
+        # бот одного бизнеса могут дописывать историю одновременно
+        with self._locked(exclusive=True):
+            runs = self._read_runs()
+            # Время берется под блокировкой, чтобы параллельные запуски шли в индексе по порядку
+            timestamp = time.time() if timestamp is None else timestamp
+            if runs and timestamp < runs[-1].timestamp:
+                raise ValueError("время запуска меньше последнего в индексе")
+
+            # Сначала данные, потом индекс: блок без записи в индексе читатели не видят
+            with open(self.data_path, 'ab') as f:
+                offset = f.seek(0, 2)
+                f.write(block.tobytes())
+            run = HistoryRun(timestamp, offset, len(account_ids), days,
+                             datetime.date.fromisoformat(start_date).toordinal())
+            with open(self.index_path, 'ab') as f:
+                f.write(RECORD_FORMAT.pack(run.timestamp, run.offset, run.accounts, run.days, run.start_ordinal, 0))
+        return run
+
+    def prune(self, before):
+        """
+        Удалить запуски раньше before (datetime или timestamp): данные и индекс
+        перезаписываются без них.
+
+        Returns:
+            int: число удаленных запусков
+        """
+        if not self.index_path.exists():
+            return 0
+        with self._locked(exclusive=True):
+            runs = self._read_runs()
+            first_kept = bisect_left([run.timestamp for run in runs], _as_timestamp(before))
+            if first_kept == 0:
+                return 0
+            shift = runs[first_kept].offset if first_kept < len(runs) else None
+
+            data_tmp = self.data_path.with_name(f".{self.data_path.name}.{os.getpid()}.tmp")
+            index_tmp = self.index_path.with_name(f".{self.index_path.name}.{os.getpid()}.tmp")
+            with open(data_tmp, 'wb') as target:
+                if shift is not None:
+                    with open(self.data_path, 'rb') as source:
+                        source.seek(shift)
+                        while True:
+                            chunk = source.read(1024 * 1024)
+                            if not chunk:
+                                break
+                            target.write(chunk)
+            with open(index_tmp, 'wb') as target:
+                for run in runs[first_kept:]:
+                    target.write(RECORD_FORMAT.pack(run.timestamp, run.offset - shift, run.accounts,
+                                                    run.days, run.start_ordinal, 0))
+            # Читатели ждут совместную блокировку, поэтому пару файлов видят только целиком
+            os.replace(data_tmp, self.data_path)
+            os.replace(index_tmp, self.index_path)
+        return first_kept
+
+    def runs(self, since=None, until=None):
+        """Записи индекса за период [since, until] (datetime или timestamp)"""
+        if not self.index_path.exists():
+            return []
+        with self._locked(exclusive=False):
+            return self._read_runs(since, until)
+
+    def _read_runs(self, since=None, until=None):
+        index = _map(self.index_path)
+        if index is None:
+            return []
+        try:
+            view = _IndexView(index)
+            timestamps = _TimestampView(view)
+            low = bisect_left(timestamps, _as_timestamp(since)) if since is not None else 0
+            high = bisect_right(timestamps, _as_timestamp(until)) if until is not None else len(view)
+            return [view[position] for position in range(low, high)]
+        finally:
+            index.close()
+
+    def last_run(self):
+        runs = self.runs()
+        return runs[-1] if runs else None
+
+    def account_history(self, account_id, since=None, until=None):
+        """
+        Прогноз счета по запускам.
+
+        Yields:
+            tuple: (HistoryRun, memoryview остатков в копейках) - только запуски,
+                   где счет был; memoryview действителен до следующей итерации
+        """
+        if not self.index_path.exists():
+            return
+        with self._locked(exclusive=False):
+            runs = self._read_runs(since, until)
+            data = _map(self.data_path) if runs else None
+        if data is None:
+            return
+        # После отображения в память файл может быть заменен prune - mmap держит прежний
+        try:
+            for run in runs:
+                ids = memoryview(data)[run.offset:run.offset + run.accounts * ITEM_SIZE].cast('q')
+                try:
+                    row = ids.tolist().index(int(account_id))
+                except ValueError:
+                    continue
+                finally:
+                    ids.release()
+                start = run.offset + (run.accounts + row * run.days) * ITEM_SIZE
+                balances = memoryview(data)[start:start + run.days * ITEM_SIZE].cast('q')
+                try:
+                    yield run, balances
+                finally:
+                    balances.release()
+        finally:
+            data.close()
+
+
+def _as_timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time()).timestamp()
+    return float(value)
+
+
+def min_balance_trend(history, account_id, since=None, until=None, days=None):
+    """
+    Минимальный прогнозный остаток счета по запускам.
+
+    Returns:
+        list: [(время запуска, минимум в рублях, дата минимума), ...]
+    """
+    trend = []
+    for run, balances in history.account_history(account_id, since, until):
+        length = len(balances) if days is None else min(len(balances), days + 1)
+        if length == 0:
+            continue
+        offset = min(range(length), key=balances.__getitem__)
+        trend.append((run.run_time, balances[offset] / 100,
+                      datetime.date.fromordinal(run.start_ordinal + offset).isoformat()))
+    return trend
+
+
+def first_breach_trend(history, account_id, threshold=0, since=None, until=None):
+    """
+    Дата первого дня с остатком ниже threshold (рубли) по запускам.
+
+    Returns:
+        list: [(время запуска, дата первого нарушения или None), ...]
+    """
+    threshold_kopecks = int(round(threshold * 100))
+    trend = []
+    for run, balances in history.account_history(account_id, since, until):
+        first = next((offset for offset, balance in enumerate(balances) if balance < threshold_kopecks), None)
+        trend.append((run.run_time,
+                      datetime.date.fromordinal(run.start_ordinal + first).isoformat() if first is not None else None))
+    return trend
+
+
+def record_forecast(account_ids, current_balances, start_date, days_ahead, compact_index=None, accumulator=None):
+    """
+    Сохранить прогноз запуска в историю текущего бизнеса.
+
+    Ряды строятся по compact_index (CompactTransactionIndex) или по
+    accumulator (DailyDeltaAccumulator) потокового режима. Запуски старше
+    ANALYSIS_CONFIG['history_days'] удаляются.
+    """
+    from compact_transactions import to_kopecks
+
+    start_ordinal = datetime.date.fromisoformat(start_date).toordinal()
+    rows = []
+    for account_id in account_ids:
+        opening = current_balances[account_id]['balance']
+        if accumulator is not None:
+            rows.append([to_kopecks(balance) for balance in accumulator.daily_balances(int(account_id), opening)])
+        else:
+            rows.append(compact_index.get(int(account_id)).daily_balances_kopecks(
+                to_kopecks(opening), start_ordinal, days_ahead
+            ))
+    history = ForecastHistory.for_business()
+    run = history.append(account_ids, rows, start_date)
+    prune_history(history, ANALYSIS_CONFIG['history_days'], now=run.timestamp)
+    return run
+
+
+def prune_history(history, days, now=None):
+    """
+    Удалить запуски старше days дней (0 - не удалять).
+
+    Файлы перезаписываются, только когда устаревших запусков набралось хотя бы
+    на десятую часть срока, а не на каждом запуске.
+    """
+    if days <= 0:
+        return 0
+    now = time.time() if now is None else now
+    runs = history.runs()
+    if not runs or runs[0].timestamp > now - (days + max(1, days // 10)) * 86400:
+        return 0
+    removed = history.prune(now - days * 86400)
+    if removed:
+        print(f"🧹 История прогнозов: удалено {removed} запусков старше {days} дней")
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="История прогнозов остатков")
+    parser.add_argument('command', choices=('runs', 'account', 'prune'))
+    parser.add_argument('account_id', nargs='?', type=int)
+    parser.add_argument('--since', type=datetime.date.fromisoformat, help="с даты запуска YYYY-MM-DD")
+    parser.add_argument('--threshold', type=float, default=0.0, help="порог первого нарушения, рубли")
+    parser.add_argument('--days', type=int, help="горизонт для минимума, дней (для prune - срок хранения)")
+    args = parser.parse_args(argv)
+
+    history = ForecastHistory.for_business()
+    if args.command == 'prune':
+        days = ANALYSIS_CONFIG['history_days'] if args.days is None else args.days
+        if days <= 0:
+            parser.error("срок хранения должен быть больше 0")
+        removed = history.prune(time.time() - days * 86400)
+        print(f"🧹 Удалено запусков: {removed}")
+        return 0
+    if args.command == 'runs':
+        for run in history.runs(args.since):
+            print(f"{run.run_time:%Y-%m-%d %H:%M:%S}  с {run.start_date}  счетов {run.accounts}  дней {run.days}")
+        return 0
+
+    if args.account_id is None:
+        parser.error("укажите account_id")
+    minimums = min_balance_trend(history, args.account_id, args.since, days=args.days)
+    breaches = first_breach_trend(history, args.account_id, args.threshold, args.since)
+    print(f"{'запуск':<19}  {'минимум, р.':>14}  {'дата минимума':<13}  первый день ниже {args.threshold:,.0f}")
+    for (run_time, min_balance, min_date), (_, first_breach) in zip(minimums, breaches):
+        print(f"{run_time:%Y-%m-%d %H:%M:%S}  {min_balance:>14,.0f}  {min_date:<13}  {first_breach or '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 """
 Проверка праздников на основе JSON файлов
-Читает данные из holidays_YYYY.json
+Читает данные из holidays_YYYY.json, компилирует каждый год в битовую карту
+рабочих дней и кеширует ее в памяти до изменения mtime файла
 """
 
 import datetime
+import itertools
 import json
 import os
 
@@ -27,62 +29,143 @@ def load_holidays_json(year):
         print(f"❌ Ошибка загрузки {filename}: {e}")
         return None
 
-def is_working_day(date):
-    """Проверка, является ли день рабочим"""
-    year = date.year
+class YearCalendar:
+    """
+    Скомпилированный календарь года.
+    
+    day_bits - битовая карта по дням года (бит 1 = рабочий день),
+    names - подписи дней по номеру дня года (праздник или перенос).
+    """
+    
+    __slots__ = ('year', 'mtime', 'day_bits', 'names')
+    
+    def __init__(self, year, mtime, day_bits, names):
+        self.year = year
+        self.mtime = mtime
+        self.day_bits = day_bits
+        self.names = names
+    
+    def is_working(self, date):
+        index = date.timetuple().tm_yday - 1
+        return bool((self.day_bits[index >> 3] >> (index & 7)) & 1)
+    
+    def name(self, date):
+        return self.names.get(date.timetuple().tm_yday - 1)
+    
+    def working_indexes(self, start_index=0, end_index=None):
+        """Номера рабочих дней года в [start_index, end_index) - по байтам битовой карты"""
+        day_bits = self.day_bits
+        if end_index is None:
+            end_index = len(day_bits) * 8
+        for byte_index in range(start_index >> 3, (end_index + 7) >> 3):
+            byte = day_bits[byte_index]
+            # Нулевой байт - восемь выходных подряд, пропускаем целиком
+            while byte:
+                lowest = byte & -byte
+                index = (byte_index << 3) + lowest.bit_length() - 1
+                if index >= end_index:
+                    return
+                if index >= start_index:
+                    yield index
+                byte ^= lowest
+
+def compile_year_calendar(year, holidays_data, mtime=None):
+    """Скомпилировать данные holidays_YYYY.json (или None - базовая логика) в YearCalendar"""
+    first_day = datetime.date(year, 1, 1)
+    days_in_year = (datetime.date(year + 1, 1, 1) - first_day).days
+    
+    holiday_names = {}
+    working_days = set()
+    transfer_names = {}
+    if holidays_data:
+        # Первое совпадение в списке - как при линейном поиске
+        for holiday in holidays_data.get('holidays', []):
+            holiday_names.setdefault(holiday['date'], holiday['name'])
+        working_days = set(holidays_data.get('working_days', []))
+        for transfer in holidays_data.get('transfers', []):
+            transfer_names.setdefault(transfer['to'], f"Рабочий день: {transfer['description']}")
+    
+    day_bits = bytearray((days_in_year + 7) // 8)
+    names = {}
+    for index in range(days_in_year):
+        date = first_day + datetime.timedelta(days=index)
+        date_str = date.strftime('%Y-%m-%d')
+        
+        # Переносы важнее праздников, праздники важнее дня недели
+        if date_str in working_days:
+            working = True
+        elif date_str in holiday_names:
+            working = False
+        else:
+            working = date.weekday() < 5
+        if working:
+            day_bits[index >> 3] |= 1 << (index & 7)
+        
+        if date_str in holiday_names:
+            names[index] = holiday_names[date_str]
+        elif date_str in working_days and date_str in transfer_names:
+            names[index] = transfer_names[date_str]
+    
+    return YearCalendar(year, mtime, bytes(day_bits), names)
+
+# Скомпилированные календари по годам; перечитываются при смене mtime файла
+_calendar_cache = {}
+
+def get_year_calendar(year):
+    """Получить скомпилированный календарь года из кеша (с проверкой mtime файла)"""
+    filename = f"holidays_{year}.json"
+    try:
+        mtime = os.stat(filename).st_mtime_ns
+    except OSError:
+        mtime = None
     
-    # Загружаем данные о праздниках
-    holidays_data = load_holidays_json(year)
+    calendar = _calendar_cache.get(year)
+    if calendar is not None and calendar.mtime == mtime:
+        return calendar
     
+    holidays_data = load_holidays_json(year) if mtime is not None else None
     if not holidays_data:
         # Fallback: базовая логика
+        if mtime is None:
+            print(f"⚠️ Файл {filename} не найден")
         print(f"⚠️ Используем базовую логику для {year} года")
-        return not (date.weekday() >= 5)  # Только выходные
-    
-    # Проверяем рабочие дни (переносы)
-    working_days = holidays_data.get('working_days', [])
-    date_str = date.strftime('%Y-%m-%d')
-    
-    if date_str in working_days:
-        return True
-    
-    # Проверяем праздники
-    holidays = holidays_data.get('holidays', [])
-    for holiday in holidays:
-        if holiday['date'] == date_str:
-            return False
-    
-    # Проверяем обычные выходные
-    if date.weekday() >= 5:
-        return False
-    
-    return True
+    calendar = compile_year_calendar(year, holidays_data, mtime)
+    _calendar_cache[year] = calendar
+    return calendar
+
+def is_working_day(date):
+    """Проверка, является ли день рабочим"""
+    return get_year_calendar(date.year).is_working(date)
 
 def get_holiday_info(date):
     """Получить информацию о празднике"""
-    year = date.year
-    holidays_data = load_holidays_json(year)
-    
-    if not holidays_data:
-        return None
-    
-    date_str = date.strftime('%Y-%m-%d')
-    
-    # Проверяем праздники
-    holidays = holidays_data.get('holidays', [])
-    for holiday in holidays:
-        if holiday['date'] == date_str:
-            return holiday['name']
-    
-    # Проверяем рабочие дни (переносы)
-    working_days = holidays_data.get('working_days', [])
-    if date_str in working_days:
-        transfers = holidays_data.get('transfers', [])
-        for transfer in transfers:
-            if transfer['to'] == date_str:
-                return f"Рабочий день: {transfer['description']}"
-    
-    return None
+    return get_year_calendar(date.year).name(date)
+
+def iter_working_days(start_date, end_date=None):
+    """
+    Рабочие дни начиная с start_date (до end_date включительно, если задан).
+    Календарь каждого года берется из кеша один раз, дни - из его битовой карты.
+    """
+    year = start_date.year
+    start_index = start_date.timetuple().tm_yday - 1
+    while end_date is None or year <= end_date.year:
+        calendar = get_year_calendar(year)
+        first_ordinal = datetime.date(year, 1, 1).toordinal()
+        end_index = end_date.timetuple().tm_yday if end_date is not None and year == end_date.year else None
+        for index in calendar.working_indexes(start_index, end_index):
+            yield datetime.date.fromordinal(first_ordinal + index)
+        year += 1
+        start_index = 0
+
+def next_working_days(start_date, count):
+    """Ближайшие count рабочих дней, начиная с start_date включительно"""
+    return list(itertools.islice(iter_working_days(start_date), max(0, count)))
+
+def working_days_between(start_date, end_date):
+    """Рабочие дни в диапазоне [start_date, end_date] включительно"""
+    if end_date < start_date:
+        return []
+    return list(iter_working_days(start_date, end_date))
 
 def test_holiday_system():
     """Тестирование системы праздников"""
@@ -114,6 +197,12 @@ def test_holiday_system():
             print(f"{date.strftime('%d.%m.%Y')} ({weekday}) - {status} - {info}")
         else:
             print(f"{date.strftime('%d.%m.%Y')} ({weekday}) - {status}")
+    
+    print("="*60)
+    first_days = next_working_days(datetime.date(2026, 1, 1), 3)
+    print(f"Первые рабочие дни 2026: {', '.join(d.strftime('%d.%m.%Y') for d in first_days)}")
+    working_2026 = working_days_between(datetime.date(2026, 1, 1), datetime.date(2026, 12, 31))
+    print(f"Рабочих дней в 2026: {len(working_2026)}")
 
 def main():
     """Основная функция для проверки"""
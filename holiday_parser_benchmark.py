@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк парсеров календаря КонсультантПлюс на сохраненных страницах.
+
+Сравнивает однопроходный parse_consultant_html с прежним
+parse_consultant_html_legacy (findall на каждый шаблон): время разбора
+каждой страницы и совпадение найденных праздников и переносов. Сеть нужна
+только для --download, сам замер идет по файлам.
+
+Использование:
+    python3 holiday_parser_benchmark.py --download holiday_pages --years 2025,2026
+    python3 holiday_parser_benchmark.py holiday_pages/*.html --repeat 50
+"""
+
+import argparse
+import contextlib
+import io
+import re
+import sys
+import time
+from pathlib import Path
+
+from holiday_updater_minimal import get_consultant_html, parse_consultant_html, parse_consultant_html_legacy
+
+
+def download_pages(directory, years):
+    """Сохранить страницы календаря за годы в directory/consultant_<year>.html"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for year in years:
+        html_content, _ = get_consultant_html(year)
+        if html_content is None:
+            continue
+        path = directory / f"consultant_{year}.html"
+        path.write_text(html_content, encoding='utf-8')
+        paths.append(path)
+    return paths
+
+
+def page_year(path, html_content):
+    """Год страницы: из имени файла, иначе первый год 20xx в тексте"""
+    match = re.search(r'(20\d\d)', Path(path).name) or re.search(r'(20\d\d)', html_content)
+    return int(match.group(1)) if match else 2025
+
+
+def measure(parser, html_content, year, repeat):
+    """Лучшее время разбора из repeat запусков (мс) и результат"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        # Прежний парсер печатает каждую находку - печать в замер не входит
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = parser(html_content, year)
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+def same_result(legacy, single_pass):
+    """Совпадают ли праздники и переносы (порядок праздников тоже)"""
+    return (legacy['holidays'] == single_pass['holidays']
+            and legacy['working_days'] == single_pass['working_days'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение парсеров календаря КонсультантПлюс")
+    parser.add_argument('pages', nargs='*', help="сохраненные HTML страницы")
+    parser.add_argument('--download', metavar='DIR', help="сначала скачать страницы в DIR")
+    parser.add_argument('--years', default='2025,2026', help="годы для --download через запятую")
+    parser.add_argument('--repeat', type=int, default=20, help="число разборов страницы (берется лучший)")
+    args = parser.parse_args(argv)
+
+    pages = [Path(page) for page in args.pages]
+    if args.download:
+        pages += download_pages(args.download, [int(year) for year in args.years.split(',') if year.strip()])
+    if not pages:
+        parser.error("укажите сохраненные страницы или --download DIR")
+
+    print(f"{'страница':<28} {'размер, КБ':>10} {'прежний, мс':>12} {'один проход, мс':>16} {'ускорение':>10}  результат")
+    ok = True
+    for path in pages:
+        html_content = path.read_text(encoding='utf-8')
+        year = page_year(path, html_content)
+        legacy_ms, legacy = measure(parse_consultant_html_legacy, html_content, year, max(1, args.repeat))
+        single_ms, single_pass = measure(parse_consultant_html, html_content, year, max(1, args.repeat))
+        same = same_result(legacy, single_pass)
+        ok = ok and same
+        speedup = legacy_ms / single_ms if single_ms else float('inf')
+        print(f"{path.name:<28} {len(html_content.encode('utf-8')) / 1024:>10.1f} {legacy_ms:>12.2f} "
+              f"{single_ms:>16.2f} {speedup:>9.1f}x  {'совпадает' if same else 'РАЗЛИЧАЕТСЯ'}"
+              f" (сокращенных дней: {len(single_pass['shortened_days'])})")
+
+    if not ok:
+        print("❌ Результаты парсеров различаются")
+        return 1
+    print("✅ Результаты парсеров совпадают")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,34 +2,216 @@
 """
 Минимальный обновлятор календаря праздников
 Только: обращение к КонсультантПлюс, парсинг, сохранение в JSON
+
+Годы обновляются скользящим окном (HOLIDAY_YEARS_BACK лет назад и
+HOLIDAY_YEARS_AHEAD вперед от текущего) параллельно. ETag и Last-Modified
+ответа хранятся в самом holidays_YYYY.json и отправляются условным
+запросом; на 304 файл не разбирается и не перезаписывается. Запись
+атомарная (temp + rename), поэтому holiday_checker_json не увидит
+наполовину записанный файл.
 """
 
 import datetime
-import urllib.request
 import json
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import get_int
+
+CONSULTANT_URL = "https://www.consultant.ru/law/ref/calendar/proizvodstvennye/{year}/"
+
+HOLIDAY_UPDATER_CONFIG = {
+    'years_back': get_int("HOLIDAY_YEARS_BACK", default=0),
+    'years_ahead': get_int("HOLIDAY_YEARS_AHEAD", default=1),
+    'timeout': 10,
+}
+
+def get_consultant_html(year, validators=None):
+    """
+    Получить HTML страницу календаря с КонсультантПлюс.
+
+    Args:
+        year: год
+        validators: {'etag': ..., 'last_modified': ...} прошлого ответа
+                    для условного запроса
+
+    Returns:
+        tuple: (HTML или None, новые validators); HTML None и прежние
+               validators при 304, (None, None) при ошибке
+    """
+    from http_client import get_shared_client
+
+    headers = {'User-Agent': 'WatchDog Holiday Updater'}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
 
-def get_consultant_html(year):
-    """Получить HTML страницу календаря с КонсультантПлюс"""
     try:
-        url = f"https://www.consultant.ru/law/ref/calendar/proizvodstvennye/{year}/"
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', 'WatchDog Holiday Updater')
-        
-        with urllib.request.urlopen(req, timeout=10) as response:
-            if response.getcode() == 200:
-                html_content = response.read().decode('utf-8')
-                print(f"✅ КонсультантПлюс {year}: HTML получен ({len(html_content)} символов)")
-                return html_content
-            else:
-                print(f"❌ КонсультантПлюс {year}: HTTP {response.getcode()}")
-                return None
+        response = get_shared_client().get(
+            CONSULTANT_URL.format(year=year), headers=headers, timeout=HOLIDAY_UPDATER_CONFIG['timeout']
+        )
     except Exception as e:
         print(f"❌ Ошибка получения HTML {year}: {e}")
-        return None
+        return None, None
+
+    if response.status == 304:
+        print(f"✅ КонсультантПлюс {year}: не изменился (304)")
+        return None, validators
+    if response.status != 200:
+        print(f"❌ КонсультантПлюс {year}: HTTP {response.status}")
+        return None, None
+
+    html_content = response.body.decode('utf-8')
+    print(f"✅ КонсультантПлюс {year}: HTML получен ({len(html_content)} символов)")
+    return html_content, {
+        'etag': response.headers.get('etag'),
+        'last_modified': response.headers.get('last-modified'),
+    }
+
+# Праздники в тексте страницы: (месяц, ключевое слово, название). Праздник
+# засчитывается, если после даты этого месяца в той же строке встретилось
+# ключевое слово (как в прежних шаблонах "(\d+)\s+января.*?Новый год")
+HOLIDAY_KEYWORDS = [
+    (1, "Новый год", "Новый год"),
+    (1, "Рождество", "Рождество Христово"),
+    (2, "защитника Отечества", "День защитника Отечества"),
+    (3, "женский день", "Международный женский день"),
+    (5, "Весны и Труда", "Праздник Весны и Труда"),
+    (5, "Победы", "День Победы"),
+    (6, "России", "День России"),
+    (11, "народного единства", "День народного единства"),
+]
+
+MONTHS_GENITIVE = ('января', 'февраля', 'марта', 'апреля', 'мая', 'июня', 'июля',
+                   'августа', 'сентября', 'октября', 'ноября', 'декабря')
+MONTHS_NOMINATIVE = ('январь', 'февраль', 'март', 'апрель', 'май', 'июнь', 'июль',
+                     'август', 'сентябрь', 'октябрь', 'ноябрь', 'декабрь')
+
+# Одна альтернатива на все, что нужно со страницы: дата, ключевое слово
+# праздника, заголовок месяца в таблице календаря и ячейка
+# предпраздничного (сокращенного) дня. Опережающая проверка первого символа
+# позволяет re пропускать остальной текст, не пробуя каждую альтернативу
+_KEYWORD_FIRST_CHARS = ''.join(sorted({c for _, keyword, _ in HOLIDAY_KEYWORDS for c in (keyword[0].lower(), keyword[0].upper())}))
+_TOKEN_RE = re.compile(
+    r'(?=[\d<' + _KEYWORD_FIRST_CHARS + r'])(?:'
+    r'(?P<day>\d+)\s+(?P<month>(?i:' + '|'.join(MONTHS_GENITIVE) + r'))'
+    r'|(?P<keyword>(?i:' + '|'.join(re.escape(keyword) for _, keyword, _ in HOLIDAY_KEYWORDS) + r'))'
+    r'|<t[hd][^>]*class="(?:month"[^>]*>\s*(?P<month_title>\w+)'
+    r'|[^"]*preholiday[^"]*"[^>]*>\s*(?P<short_day>\d+)))'
+)
+# "с субботы " / "на пятницу " перед датой переноса
+_TRANSFER_PREP_RE = re.compile(r'(с|на)\s+\w+\s+$')
+_TRANSFER_PREP_WINDOW = 40
 
 def parse_consultant_html(html_content, year):
-    """Парсинг HTML страницы КонсультантПлюс для извлечения праздников"""
+    """
+    Парсинг HTML страницы КонсультантПлюс за один проход.
+
+    Страница разбирается одним finditer по _TOKEN_RE: праздники, переносы
+    и сокращенные дни собираются из одного потока токенов. Праздники и
+    переносы совпадают с parse_consultant_html_legacy.
+    """
+    months = {name: number for number, name in enumerate(MONTHS_GENITIVE, 1)}
+    keywords = {}
+    for position, (month, keyword, _) in enumerate(HOLIDAY_KEYWORDS):
+        keywords.setdefault(keyword.lower(), []).append((position, month))
+
+    found = [[] for _ in HOLIDAY_KEYWORDS]
+    pending = [None] * len(HOLIDAY_KEYWORDS)
+    working_days = []
+    transfers = []
+    shortened_days = []
+    transfer_from = None
+    table_month = None
+
+    line_start = 0
+    scanned = 0
+    for token in _TOKEN_RE.finditer(html_content):
+        kind = token.lastgroup
+        # Начало текущей строки: текст между токенами просматривается один раз
+        newline = html_content.rfind('\n', scanned, token.start())
+        if newline != -1:
+            line_start = newline + 1
+        scanned = token.start()
+        if kind == 'month':
+            day = int(token.group('day'))
+            month = months[token.group('month').lower()]
+            # Первая дата месяца в строке ждет ключевое слово своего праздника;
+            # дата из предыдущей строки уже не ждет
+            for position, (holiday_month, _, _) in enumerate(HOLIDAY_KEYWORDS):
+                if holiday_month == month and (pending[position] is None or pending[position][1] < line_start):
+                    pending[position] = (day, token.start())
+
+            prep = _TRANSFER_PREP_RE.search(html_content, max(0, token.start() - _TRANSFER_PREP_WINDOW), token.start())
+            if prep is None:
+                continue
+            if prep.group(1) == 'с':
+                transfer_from = token
+            elif transfer_from is not None and not html_content[transfer_from.end():prep.start()].strip():
+                try:
+                    to_date = datetime.date(year, month, day).strftime('%Y-%m-%d')
+                except ValueError:
+                    to_date = None
+                if to_date:
+                    # Добавляем рабочий день (куда перенесли)
+                    working_days.append(to_date)
+                    transfers.append({
+                        'from': f"{year}-{months[transfer_from.group('month').lower()]:02d}-{int(transfer_from.group('day')):02d}",
+                        'to': to_date,
+                        'description': f"перенос с {transfer_from.group('day')} {transfer_from.group('month')}"
+                    })
+                transfer_from = None
+        elif kind == 'keyword':
+            for position, _ in keywords.get(token.group('keyword').lower(), ()):
+                if pending[position] is not None:
+                    if pending[position][1] >= line_start:
+                        found[position].append(pending[position][0])
+                    pending[position] = None
+        elif kind == 'month_title':
+            title = token.group('month_title').lower()
+            table_month = MONTHS_NOMINATIVE.index(title) + 1 if title in MONTHS_NOMINATIVE else None
+        elif kind == 'short_day' and table_month:
+            try:
+                shortened_days.append(datetime.date(year, table_month, int(token.group('short_day'))).strftime('%Y-%m-%d'))
+            except ValueError:
+                pass
+
+    holidays = []
+    for (month, _, name), days in zip(HOLIDAY_KEYWORDS, found):
+        for day in days:
+            try:
+                holidays.append({'date': datetime.date(year, month, day).strftime('%Y-%m-%d'), 'name': name})
+            except ValueError:
+                continue
+
+    # Добавляем новогодние каникулы (обычно 1-8 января)
+    for day in range(1, 9):
+        if day == 1:
+            name = "Новый год"
+        elif day == 7:
+            name = "Рождество Христово"
+        else:
+            name = "Новогодние каникулы"
+        holidays.append({'date': datetime.date(year, 1, day).strftime('%Y-%m-%d'), 'name': name})
+
+    return {
+        "year": year,
+        "source": "КонсультантПлюс (парсинг HTML)",
+        "last_updated": datetime.datetime.now().isoformat(),
+        "holidays": holidays,
+        "working_days": working_days,
+        "transfers": transfers,
+        "shortened_days": shortened_days
+    }
+
+def parse_consultant_html_legacy(html_content, year):
+    """
+    Прежний парсер: отдельный re.findall по странице на переносы и на каждый
+    праздник. Оставлен для сравнения в holiday_parser_benchmark.py
+    """
     holidays = []
     working_days = []
     
@@ -115,61 +297,99 @@ def get_month_number(month_name):
     }
     return months.get(month_name.lower(), 1)
 
+def load_validators(year):
+    """ETag/Last-Modified, сохраненные вместе с holidays_YYYY.json (None, если файла нет)"""
+    filename = f"holidays_{year}.json"
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            return json.load(f).get('http_cache')
+    except (OSError, ValueError):
+        return None
+
 def save_holidays_json(year, holidays_data):
-    """Сохранить данные о праздниках в JSON файл"""
+    """Атомарно сохранить данные о праздниках в JSON файл (temp + rename)"""
     filename = f"holidays_{year}.json"
+    temp_filename = f".{filename}.{os.getpid()}.tmp"
     
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
+        with open(temp_filename, 'w', encoding='utf-8') as f:
             json.dump(holidays_data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_filename, filename)
         
         print(f"✅ Сохранен: {filename}")
         return filename
         
     except Exception as e:
         print(f"❌ Ошибка сохранения {filename}: {e}")
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
         return None
 
 def update_holidays_for_year(year):
-    """Обновить календарь праздников для года"""
+    """
+    Обновить календарь праздников для года.
+
+    Returns:
+        str: 'updated', 'not_modified' или 'failed'
+    """
     print(f"🔄 Обновление {year}...")
     
-    # Получаем HTML с КонсультантПлюс
-    html_content = get_consultant_html(year)
-    if not html_content:
+    # Получаем HTML с КонсультантПлюс (условным запросом, если файл уже есть)
+    html_content, validators = get_consultant_html(year, load_validators(year))
+    if html_content is None:
+        if validators is not None:
+            return 'not_modified'
         print(f"❌ Не удалось получить данные для {year}")
-        return None
+        return 'failed'
     
     # Парсим HTML
     holidays_data = parse_consultant_html(html_content, year)
     if not holidays_data or not holidays_data.get('holidays'):
         print(f"❌ Не удалось распарсить данные для {year}")
-        return None
+        return 'failed'
     
-    print(f"📊 Найдено {len(holidays_data['holidays'])} праздников, {len(holidays_data['working_days'])} переносов")
+    print(f"📊 Найдено {len(holidays_data['holidays'])} праздников, {len(holidays_data['working_days'])} переносов, "
+          f"{len(holidays_data['shortened_days'])} сокращенных дней")
     
-    # Сохраняем в JSON
+    # Сохраняем в JSON вместе с validators для следующего условного запроса
+    if validators.get('etag') or validators.get('last_modified'):
+        holidays_data['http_cache'] = validators
     filename = save_holidays_json(year, holidays_data)
-    return filename
+    return 'updated' if filename else 'failed'
+
+def years_window(today=None, years_back=None, years_ahead=None):
+    """Скользящее окно лет вокруг текущего года"""
+    today = today or datetime.date.today()
+    years_back = HOLIDAY_UPDATER_CONFIG['years_back'] if years_back is None else years_back
+    years_ahead = HOLIDAY_UPDATER_CONFIG['years_ahead'] if years_ahead is None else years_ahead
+    return list(range(today.year - years_back, today.year + years_ahead + 1))
+
+def _update_year(year):
+    try:
+        return update_holidays_for_year(year)
+    except Exception as e:
+        print(f"❌ Ошибка {year}: {e}")
+        return 'failed'
 
 def main():
     """Основная функция обновления"""
     print("🔄 Обновление календаря праздников")
     print("="*50)
     
-    # Обновляем календари
-    years_to_update = [2025, 2026]
-    updated_years = []
-    
-    for year in years_to_update:
-        try:
-            filename = update_holidays_for_year(year)
-            if filename:
-                updated_years.append(year)
-        except Exception as e:
-            print(f"❌ Ошибка {year}: {e}")
+    # Обновляем календари окна лет параллельно
+    years_to_update = years_window()
+    if not years_to_update:
+        print("⚠️ Окно лет пустое: проверьте HOLIDAY_YEARS_BACK и HOLIDAY_YEARS_AHEAD")
+        return
+    with ThreadPoolExecutor(max_workers=len(years_to_update)) as executor:
+        statuses = dict(zip(years_to_update, executor.map(_update_year, years_to_update)))
     
-    print(f"✅ Завершено: {updated_years}")
+    updated_years = [year for year, status in statuses.items() if status == 'updated']
+    unchanged_years = [year for year, status in statuses.items() if status == 'not_modified']
+    failed_years = [year for year, status in statuses.items() if status == 'failed']
+    print(f"✅ Завершено: обновлены {updated_years}, без изменений {unchanged_years}")
+    if failed_years:
+        print(f"❌ Не обновлены: {failed_years}")
 
 if __name__ == "__main__":
     main()
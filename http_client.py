@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Общий HTTP клиент с постоянными соединениями для Finolog и Telegram.
+Держит пул keep-alive соединений на каждый хост, запрашивает gzip
+и прозрачно распаковывает ответы. Только стандартная библиотека.
+"""
+
+import gzip
+import http.client
+import json
+import select
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Ошибки, после которых переиспользованное соединение считается "протухшим"
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+# Методы, которые можно повторить, не опасаясь двойной обработки на сервере
+_IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+def _is_dropped(conn):
+    """Закрыл ли сервер простаивающее соединение (сокет читаем без запроса - EOF)"""
+    if conn.sock is None:
+        return True
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class HttpError(Exception):
+    """HTTP ответ с кодом ошибки (4xx/5xx)"""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status} для {response.host}{response.path}")
+        self.response = response
+        self.status = response.status
+
+
+class HttpResponse:
+    """Полностью прочитанный HTTP ответ с замером времени"""
+
+    def __init__(self, method, host, path, status, headers, body, elapsed, wire_bytes):
+        self.method = method
+        self.host = host
+        self.path = path
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.elapsed = elapsed
+        self.wire_bytes = wire_bytes
+
+    def json(self):
+        """Разобрать тело ответа как JSON"""
+        return json.loads(self.body.decode('utf-8'))
+
+    def retry_after(self):
+        """Значение заголовка Retry-After в секундах (число или HTTP-дата) или None"""
+        value = self.headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    def raise_for_status(self):
+        """Выбросить HttpError, если код ответа 4xx/5xx"""
+        if self.status >= 400:
+            raise HttpError(self)
+        return self
+
+
+class HttpClient:
+    """
+    HTTP клиент с пулом keep-alive соединений по хостам.
+
+    Потокобезопасен: соединение берется из пула на время одного запроса,
+    поэтому клиент можно использовать из ThreadPoolExecutor.
+    Слушатели из add_listener() получают каждый HttpResponse для замеров.
+    Соединение, закрытое сервером за время простоя, отбрасывается до запроса;
+    обрыв после отправки повторяется автоматически только для GET/HEAD/OPTIONS.
+    """
+
+    def __init__(self, max_idle_per_host=8, timeout=30, user_agent='WatchDog'):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Подписаться на завершенные запросы: callback(response)"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Отписаться от завершенных запросов"""
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _acquire(self, key, timeout):
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                break
+            # Соединение, закрытое сервером за время простоя, отбрасываем до отправки запроса
+            if _is_dropped(conn):
+                conn.close()
+                continue
+            conn.timeout = timeout
+            conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, host, port = key
+        conn_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return conn_class(host, port, timeout=timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method, url, body=None, headers=None, timeout=None):
+        """
+        Выполнить HTTP запрос через пул соединений.
+
+        Args:
+            method: HTTP метод
+            url: полный URL
+            body: тело запроса (bytes) или None
+            headers: дополнительные заголовки
+            timeout: таймаут в секундах (по умолчанию self.timeout)
+
+        Returns:
+            HttpResponse: ответ с распакованным телом (код ответа не проверяется)
+        """
+        parsed = urllib.parse.urlsplit(url)
+        scheme = parsed.scheme or 'http'
+        port = parsed.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parsed.hostname, port)
+        path = parsed.path or '/'
+        if parsed.query:
+            path = f"{path}?{parsed.query}"
+
+        request_headers = {
+            'Accept-Encoding': 'gzip',
+            'Connection': 'keep-alive',
+            'User-Agent': self.user_agent,
+        }
+        if headers:
+            request_headers.update(headers)
+        if timeout is None:
+            timeout = self.timeout
+
+        started = time.perf_counter()
+        for attempt in range(2):
+            conn, reused = self._acquire(key, timeout)
+            try:
+                conn.request(method, path, body=body, headers=request_headers)
+                raw_response = conn.getresponse()
+                raw_body = raw_response.read()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                # Сервер закрыл простаивающее соединение - повторяем на новом.
+                # POST не повторяем: сервер мог успеть его обработать (двойной sendMessage)
+                if reused and attempt == 0 and method in _IDEMPOTENT_METHODS:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+            break
+
+        if raw_response.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+
+        response_headers = {name.lower(): value for name, value in raw_response.getheaders()}
+        content = raw_body
+        if response_headers.get('content-encoding', '').lower() == 'gzip':
+            content = gzip.decompress(raw_body)
+
+        response = HttpResponse(
+            method=method,
+            host=parsed.hostname,
+            path=parsed.path,
+            status=raw_response.status,
+            headers=response_headers,
+            body=content,
+            elapsed=time.perf_counter() - started,
+            wire_bytes=len(raw_body),
+        )
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(response)
+            except Exception as e:
+                print(f"Ошибка обработчика HTTP замеров: {e}")
+        return response
+
+    def get(self, url, headers=None, timeout=None):
+        """GET запрос"""
+        return self.request('GET', url, headers=headers, timeout=timeout)
+
+    def post_form(self, url, data, headers=None, timeout=None):
+        """POST запрос с телом application/x-www-form-urlencoded"""
+        form_headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        if headers:
+            form_headers.update(headers)
+        body = urllib.parse.urlencode(data).encode('utf-8')
+        return self.request('POST', url, body=body, headers=form_headers, timeout=timeout)
+
+    def close(self):
+        """Закрыть все простаивающие соединения"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client():
+    """Общий на процесс HTTP клиент (создается при первом обращении)"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = HttpClient()
+    return _shared_client
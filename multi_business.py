@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Мониторинг нескольких бизнесов Finolog в одном запуске.
+
+Список бизнесов читается из JSON файла (BUSINESSES_FILE), у каждого свои
+токен Finolog, пороги и получатели. Бизнесы обрабатываются параллельно
+(не более MULTI_BUSINESS_WORKERS одновременно): каждый бизнес проверяется
+в новом процессе, который настраивает свою копию
+конфигурации и вызывает check_and_notify, поэтому ошибка или медленный API
+одного бизнеса не задерживает уведомления остальных. Процессы, не успевшие
+за MULTI_BUSINESS_TIMEOUT_SECONDS, принудительно завершаются. В конце
+печатается сводка по всем бизнесам.
+
+Формат файла:
+[
+  {
+    "name": "Основной бизнес",
+    "biz_id": "12345",
+    "api_key_env": "FINOLOG_API_KEY_MAIN",      (или "api_key": "...")
+    "bot_token_env": "MAIN_BOT_TOKEN",          (или "bot_token": "...")
+    "allowed_users": [13553737],
+    "threatening_account_ids": [190104],
+    "threshold": 100000,
+    "days_ahead": 356
+  }
+]
+Не заданные поля берутся из исходных FINOLOG_CONFIG / THREATENING_CONFIG / MAIN_BOT_CONFIG.
+
+Использование:
+    python3 multi_business.py [--force] [--test]
+"""
+
+import copy
+import json
+import multiprocessing
+import os
+import queue
+import re
+import sys
+import time
+import traceback
+
+from config import FINOLOG_CONFIG, MULTI_BUSINESS_CONFIG, SYNC_CONFIG, THREATENING_CONFIG
+
+# Значения config.py на момент импорта: каждый бизнес настраивается от них,
+# а не от настроек предыдущего бизнеса в том же процессе
+_CONFIG_DEFAULTS = {
+    'finolog': copy.deepcopy(FINOLOG_CONFIG),
+    'threatening': copy.deepcopy(THREATENING_CONFIG),
+    'sync': copy.deepcopy(SYNC_CONFIG),
+}
+
+
+def load_businesses(path=None):
+    """Прочитать и проверить список бизнесов"""
+    path = path or MULTI_BUSINESS_CONFIG['file']
+    with open(path, 'r', encoding='utf-8') as f:
+        businesses = json.load(f)
+    if not isinstance(businesses, list) or not businesses:
+        raise RuntimeError(f"{path}: ожидается непустой список бизнесов")
+
+    names = set()
+    labels = set()
+    for business in businesses:
+        if 'biz_id' not in business:
+            raise RuntimeError(f"{path}: у бизнеса {business.get('name')} не задан biz_id")
+        business.setdefault('name', str(business['biz_id']))
+        if business['name'] in names:
+            raise RuntimeError(f"{path}: имя бизнеса {business['name']} повторяется")
+        names.add(business['name'])
+        # По метке разделяются состояние оповещений, метрики и хранилище транзакций
+        if business_label(business) in labels:
+            raise RuntimeError(f"{path}: biz_id {business['biz_id']} повторяется")
+        labels.add(business_label(business))
+    return businesses
+
+
+def _secret(business, key):
+    """Секрет из поля key или из переменной окружения, указанной в key_env"""
+    if business.get(key):
+        return business[key]
+    env_name = business.get(f"{key}_env")
+    if env_name:
+        value = os.getenv(env_name, '').strip()
+        if not value:
+            raise RuntimeError(f"Не задана переменная окружения {env_name} для {business['name']}")
+        return value
+    return None
+
+
+def business_label(business):
+    """Метка бизнеса для файлов состояния и метрик: из biz_id, а не из имени"""
+    return re.sub(r'[^0-9A-Za-z_]+', '_', str(business['biz_id'])).strip('_').lower() or 'business'
+
+
+def configure_business(business):
+    """Настроить FINOLOG_CONFIG, THREATENING_CONFIG и SYNC_CONFIG процесса для бизнеса"""
+    finolog = _CONFIG_DEFAULTS['finolog']
+    threatening = copy.deepcopy(_CONFIG_DEFAULTS['threatening'])
+    sync = _CONFIG_DEFAULTS['sync']
+
+    FINOLOG_CONFIG.update(finolog)
+    FINOLOG_CONFIG['biz_id'] = str(business['biz_id'])
+    FINOLOG_CONFIG['api_key'] = _secret(business, 'api_key') or finolog['api_key']
+    FINOLOG_CONFIG['base_url'] = business.get('base_url', finolog['base_url'])
+    THREATENING_CONFIG.update(threatening)
+    THREATENING_CONFIG['account_ids'] = business.get('threatening_account_ids', threatening['account_ids'])
+    THREATENING_CONFIG['threshold'] = business.get('threshold', threatening['threshold'])
+    THREATENING_CONFIG['days_ahead'] = business.get('days_ahead', threatening['days_ahead'])
+    SYNC_CONFIG.update(sync)
+    SYNC_CONFIG['db_path'] = sync['db_path'].replace('.sqlite3', f"_{business['biz_id']}.sqlite3")
+
+
+def run_business(business, is_test=False, force_check=False):
+    """
+    Проверка одного бизнеса (выполняется в отдельном процессе).
+
+    Returns:
+        dict: сводка {'name', 'status', 'seconds', 'negative_accounts', 'threatening_accounts', 'error'}
+    """
+    started = time.perf_counter()
+    summary = {'name': business['name'], 'status': 'error', 'seconds': 0.0,
+               'negative_accounts': 0, 'threatening_accounts': 0, 'error': None}
+    try:
+        # Процесс отдельный - настраиваем собственную копию конфигурации
+        from contacts import MAIN_BOT_CONFIG, TEST_BOT_CONFIG
+        from telegram_bot import check_and_notify
+
+        configure_business(business)
+
+        bot_config = TEST_BOT_CONFIG if is_test else MAIN_BOT_CONFIG
+        bot_token = _secret(business, 'bot_token') or bot_config['bot_token']
+        allowed_users = business.get('allowed_users', bot_config['allowed_users'])
+
+        print(f"🏢 {business['name']}: начинаем проверку", flush=True)
+        analysis_result = check_and_notify(
+            bot_token, allowed_users, is_test, force_check,
+            run_label=f"{'test' if is_test else 'main'}_{business_label(business)}"
+        )
+        if analysis_result is None:
+            summary['status'] = 'holiday'
+        else:
+            summary['status'] = 'ok'
+            summary['negative_accounts'] = len(analysis_result['negative_balances'])
+            summary['threatening_accounts'] = len(analysis_result['threatening_balances'])
+    except Exception as e:
+        summary['error'] = f"{type(e).__name__}: {e}"
+        print(f"❌ {business['name']}: {summary['error']}", flush=True)
+        traceback.print_exc()
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def _failed_summary(business, status, seconds, error):
+    return {'name': business['name'], 'status': status, 'seconds': seconds,
+            'negative_accounts': 0, 'threatening_accounts': 0, 'error': error}
+
+
+def _run_business_process(results, index, business, is_test, force_check):
+    """Точка входа процесса бизнеса: сводка уходит родителю через очередь"""
+    results.put((index, run_business(business, is_test, force_check)))
+
+
+def run_all_businesses(businesses, is_test=False, force_check=False):
+    """
+    Проверить все бизнесы, каждый в своем процессе.
+
+    Returns:
+        list: сводки run_business() в порядке списка бизнесов
+    """
+    max_workers = max(1, min(MULTI_BUSINESS_CONFIG['max_workers'], len(businesses)))
+    timeout = MULTI_BUSINESS_CONFIG['timeout_seconds']
+    # spawn - чистые процессы без унаследованных соединений и потоков; новый процесс
+    # на каждый бизнес, чтобы кеши модулей (HTTP клиент, лимиты) не переходили между бизнесами
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    summaries = [None] * len(businesses)
+    pending = list(range(len(businesses)))
+    running = {}
+    deadline = time.monotonic() + timeout
+
+    while pending or running:
+        while pending and len(running) < max_workers:
+            index = pending.pop(0)
+            process = context.Process(target=_run_business_process, daemon=True,
+                                      args=(results, index, businesses[index], is_test, force_check))
+            process.start()
+            running[index] = process
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            index, summary = results.get(timeout=min(remaining, 1.0))
+        except queue.Empty:
+            # Процесс, завершившийся с ошибкой, сводку уже не пришлет
+            for index, process in list(running.items()):
+                if process.exitcode not in (None, 0):
+                    summaries[index] = _failed_summary(businesses[index], 'error', 0.0,
+                                                       f"процесс завершился с кодом {process.exitcode}")
+                    del running[index]
+            continue
+        summaries[index] = summary
+        running.pop(index).join()
+
+    # Процессы, не успевшие за timeout, завершаем сами, иначе они задержат выход интерпретатора
+    for index, process in running.items():
+        process.terminate()
+        process.join()
+        summaries[index] = _failed_summary(businesses[index], 'timeout', float(timeout),
+                                           "превышено время ожидания")
+    for index in pending:
+        summaries[index] = _failed_summary(businesses[index], 'timeout', float(timeout),
+                                           "не запущен до истечения времени ожидания")
+    results.close()
+    return summaries
+
+
+def print_summary(summaries):
+    """Сводная таблица по бизнесам"""
+    print("="*60)
+    print("📋 Сводка по бизнесам")
+    icons = {'ok': '✅', 'holiday': '📅', 'timeout': '⏱', 'error': '❌'}
+    for summary in summaries:
+        line = (f"{icons.get(summary['status'], '•')} {summary['name']}: {summary['status']}, "
+                f"{summary['seconds']:.1f} с, отрицательных счетов {summary['negative_accounts']}, "
+                f"угрожающих {summary['threatening_accounts']}")
+        if summary['error']:
+            line += f" ({summary['error']})"
+        print(line)
+    failed = sum(1 for summary in summaries if summary['status'] in ('error', 'timeout'))
+    print(f"Итого: {len(summaries)} бизнесов, с ошибками {failed}")
+
+
+def main(argv=None):
+    """Точка входа: проверка всех бизнесов из BUSINESSES_FILE"""
+    argv = sys.argv[1:] if argv is None else argv
+    businesses = load_businesses()
+    summaries = run_all_businesses(businesses, is_test='--test' in argv, force_check='--force' in argv)
+    print_summary(summaries)
+    return 1 if any(summary['status'] in ('error', 'timeout') for summary in summaries) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
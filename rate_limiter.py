@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Потокобезопасные ограничители частоты запросов (token bucket)
+"""
+
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket: rate токенов в секунду, не более capacity в запасе.
+    acquire() блокирует поток до появления токена.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self, tokens=1):
+        """Дождаться и забрать tokens токенов; возвращает время ожидания в секундах"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = max(
+                    self._blocked_until - now,
+                    (tokens - self._tokens) / self.rate if self._tokens < tokens else 0.0
+                )
+            time.sleep(delay)
+            waited += delay
+
+    def block_for(self, seconds):
+        """Запретить выдачу токенов на seconds секунд (например, по Retry-After)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._tokens = 0.0
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    TokenBucket, который сам подстраивает частоту под ответы сервера:
+    после 429 частота уменьшается вдвое (не ниже min_rate), а выдача
+    приостанавливается; каждый успешный ответ понемногу возвращает ее
+    к исходной max_rate.
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=None, recovery=0.05):
+        super().__init__(rate, capacity)
+        self.max_rate = self.rate
+        self.min_rate = float(min_rate if min_rate is not None else max(self.rate / 16, 0.1))
+        self.recovery = recovery
+
+    def on_success(self):
+        """Успешный ответ: прибавить recovery к частоте (до max_rate)"""
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.recovery * self.max_rate)
+
+    def on_throttled(self, seconds):
+        """Ответ 429: снизить частоту вдвое и приостановить выдачу на seconds секунд"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+        self.block_for(seconds)
+
+
+def backoff_delay(attempt, base):
+    """Экспоненциальная пауза с разбросом: base * 2^attempt * [0.5, 1.5)"""
+    return base * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class KeyedTokenBuckets:
+    """Отдельный TokenBucket на каждый ключ (например, на каждый chat_id)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Bucket для ключа (создается при первом обращении)"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+            return bucket
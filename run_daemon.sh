@@ -0,0 +1,13 @@
+#!/bin/bash
+
+# Скрипт для запуска резидентного демона мониторинга (вместо cron для run_bot.sh)
+# Используется из systemd: процесс живет постоянно и сам планирует проверки
+
+# Переходим в директорию бота
+cd ~/watchdog
+
+# Создаем директорию логов, если отсутствует
+mkdir -p logs
+
+# exec - чтобы SIGTERM от systemd доходил напрямую до Python процесса
+exec python3 daemon.py "$@" >> logs/bot.log 2>&1
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Метрики одного запуска мониторинга.
+
+Замеряет длительность этапов (get_all_accounts, загрузка транзакций,
+get_current_balances, analyze_all_accounts_balances, рассылка), каждый
+HTTP запрос (страницы транзакций, отправки Telegram), объем ответов,
+повторы и число обработанных транзакций. Результат выгружается:
+- в файл textfile collector для Prometheus node_exporter (последний запуск);
+- строкой JSON в журнал запусков (история для анализа трендов).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from config import METRICS_CONFIG
+
+
+def classify_request(path):
+    """Сервис и конечная точка по пути запроса (без токенов и ID)"""
+    segments = [segment for segment in path.split('/') if segment]
+    if segments and segments[0].startswith('bot'):
+        return 'telegram', segments[-1]
+    return 'finolog', segments[-1] if segments else ''
+
+
+class RunMetrics:
+    """
+    Сборщик метрик одного запуска.
+
+    С первого этапа stage() и до finish() объект подписан на общий HTTP
+    клиент и относит каждый запрос к текущему этапу. Подписка откладывается
+    до первого этапа, чтобы запуск в выходной не импортировал HTTP клиент.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.started_at = None
+        self.finished_at = None
+        self.status = 'running'
+        self.stages = []
+        self.counters = {}
+        self.requests = []
+        self._current_stage = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Начать запуск"""
+        self.started_at = time.time()
+        return self
+
+    def _subscribe(self):
+        if self._client is None:
+            from http_client import get_shared_client
+            self._client = get_shared_client()
+            self._client.add_listener(self._on_response)
+
+    def _on_response(self, response):
+        service, endpoint = classify_request(response.path)
+        with self._lock:
+            self.requests.append({
+                'stage': self._current_stage,
+                'service': service,
+                'endpoint': endpoint,
+                'status': response.status,
+                'seconds': response.elapsed,
+                'bytes': response.wire_bytes,
+            })
+
+    @contextmanager
+    def stage(self, name):
+        """Контекст замера этапа"""
+        self._subscribe()
+        previous_stage = self._current_stage
+        self._current_stage = name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({'stage': name, 'seconds': time.perf_counter() - started})
+            self._current_stage = previous_stage
+
+    def add(self, name, value=1):
+        """Увеличить счетчик (retries, transactions_processed и т.п.)"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self, status='ok'):
+        """Завершить запуск, отписаться от HTTP клиента и выгрузить метрики"""
+        self.finished_at = time.time()
+        self.status = status
+        if self._client is not None:
+            self._client.remove_listener(self._on_response)
+        if METRICS_CONFIG['enabled']:
+            try:
+                textfile = Path(METRICS_CONFIG['textfile_dir']) / f"watchdog_{self.bot}.prom"
+                write_textfile(self, textfile)
+                append_jsonl(self, METRICS_CONFIG['jsonl_path'])
+            except OSError as e:
+                print(f"⚠️ Не удалось записать метрики запуска: {e}")
+
+    def to_record(self):
+        """Запись запуска для журнала JSON lines"""
+        return {
+            'bot': self.bot,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(),
+            'duration_seconds': round(self.finished_at - self.started_at, 6),
+            'status': self.status,
+            'stages': [{'stage': item['stage'], 'seconds': round(item['seconds'], 6)} for item in self.stages],
+            'counters': self.counters,
+            'requests': [
+                dict(item, seconds=round(item['seconds'], 6)) for item in self.requests
+            ],
+        }
+
+
+def _format_labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render_prometheus(metrics):
+    """Текст метрик в формате Prometheus exposition"""
+    bot = {'bot': metrics.bot}
+    lines = [
+        "# HELP watchdog_run_timestamp_seconds Время завершения последнего запуска.",
+        "# TYPE watchdog_run_timestamp_seconds gauge",
+        f"watchdog_run_timestamp_seconds{{{_format_labels(bot)}}} {metrics.finished_at:.3f}",
+        "# HELP watchdog_run_duration_seconds Длительность последнего запуска.",
+        "# TYPE watchdog_run_duration_seconds gauge",
+        f"watchdog_run_duration_seconds{{{_format_labels(bot)}}} {metrics.finished_at - metrics.started_at:.6f}",
+        "# HELP watchdog_run_success 1, если последний запуск завершился без ошибки.",
+        "# TYPE watchdog_run_success gauge",
+        f"watchdog_run_success{{{_format_labels(bot)}}} {0 if metrics.status == 'error' else 1}",
+        "# HELP watchdog_stage_duration_seconds Длительность этапа последнего запуска.",
+        "# TYPE watchdog_stage_duration_seconds gauge",
+    ]
+    for item in metrics.stages:
+        labels = _format_labels(dict(bot, stage=item['stage']))
+        lines.append(f"watchdog_stage_duration_seconds{{{labels}}} {item['seconds']:.6f}")
+
+    grouped = {}
+    for item in metrics.requests:
+        key = (item['service'], item['endpoint'], str(item['status']))
+        count, total, maximum, size = grouped.get(key, (0, 0.0, 0.0, 0))
+        grouped[key] = (count + 1, total + item['seconds'], max(maximum, item['seconds']), size + item['bytes'])
+
+    for name, help_text, index in (
+        ("watchdog_http_requests", "Число HTTP запросов последнего запуска.", 0),
+        ("watchdog_http_request_seconds_sum", "Суммарное время HTTP запросов.", 1),
+        ("watchdog_http_request_seconds_max", "Самый долгий HTTP запрос.", 2),
+        ("watchdog_http_response_bytes", "Объем HTTP ответов (до распаковки).", 3),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for (service, endpoint, status), values in sorted(grouped.items()):
+            labels = _format_labels(dict(bot, service=service, endpoint=endpoint, status=status))
+            value = values[index]
+            lines.append(f"{name}{{{labels}}} {value:.6f}" if isinstance(value, float) else f"{name}{{{labels}}} {value}")
+
+    for counter, value in sorted(metrics.counters.items()):
+        name = f"watchdog_{counter}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{{{_format_labels(bot)}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(metrics, path):
+    """Атомарно записать метрики для textfile collector (temp + rename)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temp_path.write_text(render_prometheus(metrics), encoding="utf-8")
+    os.replace(temp_path, path)
+
+
+def append_jsonl(metrics, path):
+    """Дописать запись запуска в журнал JSON lines"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(metrics.to_record(), ensure_ascii=False) + "\n")
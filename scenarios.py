@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Сценарный анализ остатков: пороги × горизонты × группы счетов.
+
+Транзакции загружаются один раз, ряд дневных остатков каждого счета
+строится один раз на самый длинный горизонт (в копейках, как в
+compact_transactions.py). За один проход по ряду собираются интервалы
+отрицательных остатков и угрожающих остатков для всех порогов сразу
+(угрожающие - только для THREATENING_ACCOUNT_IDS, как в основном анализе);
+более короткие горизонты получаются обрезкой интервалов, а группы
+счетов - агрегацией по своим счетам.
+
+Использование:
+    python3 scenarios.py
+    python3 scenarios.py --thresholds 50000,200000,500000 --horizons 30,90,356 \\
+        --group main=190104,190105 --json scenarios.json
+"""
+
+import argparse
+import datetime
+import json
+import sys
+
+from config import THREATENING_CONFIG
+from balance_engine import BreachIntervalBuilder
+from compact_transactions import CompactTransactionIndex, to_kopecks
+
+DEFAULT_THRESHOLDS = "50000,100000,200000,500000"
+DEFAULT_HORIZONS = "30,90,356"
+
+
+def breach_runs(balances, thresholds_kopecks):
+    """
+    Один проход по ряду остатков: серии отрицательных дней и серии
+    угрожающих дней (0 < остаток < порог) для каждого порога.
+
+    Returns:
+        tuple: (negative_runs, {threshold: threatening_runs}); серия -
+               (start_offset, end_offset, min_balance, min_offset)
+    """
+    negative = BreachIntervalBuilder()
+    threatening = {threshold: BreachIntervalBuilder() for threshold in thresholds_kopecks}
+    for offset, balance in enumerate(balances):
+        negative.add(offset, balance, balance < 0)
+        for threshold, builder in threatening.items():
+            builder.add(offset, balance, 0 < balance < threshold)
+    return negative.finish(), {threshold: builder.finish() for threshold, builder in threatening.items()}
+
+
+def clip_runs(runs, balances, horizon):
+    """Серии в пределах первых horizon + 1 дней (минимум пересчитывается для обрезанных)"""
+    clipped = []
+    for start, end, min_balance, min_offset in runs:
+        if start > horizon:
+            break
+        if end > horizon:
+            end = horizon
+            min_offset = min(range(start, end + 1), key=balances.__getitem__)
+            min_balance = balances[min_offset]
+        clipped.append((start, end, min_balance, min_offset))
+    return clipped
+
+
+def evaluate_scenarios(accounts, compact_index, current_balances, start_date, thresholds, horizons, groups,
+                       threatening_account_ids=None):
+    """
+    Посчитать все сценарии за один проход по рядам остатков.
+
+    Args:
+        accounts: список счетов Finolog
+        compact_index: CompactTransactionIndex загруженных транзакций
+        current_balances: результат get_current_balances()
+        start_date: начало горизонта "YYYY-MM-DD"
+        thresholds: пороги угрожающего остатка, рубли
+        horizons: горизонты, дней
+        groups: {название группы: [account_id, ...]}
+        threatening_account_ids: счета, для которых ищутся угрожающие остатки
+                                 (по умолчанию THREATENING_CONFIG['account_ids'],
+                                 как в analyze_all_accounts_balances)
+
+    Returns:
+        list: по сценарию (group, threshold, days_ahead) - словарь с числом счетов
+              с отрицательными и угрожающими остатками, числом дней и худшим остатком
+    """
+    start_ordinal = datetime.date.fromisoformat(start_date).toordinal()
+    max_horizon = max(horizons)
+    thresholds_kopecks = {threshold: to_kopecks(threshold) for threshold in thresholds}
+    names = {account.get('id'): account.get('name', 'Без названия') for account in accounts}
+    if threatening_account_ids is None:
+        threatening_account_ids = THREATENING_CONFIG['account_ids']
+
+    # Один ряд и один проход на счет; дальше только обрезка серий
+    per_account = {}
+    for account in accounts:
+        account_id = account.get('id')
+        balances = compact_index.get(int(account_id)).daily_balances_kopecks(
+            to_kopecks(current_balances[account_id]['balance']), start_ordinal, max_horizon
+        )
+        check_threatening = account_id in threatening_account_ids
+        negative_runs, threatening_runs = breach_runs(balances, thresholds_kopecks.values() if check_threatening else ())
+        for horizon in horizons:
+            negative = clip_runs(negative_runs, balances, horizon)
+            for threshold, threshold_kopecks in thresholds_kopecks.items():
+                threatening = clip_runs(threatening_runs[threshold_kopecks], balances, horizon) if check_threatening else []
+                per_account[(account_id, threshold, horizon)] = (negative, threatening)
+
+    results = []
+    for group, account_ids in groups.items():
+        for threshold in thresholds:
+            for horizon in horizons:
+                row = {
+                    'group': group, 'threshold': threshold, 'days_ahead': horizon,
+                    'accounts': 0, 'negative_accounts': 0, 'negative_days': 0,
+                    'threatening_accounts': 0, 'threatening_days': 0,
+                    'worst_balance': None, 'worst_date': None, 'worst_account': None,
+                }
+                for account_id in account_ids:
+                    runs = per_account.get((account_id, threshold, horizon))
+                    if runs is None:
+                        continue
+                    row['accounts'] += 1
+                    negative, threatening = runs
+                    if negative:
+                        row['negative_accounts'] += 1
+                        row['negative_days'] += sum(end - start + 1 for start, end, _, _ in negative)
+                    if threatening:
+                        row['threatening_accounts'] += 1
+                        row['threatening_days'] += sum(end - start + 1 for start, end, _, _ in threatening)
+                    for _, _, min_balance, min_offset in negative + threatening:
+                        if row['worst_balance'] is None or min_balance < row['worst_balance']:
+                            row['worst_balance'] = min_balance
+                            row['worst_date'] = min_offset
+                            row['worst_account'] = names.get(account_id)
+                if row['worst_balance'] is not None:
+                    row['worst_balance'] = row['worst_balance'] / 100
+                    row['worst_date'] = datetime.date.fromordinal(start_ordinal + row['worst_date']).isoformat()
+                results.append(row)
+    return results
+
+
+def load_scenario_data(start_date):
+    """
+    Загрузить счета, остатки и транзакции один раз для всех сценариев.
+
+    Returns:
+        tuple: (accounts, current_balances, compact_index)
+    """
+    from api_functions import get_all_accounts, get_current_balances, iter_transactions_for_all_accounts
+
+    accounts = get_all_accounts()
+    account_ids = [account.get('id') for account in accounts]
+    compact_index = CompactTransactionIndex()
+    for account_id, tx in iter_transactions_for_all_accounts(account_ids, start_date):
+        compact_index.add(account_id, tx)
+    return accounts, get_current_balances(accounts), compact_index
+
+
+def format_scenario_table(results):
+    """Сводная таблица сценариев"""
+    lines = [
+        f"{'группа':<14} {'порог':>10} {'дней':>5} {'счетов':>6} {'минус':>6} {'дн.':>5} "
+        f"{'угроза':>6} {'дн.':>5} {'худший остаток':>16}  дата        счет"
+    ]
+    for row in results:
+        worst = f"{row['worst_balance']:16,.0f}" if row['worst_balance'] is not None else f"{'-':>16}"
+        lines.append(
+            f"{row['group']:<14} {row['threshold']:>10,} {row['days_ahead']:>5} {row['accounts']:>6} "
+            f"{row['negative_accounts']:>6} {row['negative_days']:>5} {row['threatening_accounts']:>6} "
+            f"{row['threatening_days']:>5} {worst}  {row['worst_date'] or '-':<10}  {row['worst_account'] or ''}"
+        )
+    return "\n".join(lines)
+
+
+def _parse_int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сценарный анализ остатков: пороги × горизонты × группы счетов")
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS,
+                        help=f"пороги угрожающего остатка через запятую (по умолчанию {DEFAULT_THRESHOLDS})")
+    parser.add_argument('--horizons', default=DEFAULT_HORIZONS,
+                        help=f"горизонты в днях через запятую (по умолчанию {DEFAULT_HORIZONS})")
+    parser.add_argument('--group', action='append', default=[], metavar='ИМЯ=ID,ID',
+                        help="группа счетов; по умолчанию 'все' и 'угрожающие' (THREATENING_ACCOUNT_IDS)")
+    parser.add_argument('--start-date', default=datetime.date.today().isoformat(), help="начало горизонта")
+    parser.add_argument('--json', help="записать результаты в файл JSON")
+    args = parser.parse_args(argv)
+
+    thresholds = _parse_int_list(args.thresholds)
+    horizons = _parse_int_list(args.horizons)
+    accounts, current_balances, compact_index = load_scenario_data(args.start_date)
+
+    groups = {}
+    for item in args.group:
+        name, _, ids = item.partition('=')
+        groups[name] = _parse_int_list(ids)
+    if not groups:
+        groups['все'] = [account.get('id') for account in accounts]
+        if THREATENING_CONFIG['account_ids']:
+            groups['угрожающие'] = list(THREATENING_CONFIG['account_ids'])
+
+    results = evaluate_scenarios(accounts, compact_index, current_balances, args.start_date,
+                                 thresholds, horizons, groups)
+    print(format_scenario_table(results))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
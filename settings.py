@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Единый загрузчик настроек из окружения и .env файла.
+
+.env читается один раз за процесс (при первом обращении), значения
+проверяются при чтении: обязательные, целые, списки целых через запятую.
+Используется config.py и contacts.py.
+"""
+
+import os
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+
+_dotenv_loaded = False
+
+
+def _load_dotenv(path: Path) -> None:
+    """Load key=value pairs from a local .env file without extra deps."""
+    try:
+        for raw_line in path.read_text(encoding="utf-8").splitlines():
+            line = raw_line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            os.environ.setdefault(key.strip(), value.strip())
+    except Exception as exc:  # pragma: no cover - defensive
+        raise RuntimeError(f"Не удалось прочитать файл окружения {path}") from exc
+
+
+def ensure_dotenv() -> None:
+    """Прочитать .env рядом с модулями, если это еще не сделано"""
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    env_file = BASE_DIR / ".env"
+    if env_file.exists():
+        _load_dotenv(env_file)
+    _dotenv_loaded = True
+
+
+def get_env(name: str, *, default=None, required: bool = False) -> str:
+    ensure_dotenv()
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        if required and default is None:
+            raise RuntimeError(f"Не задана обязательная переменная окружения {name}")
+        return default
+    return value.strip()
+
+
+def get_int(name: str, *, default=None, required: bool = False) -> int:
+    raw_value = get_env(name, default=None, required=required)
+    if raw_value is None:
+        return default
+    try:
+        return int(raw_value)
+    except ValueError as exc:
+        raise RuntimeError(f"Переменная окружения {name} должна быть целым числом") from exc
+
+
+def get_int_list(name: str, *, default=None, required: bool = False) -> list[int]:
+    raw_value = get_env(name, default=None, required=required)
+    if raw_value is None:
+        return default if default is not None else []
+    result = []
+    for item in raw_value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            result.append(int(item))
+        except ValueError as exc:
+            raise RuntimeError(
+                f"Переменная окружения {name} должна содержать список целых через запятую"
+            ) from exc
+    if required and not result:
+        raise RuntimeError(f"Переменная окружения {name} не может быть пустой")
+    return result
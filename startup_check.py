@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка времени запуска в выходной день (cron без демона).
+
+Запускает в отдельном процессе с -X importtime то, что делает launcher.py
+в нерабочий день: импорт contacts и telegram_bot и check_and_notify(),
+который должен завершиться сразу после проверки календаря. Проверяется:
+- суммарное время импортов (лучшее из --runs запусков) не больше базового
+  замера из --baseline с допуском --tolerance и запасом --slack-ms, а без
+  базового замера - не больше бюджета --budget-ms;
+- тяжелые модули (api_functions, telegram_functions, numpy, HTTP клиент)
+  не импортируются.
+Код возврата 1, если время превышено или тяжелый модуль загружен.
+Базовый замер делается на этой же машине: --save-baseline.
+
+Использование:
+    python3 startup_check.py --save-baseline
+    python3 startup_check.py
+    python3 startup_check.py --budget-ms 200 --runs 10 --top 15
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from settings import BASE_DIR, get_env, get_int
+
+# Модули, которые не должны загружаться при выходе по календарю
+HEAVY_MODULES = (
+    'api_functions',
+    'telegram_functions',
+    'telegram_delivery',
+    'balance_engine',
+    'compact_transactions',
+    'numpy',
+    'http_client',
+    'http.client',
+)
+
+HOLIDAY_RUN = f"""
+import sys, json
+import contacts
+import telegram_bot
+telegram_bot.is_working_day = lambda day: False
+telegram_bot.check_and_notify('startup-check', [0])
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Разобрать вывод -X importtime.
+
+    Returns:
+        tuple: (суммарное время импортов верхнего уровня в мкс, [(cumulative, self, module), ...])
+    """
+    total = 0
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules.append((int(cumulative_us), int(self_us), name.rstrip()))
+        if not name.startswith('  '):
+            # Импорт верхнего уровня: name начинается с одного пробела
+            total += int(cumulative_us)
+    return total, modules
+
+
+def measure_holiday_run():
+    """Один запуск: (время импортов, мкс; модули; загруженные тяжелые модули)"""
+    env = dict(os.environ, METRICS_ENABLED='0', PYTHONDONTWRITEBYTECODE='1')
+    for name in ('FINOLOG_API_KEY', 'FINOLOG_BIZ_ID', 'MAIN_BOT_TOKEN', 'TEST_BOT_TOKEN'):
+        env.setdefault(name, 'startup-check')
+    for name in ('MAIN_BOT_ALLOWED_USERS', 'TEST_BOT_ALLOWED_USERS'):
+        env.setdefault(name, '0')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', HOLIDAY_RUN],
+        cwd=Path(__file__).resolve().parent, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Запуск завершился с ошибкой:\n{result.stderr[-2000:]}")
+    total, modules = parse_importtime(result.stderr)
+    heavy = json.loads(result.stdout.strip().splitlines()[-1])
+    return total, modules, heavy
+
+
+def load_baseline(path):
+    """Базовое время импортов, мс (None - замера нет или он с другой версии Python)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if baseline.get('python') != sys.version.split()[0]:
+        print(f"⚠️ Базовый замер {path} сделан на Python {baseline.get('python')}, не используем")
+        return None
+    return float(baseline['import_ms'])
+
+
+def save_baseline(path, import_ms):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'import_ms': round(import_ms, 1), 'python': sys.version.split()[0]}, f)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бюджет времени запуска в выходной день")
+    parser.add_argument('--budget-ms', type=float, default=get_int("STARTUP_BUDGET_MS", default=150),
+                        help="допустимое время импортов без базового замера, мс")
+    parser.add_argument('--baseline', default=get_env("STARTUP_BASELINE_FILE",
+                                                      default=str(BASE_DIR / "data" / "startup_baseline.json")),
+                        help="файл базового замера")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="допустимый рост относительно базового замера (0.5 = +50%%)")
+    parser.add_argument('--slack-ms', type=float, default=15.0,
+                        help="абсолютный запас к базовому замеру на шум измерения, мс")
+    parser.add_argument('--save-baseline', action='store_true', help="сохранить замер как базовый и выйти")
+    parser.add_argument('--runs', type=int, default=get_int("STARTUP_CHECK_RUNS", default=5),
+                        help="число запусков (берется лучший)")
+    parser.add_argument('--top', type=int, default=10, help="показать самые долгие импорты")
+    args = parser.parse_args(argv)
+
+    best = None
+    for _ in range(max(1, args.runs)):
+        measurement = measure_holiday_run()
+        if best is None or measurement[0] < best[0]:
+            best = measurement
+    total, modules, heavy = best
+
+    if args.save_baseline:
+        save_baseline(args.baseline, total / 1000)
+        print(f"💾 Базовый замер {total / 1000:.1f} мс сохранен в {args.baseline}")
+        return 0
+
+    baseline_ms = load_baseline(args.baseline)
+    if baseline_ms is not None:
+        budget_ms = baseline_ms * (1 + args.tolerance) + args.slack_ms
+        budget_note = f"базовый замер {baseline_ms:.1f} мс + {args.tolerance:.0%} + {args.slack_ms:.0f} мс"
+    else:
+        budget_ms = args.budget_ms
+        budget_note = "без базового замера"
+
+    print(f"⏱ Импорты при запуске в выходной: {total / 1000:.1f} мс "
+          f"(бюджет {budget_ms:.0f} мс, {budget_note}, лучший из {max(1, args.runs)})")
+    for cumulative, self_us, name in sorted(modules, reverse=True)[:args.top]:
+        print(f"   {cumulative / 1000:8.1f} мс  {name.strip()}")
+
+    ok = True
+    if heavy:
+        print(f"❌ Загружены тяжелые модули: {', '.join(heavy)}")
+        ok = False
+    if total / 1000 > budget_ms:
+        print("❌ Бюджет времени запуска превышен")
+        ok = False
+    if ok:
+        print("✅ Запуск в выходной укладывается в бюджет")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,24 +6,33 @@
 
 import datetime
 import os
+from config import SYNC_CONFIG, ANALYSIS_CONFIG, THREATENING_CONFIG, ALERT_CONFIG
 from holiday_checker_json import is_working_day, get_holiday_info
-from api_functions import (
-    get_all_accounts,
-    get_all_transactions_for_all_accounts, 
-    calculate_daily_balances,
-    get_current_balances,
-    analyze_all_accounts_balances
-)
-from telegram_functions import (
-    send_telegram_message,
-    send_telegram_message_wrapper,
-    send_positive_balance_report,
-    send_balance_analysis_report
-)
 
+# Остальные модули (api_functions, telegram_functions, numpy и т.д.) импортируются
+# в _check_and_notify после проверки календаря: в выходной cron-запуск
+# завершается, не загружая их (см. startup_check.py)
 
-def check_and_notify(bot_token, allowed_users, is_test=False, force_check=False):
-    """Проверяет остатки и отправляет уведомления только при наличии проблем и в рабочие дни"""
+
+def check_and_notify(bot_token, allowed_users, is_test=False, force_check=False, run_label=None):
+    """
+    Проверяет остатки и отправляет уведомления только при наличии проблем и в рабочие дни.
+
+    Returns:
+        dict: результат analyze_all_accounts_balances() или None, если сегодня выходной
+    """
+    from run_metrics import RunMetrics
+    
+    metrics = RunMetrics(run_label or ('test' if is_test else 'main')).start()
+    status = 'error'
+    try:
+        status, analysis_result = _check_and_notify(metrics, bot_token, allowed_users, is_test, force_check)
+    finally:
+        metrics.finish(status)
+    return analysis_result
+
+def _check_and_notify(metrics, bot_token, allowed_users, is_test, force_check):
+    """Этапы проверки с замером в metrics; возвращает (статус запуска, результат анализа)"""
     
     # Проверяем, рабочий ли сегодня день (если не принудительный режим)
     today = datetime.date.today()
@@ -33,32 +42,105 @@ def check_and_notify(bot_token, allowed_users, is_test=False, force_check=False)
             print(f"📅 Сегодня {holiday_info} - выходной, уведомления не отправляем")
         else:
             print(f"📅 Сегодня выходной день - уведомления не отправляем")
-        return
+        return 'holiday', None
     
     if force_check:
         print(f"📅 Принудительная проверка остатков (игнорируем выходной день)")
     else:
         print(f"📅 Сегодня рабочий день - проверяем остатки")
     
+    from balance_engine import DailyDeltaAccumulator
+    from compact_transactions import CompactTransactionIndex
+    from alert_state import AlertState
+    from api_functions import (
+        finolog_retry_count,
+        get_all_accounts,
+        get_all_transactions_for_all_accounts,
+        iter_transactions_for_all_accounts,
+        get_current_balances,
+        analyze_all_accounts_balances
+    )
+    from telegram_functions import (
+        send_telegram_message_wrapper,
+        edit_telegram_message_wrapper,
+        send_balance_analysis_report
+    )
+    
+    retries_before = finolog_retry_count()
+    
     # Получаем транзакции для всех счетов одним запросом
-    accounts = get_all_accounts()
+    with metrics.stage('get_all_accounts'):
+        accounts = get_all_accounts()
     account_ids = [account.get('id') for account in accounts]
     
     print(f"📊 Загружаем плановые транзакции для всех счетов одним запросом... {account_ids}")
 
     start_date = datetime.datetime.now().strftime("%Y-%m-%d")
-    transactions_by_account = get_all_transactions_for_all_accounts(account_ids, start_date)
+    accumulator = None
+    compact_index = None
+    with metrics.stage('get_all_transactions'):
+        if SYNC_CONFIG['mode'] == 'incremental':
+            from transaction_store import sync_transactions_for_all_accounts
+            transactions_by_account = sync_transactions_for_all_accounts(account_ids, start_date)
+        elif ANALYSIS_CONFIG['engine'] == 'stream':
+            # Потоковый режим: страницы сразу сворачиваются в дневные изменения остатков
+            transactions_by_account = None
+            accumulator = DailyDeltaAccumulator(start_date, THREATENING_CONFIG['days_ahead'])
+            for account_id, tx in iter_transactions_for_all_accounts(account_ids, start_date):
+                accumulator.add(account_id, tx)
+        elif ANALYSIS_CONFIG['engine'] == 'compact':
+            # Компактные массивы строятся прямо при загрузке, рядом с исходными словарями
+            compact_index = CompactTransactionIndex()
+            transactions_by_account = get_all_transactions_for_all_accounts(
+                account_ids, start_date, on_transaction=compact_index.add
+            )
+        else:
+            transactions_by_account = get_all_transactions_for_all_accounts(account_ids, start_date)
+    
+    if accumulator is not None:
+        metrics.add('transactions_processed', accumulator.transactions_seen)
+    else:
+        metrics.add('transactions_processed', sum(len(items) for items in transactions_by_account.values()))
     
     # Получаем текущие остатки
-    current_balances = get_current_balances(accounts)
+    with metrics.stage('get_current_balances'):
+        current_balances = get_current_balances(accounts)
+    metrics.add('finolog_retries', finolog_retry_count() - retries_before)
     
     # Единый анализ всех счетов
-    analysis_result = analyze_all_accounts_balances(transactions_by_account, accounts, current_balances)
+    with metrics.stage('analyze_all_accounts_balances'):
+        analysis_result = analyze_all_accounts_balances(transactions_by_account, accounts, current_balances,
+                                                        accumulator=accumulator, compact_index=compact_index)
     
     # Отправка единого уведомления
-    send_balance_analysis_report(analysis_result, 
-                               lambda chat_id, text: send_telegram_message_wrapper(bot_token, chat_id, text, is_test), 
-                               allowed_users)
+    # Состояние прошлых уведомлений - отдельно для каждого бота/бизнеса
+    alert_state = None
+    if ALERT_CONFIG['dedup'] or ALERT_CONFIG['edit_in_place']:
+        alert_state = AlertState.for_label(metrics.bot)
+    with metrics.stage('send_balance_analysis_report'):
+        delivery = send_balance_analysis_report(analysis_result, 
+                                   lambda chat_id, text: send_telegram_message_wrapper(bot_token, chat_id, text, is_test, detailed=True), 
+                                   allowed_users, alert_state=alert_state,
+                                   edit_telegram_func=lambda chat_id, message_id, text: edit_telegram_message_wrapper(
+                                       bot_token, chat_id, message_id, text, is_test, detailed=True))
+    for result in (delivery or {}).values():
+        metrics.add('telegram_messages_sent' if result['ok'] else 'telegram_messages_failed')
+        metrics.add('telegram_retries', result['attempts'] - 1)
+    
+    # История прогнозов - после рассылки, чтобы не задерживать уведомления;
+    # тестовые и принудительные запуски в ряд не попадают
+    if ANALYSIS_CONFIG['history'] and not is_test and not force_check:
+        from forecast_history import record_forecast
+        from compact_transactions import build_compact_index
+        with metrics.stage('record_forecast_history'):
+            if accumulator is None and compact_index is None:
+                compact_index = build_compact_index(transactions_by_account)
+            try:
+                record_forecast(account_ids, current_balances, start_date, THREATENING_CONFIG['days_ahead'],
+                                compact_index=compact_index, accumulator=accumulator)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Не удалось сохранить историю прогноза: {e}")
+    return 'ok', analysis_result
 
 def main(bot_token, allowed_users, is_test=False, force_check=False):
     """Основная функция"""
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Параллельная рассылка сообщений Telegram с ограничением частоты.
+
+Сообщения отправляются из пула потоков, поэтому время рассылки определяется
+самым медленным получателем, а не их количеством. Общий token bucket держит
+глобальный лимит Telegram (~30 сообщений/с), отдельные bucket на чат - лимит
+на один чат (~1 сообщение/с). Ответ 429 с retry_after приостанавливает чат
+на указанное время, временные ошибки повторяются с экспоненциальной паузой
+и случайным разбросом.
+
+Отчеты из нескольких частей (deliver_reports) отправляются каждому чату
+по порядку; при известных message_id прошлого отчета части редактируются
+на месте (editMessageText) вместо отправки новых сообщений.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import TELEGRAM_DELIVERY_CONFIG
+from rate_limiter import TokenBucket, KeyedTokenBuckets, backoff_delay as _backoff_delay
+
+_global_bucket = TokenBucket(
+    TELEGRAM_DELIVERY_CONFIG['global_rate'], TELEGRAM_DELIVERY_CONFIG['global_rate']
+)
+_chat_buckets = KeyedTokenBuckets(TELEGRAM_DELIVERY_CONFIG['per_chat_rate'], 1)
+
+
+def _normalize_result(result):
+    """Привести результат функции отправки (bool или dict call_telegram_api) к dict"""
+    if isinstance(result, dict):
+        return result
+    return {'ok': bool(result), 'retry_after': None, 'transient': False,
+            'description': '' if result else 'отправка не удалась'}
+
+
+def backoff_delay(attempt, base=None):
+    """Экспоненциальная пауза с разбросом: base * 2^attempt * [0.5, 1.5)"""
+    if base is None:
+        base = TELEGRAM_DELIVERY_CONFIG['backoff_base']
+    return _backoff_delay(attempt, base)
+
+
+def deliver_message(send_func, chat_id, text):
+    """
+    Отправить одно сообщение с соблюдением лимитов и повторами.
+
+    Args:
+        send_func: функция (chat_id, text) -> bool или dict call_telegram_api()
+        chat_id: получатель
+        text: текст сообщения
+
+    Returns:
+        dict: последний результат отправки (см. call_telegram_api) и 'attempts'
+    """
+    chat_bucket = _chat_buckets.get(chat_id)
+    max_retries = TELEGRAM_DELIVERY_CONFIG['max_retries']
+    result = None
+    for attempt in range(max_retries + 1):
+        chat_bucket.acquire()
+        _global_bucket.acquire()
+        try:
+            result = _normalize_result(send_func(chat_id, text))
+        except Exception as e:
+            result = {'ok': False, 'retry_after': None, 'transient': True, 'description': str(e)}
+
+        result['attempts'] = attempt + 1
+        if result['ok'] or attempt == max_retries:
+            return result
+
+        if result.get('retry_after'):
+            # Telegram сам сказал, сколько ждать - паузим весь чат
+            chat_bucket.block_for(result['retry_after'])
+            continue
+        if not result.get('transient'):
+            return result
+        time.sleep(backoff_delay(attempt))
+    return result
+
+
+def deliver_to_users(send_func, allowed_users, text, label="сообщение"):
+    """
+    Разослать text всем allowed_users параллельно.
+
+    Returns:
+        dict: {user_id: результат deliver_message()}
+    """
+    if not allowed_users:
+        return {}
+
+    workers = min(TELEGRAM_DELIVERY_CONFIG['max_workers'], len(allowed_users))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {user_id: executor.submit(deliver_message, send_func, user_id, text)
+                   for user_id in allowed_users}
+        results = {user_id: future.result() for user_id, future in futures.items()}
+
+    for user_id, result in results.items():
+        if result['ok']:
+            print(f"Отправлено {label} пользователю {user_id}")
+        else:
+            print(f"Ошибка отправки ({label}) пользователю {user_id} после "
+                  f"{result['attempts']} попыток: {result.get('description', '')}")
+    return results
+
+
+def _message_id(result):
+    return (result.get('result') or {}).get('message_id') if isinstance(result.get('result'), dict) else None
+
+
+def deliver_report(send_func, edit_func, chat_id, chunks, message_ids=None):
+    """
+    Отправить отчет из нескольких частей одному чату или отредактировать прошлый.
+
+    Если message_ids прошлого отчета заданы и их столько же, сколько частей,
+    части редактируются на месте; если редактирование невозможно (сообщение
+    удалено, слишком старое и т.п.), отчет отправляется заново.
+
+    Args:
+        send_func: функция (chat_id, text) -> dict call_telegram_api()
+        edit_func: функция (chat_id, message_id, text) -> dict call_telegram_api() или None
+        chunks: части отчета по порядку
+        message_ids: message_id частей прошлого отчета
+
+    Returns:
+        dict: 'ok', 'attempts', 'description', 'message_ids' (новые или прежние) и
+              'edited' (отчет обновлен на месте)
+    """
+    attempts = 0
+    if edit_func and message_ids and len(message_ids) == len(chunks):
+        edited = True
+        for message_id, chunk in zip(message_ids, chunks):
+            result = deliver_message(lambda chat, text: edit_func(chat, message_id, text), chat_id, chunk)
+            attempts += result['attempts']
+            if not result['ok'] and 'message is not modified' not in result.get('description', ''):
+                edited = False
+                break
+        if edited:
+            return {'ok': True, 'attempts': attempts, 'description': '',
+                    'message_ids': list(message_ids), 'edited': True}
+
+    sent_ids = []
+    for chunk in chunks:
+        result = deliver_message(send_func, chat_id, chunk)
+        attempts += result['attempts']
+        if not result['ok']:
+            return {'ok': False, 'attempts': attempts, 'description': result.get('description', ''),
+                    'message_ids': sent_ids, 'edited': False}
+        sent_ids.append(_message_id(result))
+    return {'ok': True, 'attempts': attempts, 'description': '', 'message_ids': sent_ids, 'edited': False}
+
+
+def deliver_reports(send_func, edit_func, plans, label="отчет"):
+    """
+    Разослать отчеты параллельно по чатам (части внутри чата - по порядку).
+
+    Args:
+        plans: {user_id: (chunks, message_ids или None)}
+
+    Returns:
+        dict: {user_id: результат deliver_report()}
+    """
+    if not plans:
+        return {}
+
+    workers = min(TELEGRAM_DELIVERY_CONFIG['max_workers'], len(plans))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {user_id: executor.submit(deliver_report, send_func, edit_func, user_id, chunks, message_ids)
+                   for user_id, (chunks, message_ids) in plans.items()}
+        results = {user_id: future.result() for user_id, future in futures.items()}
+
+    for user_id, result in results.items():
+        if result['ok']:
+            action = "Обновлено" if result['edited'] else "Отправлено"
+            print(f"{action} {label} пользователю {user_id}")
+        else:
+            print(f"Ошибка отправки ({label}) пользователю {user_id} после "
+                  f"{result['attempts']} попыток: {result.get('description', '')}")
+    return results
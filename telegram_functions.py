@@ -4,36 +4,158 @@
 Функции для работы с Telegram ботом
 """
 
-import urllib.request
-import urllib.parse
-import json
 from datetime import datetime, timedelta
+from config import TELEGRAM_CONFIG, ALERT_CONFIG
+from http_client import get_shared_client
+from balance_engine import total_interval_days
+from telegram_delivery import deliver_to_users, deliver_reports
+from alert_state import (
+    build_snapshot, snapshot_fingerprint, has_problems, diff_snapshots, format_diff_message, escalated
+)
 
-def send_telegram_message(bot_token, chat_id, text):
-    """Отправляет сообщение в Telegram"""
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+# Предел длины сообщения Telegram (в UTF-16 единицах, как считает Telegram)
+TELEGRAM_MESSAGE_LIMIT = 4096
+TEST_PREFIX = "🧪 ТЕСТ: "
+
+def call_telegram_api(bot_token, method, data, timeout=30):
+    """
+    Вызывает метод Telegram Bot API.
+    
+    Returns:
+        dict: {
+            'ok': bool,
+            'result': результат метода (при ok),
+            'error_code': int | None,
+            'description': str,
+            'retry_after': секунды из ответа 429 или None,
+            'transient': можно ли повторить запрос (429, 5xx, сетевые ошибки)
+        }
+    """
+    url = f"{TELEGRAM_CONFIG['api_url']}/bot{bot_token}/{method}"
+    
+    try:
+        response = get_shared_client().post_form(url, data, timeout=timeout)
+    except Exception as e:
+        return {'ok': False, 'result': None, 'error_code': None,
+                'description': str(e), 'retry_after': None, 'transient': True}
+    
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    
+    if response.status < 400 and payload.get('ok', False):
+        return {'ok': True, 'result': payload.get('result'), 'error_code': None,
+                'description': '', 'retry_after': None, 'transient': False}
+    
+    error_code = payload.get('error_code', response.status)
+    retry_after = (payload.get('parameters') or {}).get('retry_after')
+    if retry_after is None and response.status == 429:
+        # Retry-After бывает и HTTP-датой; без заголовка ждем секунду
+        retry_after = response.retry_after()
+        if retry_after is None:
+            retry_after = 1
+    return {
+        'ok': False,
+        'result': None,
+        'error_code': error_code,
+        'description': payload.get('description', f"HTTP {response.status}"),
+        'retry_after': retry_after,
+        'transient': response.status == 429 or response.status >= 500,
+    }
+
+def send_telegram_message(bot_token, chat_id, text, detailed=False):
+    """
+    Отправляет сообщение в Telegram.
     
+    Returns:
+        bool: успех отправки, либо при detailed=True - словарь call_telegram_api()
+    """
     data = {
         'chat_id': chat_id,
         'text': text,
         'parse_mode': 'HTML'
     }
     
-    data = urllib.parse.urlencode(data).encode('utf-8')
-    
-    try:
-        with urllib.request.urlopen(url, data) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            return result.get('ok', False)
-    except Exception as e:
-        print(f"Ошибка отправки сообщения: {e}")
-        return False
+    result = call_telegram_api(bot_token, 'sendMessage', data)
+    if not result['ok']:
+        print(f"Ошибка отправки сообщения: {result['description']}")
+    return result if detailed else result['ok']
 
-def send_telegram_message_wrapper(bot_token, chat_id, text, is_test=False):
+def send_telegram_message_wrapper(bot_token, chat_id, text, is_test=False, detailed=False):
     """Обертка для отправки сообщения в Telegram с поддержкой тестового режима"""
     if is_test:
-        text = "🧪 ТЕСТ: " + text
-    return send_telegram_message(bot_token, chat_id, text)
+        text = TEST_PREFIX + text
+    return send_telegram_message(bot_token, chat_id, text, detailed=detailed)
+
+def edit_telegram_message(bot_token, chat_id, message_id, text, detailed=False):
+    """
+    Заменяет текст отправленного сообщения (editMessageText).
+    
+    Returns:
+        bool: успех, либо при detailed=True - словарь call_telegram_api()
+    """
+    data = {
+        'chat_id': chat_id,
+        'message_id': message_id,
+        'text': text,
+        'parse_mode': 'HTML'
+    }
+    
+    result = call_telegram_api(bot_token, 'editMessageText', data)
+    if not result['ok']:
+        print(f"Ошибка редактирования сообщения: {result['description']}")
+    return result if detailed else result['ok']
+
+def edit_telegram_message_wrapper(bot_token, chat_id, message_id, text, is_test=False, detailed=False):
+    """Обертка для редактирования сообщения с поддержкой тестового режима"""
+    if is_test:
+        text = TEST_PREFIX + text
+    return edit_telegram_message(bot_token, chat_id, message_id, text, detailed=detailed)
+
+def _telegram_length(text):
+    return len(text.encode('utf-16-le')) // 2
+
+def split_message(text, limit=None):
+    """
+    Разбить текст на части не длиннее limit (по умолчанию предел Telegram с
+    запасом на префикс тестового режима). Режем по пустым строкам, затем по
+    строкам - строки отчета содержат закрытые HTML теги, разметка не рвется;
+    строка длиннее предела режется по символам.
+    """
+    if limit is None:
+        limit = TELEGRAM_MESSAGE_LIMIT - _telegram_length(TEST_PREFIX)
+    if _telegram_length(text) <= limit:
+        return [text]
+    
+    pieces = []
+    for block in text.split("\n\n"):
+        if _telegram_length(block) <= limit:
+            pieces.append((block, "\n\n"))
+            continue
+        for line in block.split("\n"):
+            while _telegram_length(line) > limit:
+                cut = limit
+                while _telegram_length(line[:cut]) > limit:
+                    cut -= 1
+                pieces.append((line[:cut], ""))
+                line = line[cut:]
+            pieces.append((line, "\n"))
+        pieces[-1] = (pieces[-1][0], "\n\n")
+    
+    chunks = []
+    current = []
+    length = 0
+    for piece, separator in pieces:
+        piece_length = _telegram_length(piece)
+        if current and length + piece_length > limit:
+            chunks.append("".join(current).rstrip("\n"))
+            current, length = [], 0
+        current.append(piece + separator)
+        length += piece_length + len(separator)
+    if current:
+        chunks.append("".join(current).rstrip("\n"))
+    return [chunk for chunk in chunks if chunk]
 
 def send_positive_balance_report(send_telegram_message_func, allowed_users):
     """Отправляет уведомление о том, что минусов нет (только в 9 утра)"""
@@ -48,18 +170,166 @@ def send_positive_balance_report(send_telegram_message_func, allowed_users):
     message += "🎉 <b>Отрицательных остатков не обнаружено</b>\n\n"
     message += "📊 Анализ выполнен успешно"
     
-    # Отправляем отчет всем разрешенным пользователям
+    # Отправляем отчет всем разрешенным пользователям параллельно
+    return deliver_to_users(send_telegram_message_func, allowed_users, message, "утреннее уведомление")
+
+def format_breach_intervals(intervals, limit=5):
+    """
+    Форматирует интервалы (start_date, end_date, min_balance, min_date) для отчета:
+    "с X по Y, минимум Z (дата)". Показывает не более limit интервалов.
+    """
+    lines = ""
+    for start_date, end_date, min_balance, min_date in intervals[:limit]:
+        if start_date == end_date:
+            lines += f"   • {start_date}:  {min_balance:,.0f} р.\n"
+        else:
+            lines += f"   • с {start_date} по {end_date}, минимум {min_balance:,.0f} р. ({min_date})\n"
+    
+    if len(intervals) > limit:
+        lines += f"   • ... и еще {len(intervals) - limit} периодов\n"
+    return lines
+
+def format_balance_analysis_message(analysis_result):
+    """Полный текст уведомления "Анализ остатков счетов" """
+    negative_balances = analysis_result['negative_balances']
+    threatening_balances = analysis_result['threatening_balances']
+    accounts_info = analysis_result['accounts_info']
+    
+    # Части собираются в список и склеиваются один раз
+    parts = ["⚠️ <b>Анализ остатков счетов</b>\n\n"]
+    
+    # Добавляем информацию об отрицательных остатках
+    if negative_balances:
+        parts.append("🔴 <b>ОТРИЦАТЕЛЬНЫЕ ОСТАТКИ:</b>\n\n")
+        
+        for account_id, negative_intervals in negative_balances.items():
+            account_name = accounts_info[account_id]['name']
+            
+            parts.append(f"📊 <b>{account_name}</b>\n")
+            parts.append(f"📅 Отрицательные дни: {total_interval_days(negative_intervals)}\n")
+            parts.append(format_breach_intervals(negative_intervals))
+            parts.append("\n")
+    
+    # Добавляем информацию об угрожающих остатках
+    if threatening_balances:
+        parts.append("🟡 <b>УГРОЖАЮЩИЕ ОСТАТКИ:</b>\n\n")
+        
+        for account_id, threatening_intervals in threatening_balances.items():
+            account_name = accounts_info[account_id]['name']
+            
+            parts.append(f"📊 <b>{account_name}</b>\n")
+            parts.append(f"📅 Угрожающие дни: {total_interval_days(threatening_intervals)}\n")
+            parts.append(format_breach_intervals(threatening_intervals))
+            parts.append("\n")
+    
+    parts.append("⚠️ <b>Требуется внимание!</b>")
+    return "".join(parts)
+
+def plan_deduplicated_messages(analysis_result, allowed_users, alert_state):
+    """
+    Решить, что отправить каждому получателю с учетом прошлых уведомлений.
+    
+    - отчет не изменился и интервал повтора не прошел - ничего;
+    - первое уведомление о проблемах или прошел интервал повтора - полный отчет;
+    - иначе - только изменения (новые, устраненные, изменение минимума).
+    
+    Полный отчет и сводка изменений от одного и того же прошлого снимка
+    строятся один раз на запуск, а не для каждого получателя.
+    
+    Returns:
+        tuple: ({текст: [получатели]}, snapshot, fingerprint, текст полного отчета или None)
+    """
+    snapshot = build_snapshot(analysis_result)
+    fingerprint = snapshot_fingerprint(snapshot)
+    problems = has_problems(snapshot)
+    full_message = None
+    diff_messages = {}
+    messages = {}
+    
+    def diff_message(entry):
+        if entry['fingerprint'] not in diff_messages:
+            diff_messages[entry['fingerprint']] = format_diff_message(diff_snapshots(entry['snapshot'], snapshot))
+        return diff_messages[entry['fingerprint']]
+    
+    for user_id in allowed_users:
+        entry = alert_state.get(user_id)
+        previous = entry['snapshot'] if entry else None
+        if entry and entry['fingerprint'] == fingerprint:
+            if not problems or not alert_state.is_renotify_due(user_id):
+                continue
+            text = full_message = full_message or format_balance_analysis_message(analysis_result)
+        elif not problems:
+            # Проблемы исчезли - сообщаем только тем, кто о них знал
+            if not has_problems(previous):
+                continue
+            text = diff_message(entry)
+        elif not has_problems(previous) or alert_state.is_renotify_due(user_id):
+            text = full_message = full_message or format_balance_analysis_message(analysis_result)
+        else:
+            text = diff_message(entry)
+        messages.setdefault(text, []).append(user_id)
+    return messages, snapshot, fingerprint, full_message
+
+def plan_report_updates(analysis_result, allowed_users, alert_state, now=None):
+    """
+    План рассылки в режиме редактирования на месте (ALERT_EDIT_IN_PLACE).
+    
+    - отчет не изменился и интервал повтора не прошел - ничего;
+    - первый отчет о проблемах, рост серьезности (escalated) или повтор по
+      интервалу - новое сообщение;
+    - иначе прошлый отчет в чате редактируется (editMessageText);
+    - проблемы исчезли - прошлый отчет заменяется сводкой устраненного.
+    
+    Текст и разбиение на части строятся один раз на запуск.
+    
+    Returns:
+        tuple: ({user_id: (части, message_ids для редактирования или None)}, snapshot, fingerprint)
+    """
+    snapshot = build_snapshot(analysis_result)
+    fingerprint = snapshot_fingerprint(snapshot)
+    problems = has_problems(snapshot)
+    moscow_time = (now or datetime.utcnow()) + timedelta(hours=3)
+    rendered = {}
+    
+    def chunks(key, render):
+        if key not in rendered:
+            rendered[key] = split_message(render())
+        return rendered[key]
+    
+    def full_chunks():
+        return chunks('full', lambda: format_balance_analysis_message(analysis_result))
+    
+    def edited_chunks():
+        return chunks('edited', lambda: format_balance_analysis_message(analysis_result)
+                      + f"\n\n✏️ Обновлено в {moscow_time.strftime('%H:%M')} МСК")
+    
+    plans = {}
     for user_id in allowed_users:
-        try:
-            success = send_telegram_message_func(user_id, message)
-            if success:
-                print(f"Отправлено утреннее уведомление пользователю {user_id}")
-            else:
-                print(f"Ошибка отправки утреннего уведомления пользователю {user_id}")
-        except Exception as e:
-            print(f"Ошибка отправки утреннего уведомления пользователю {user_id}: {e}")
+        entry = alert_state.get(user_id)
+        previous = entry['snapshot'] if entry else None
+        message_ids = entry.get('message_ids') if entry else None
+        if entry and entry['fingerprint'] == fingerprint:
+            if not problems or not alert_state.is_renotify_due(user_id):
+                continue
+            plans[user_id] = (full_chunks(), None)
+        elif not problems:
+            # Проблемы исчезли - прошлый отчет заменяем сводкой (только тем, кто о них знал)
+            if not has_problems(previous):
+                continue
+            plans[user_id] = (
+                chunks(('resolved', entry['fingerprint']),
+                       lambda: format_diff_message(diff_snapshots(previous, snapshot))),
+                message_ids
+            )
+        elif (not has_problems(previous) or not message_ids or escalated(previous, snapshot)
+              or alert_state.is_renotify_due(user_id)):
+            plans[user_id] = (full_chunks(), None)
+        else:
+            plans[user_id] = (edited_chunks(), message_ids)
+    return plans, snapshot, fingerprint
 
-def send_balance_analysis_report(analysis_result, send_telegram_func, allowed_users):
+def send_balance_analysis_report(analysis_result, send_telegram_func, allowed_users, alert_state=None,
+                                 edit_telegram_func=None):
     """
     Отправляет единое уведомление с анализом всех счетов
     
@@ -67,10 +337,52 @@ def send_balance_analysis_report(analysis_result, send_telegram_func, allowed_us
         analysis_result: результат analyze_all_accounts_balances()
         send_telegram_func: функция отправки сообщений
         allowed_users: список разрешенных пользователей
+        alert_state: необязательный AlertState - тогда неизменившийся отчет не повторяется,
+                     а при изменениях отправляется только разница (см. plan_deduplicated_messages)
+        edit_telegram_func: функция (chat_id, message_id, text) редактирования сообщения; вместе
+                            с alert_state и ALERT_EDIT_IN_PLACE прошлый отчет обновляется на месте
+                            (см. plan_report_updates)
+    
+    Returns:
+        dict: результаты доставки по пользователям (см. deliver_to_users, deliver_reports)
     """
     negative_balances = analysis_result['negative_balances']
     threatening_balances = analysis_result['threatening_balances']
-    accounts_info = analysis_result['accounts_info']
+    
+    delivery = {}
+    if alert_state is not None and edit_telegram_func is not None and ALERT_CONFIG['edit_in_place']:
+        plans, snapshot, fingerprint = plan_report_updates(analysis_result, allowed_users, alert_state)
+        delivery = deliver_reports(send_telegram_func, edit_telegram_func, plans, "отчет об анализе остатков")
+        for user_id, result in delivery.items():
+            if result['ok']:
+                message_ids = result['message_ids'] if all(result['message_ids']) else None
+                alert_state.record(user_id, snapshot, fingerprint, message_ids=message_ids, edited=result['edited'],
+                                   full=not result['edited'])
+        skipped = len(allowed_users) - len(plans)
+        if skipped and (negative_balances or threatening_balances):
+            print(f"Отчет не изменился - повторное уведомление не отправлено {skipped} получателям")
+        alert_state.save()
+        if negative_balances or threatening_balances:
+            return delivery
+    elif alert_state is not None:
+        messages, snapshot, fingerprint, full_message = plan_deduplicated_messages(
+            analysis_result, allowed_users, alert_state
+        )
+        for text, users in messages.items():
+            chunks = split_message(text)
+            results = deliver_reports(send_telegram_func, None, {user_id: (chunks, None) for user_id in users},
+                                      "уведомление об анализе остатков")
+            for user_id, result in results.items():
+                if result['ok']:
+                    # Сводка изменений не сдвигает интервал повтора полного отчета
+                    alert_state.record(user_id, snapshot, fingerprint, full=text == full_message)
+            delivery.update(results)
+        skipped = len(allowed_users) - sum(len(users) for users in messages.values())
+        if skipped and (negative_balances or threatening_balances):
+            print(f"Отчет не изменился - повторное уведомление не отправлено {skipped} получателям")
+        alert_state.save()
+        if negative_balances or threatening_balances:
+            return delivery
     
     # Проверяем, есть ли проблемы
     if not negative_balances and not threatening_balances:
@@ -79,64 +391,13 @@ def send_balance_analysis_report(analysis_result, send_telegram_func, allowed_us
         moscow_time = current_time_utc + timedelta(hours=3)
         
         if moscow_time.hour == 9 and moscow_time.minute < 10:
-            send_positive_balance_report(send_telegram_func, allowed_users)
+            delivery.update(send_positive_balance_report(send_telegram_func, allowed_users))
             print("Отправлено уведомление о том, что проблем нет (9 утра по Москве)")
         else:
             print(f"Проблем нет - уведомление не отправлено (время: {moscow_time.strftime('%H:%M')} МСК)")
-        return
-    
-    # Формируем сообщение о проблемах
-    message = "⚠️ <b>Анализ остатков счетов</b>\n\n"
-    
-    # Добавляем информацию об отрицательных остатках
-    if negative_balances:
-        message += "🔴 <b>ОТРИЦАТЕЛЬНЫЕ ОСТАТКИ:</b>\n\n"
-        
-        for account_id, negative_days in negative_balances.items():
-            account_name = accounts_info[account_id]['name']
-            current_balance = accounts_info[account_id]['current_balance']
-            
-            message += f"📊 <b>{account_name}</b>\n"
-            message += f"📅 Отрицательные дни: {len(negative_days)}\n"
-            
-            # Показываем первые 5 дней для краткости
-            for i, (date, balance) in enumerate(negative_days[:5]):
-                message += f"   • {date}:  {balance:,.0f} р.\n"
-            
-            if len(negative_days) > 5:
-                message += f"   • ... и еще {len(negative_days) - 5} дней\n"
-            
-            message += "\n"
+        return delivery
     
-    # Добавляем информацию об угрожающих остатках
-    if threatening_balances:
-        message += "🟡 <b>УГРОЖАЮЩИЕ ОСТАТКИ:</b>\n\n"
-        
-        for account_id, threatening_days in threatening_balances.items():
-            account_name = accounts_info[account_id]['name']
-            current_balance = accounts_info[account_id]['current_balance']
-            
-            message += f"📊 <b>{account_name}</b>\n"
-            message += f"📅 Угрожающие дни: {len(threatening_days)}\n"
-            
-            # Показываем первые 5 дней для краткости
-            for i, (date, balance) in enumerate(threatening_days[:5]):
-                message += f"   • {date}:  {balance:,.0f} р.\n"
-            
-            if len(threatening_days) > 5:
-                message += f"   • ... и еще {len(threatening_days) - 5} дней\n"
-            
-            message += "\n"
-    
-    message += "⚠️ <b>Требуется внимание!</b>"
-    
-    # Отправляем уведомление всем разрешенным пользователям
-    for user_id in allowed_users:
-        try:
-            success = send_telegram_func(user_id, message)
-            if success:
-                print(f"Отправлено уведомление об анализе остатков пользователю {user_id}")
-            else:
-                print(f"Ошибка отправки уведомления об анализе остатков пользователю {user_id}")
-        except Exception as e:
-            print(f"Ошибка отправки уведомления об анализе остатков пользователю {user_id}: {e}")
+    # Отправляем уведомление всем разрешенным пользователям параллельно (длинный отчет - частями)
+    chunks = split_message(format_balance_analysis_message(analysis_result))
+    return deliver_reports(send_telegram_func, None, {user_id: (chunks, None) for user_id in allowed_users},
+                           "уведомление об анализе остатков")
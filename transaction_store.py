@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальное хранилище плановых транзакций Finolog (SQLite) и инкрементальная синхронизация.
+
+API Finolog не умеет отдавать "изменения с момента X", поэтому вместо полной
+загрузки двух лет каждый запуск обновляются узкие окна:
+- ближнее окно (сегодня + near_days) - каждый запуск;
+- одно скользящее окно slice_days, которое по кругу проходит весь диапазон;
+- новый "хвост" диапазона, появившийся при смене дня.
+Полная пересинхронизация выполняется раз в full_resync_hours, при смене
+списка счетов или при провале проверок целостности.
+
+Использование:
+    python3 transaction_store.py status
+    python3 transaction_store.py resync
+    python3 transaction_store.py check [--verify]
+"""
+
+import json
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from config import SYNC_CONFIG
+from api_functions import (
+    get_all_accounts,
+    get_planned_transactions_range,
+    get_transactions_window,
+    is_counted_transaction,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    account_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_day ON transactions(day);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def open_store(db_path=None):
+    """Открыть (и при необходимости создать) базу транзакций"""
+    path = Path(db_path or SYNC_CONFIG['db_path'])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _get_state(conn, key, default=None):
+    row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_state(conn, key, value):
+    conn.execute(
+        "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+        (key, str(value))
+    )
+
+
+def _shift_date(date_str, days):
+    return (datetime.strptime(date_str, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def _replace_window(conn, date_from, date_to, transactions):
+    """
+    Заменить содержимое окна [date_from, date_to] свежими данными API.
+    Удаление перед вставкой убирает транзакции, удаленные или перенесенные в Finolog.
+    """
+    next_seq = int(_get_state(conn, 'next_seq', 0))
+    conn.execute("DELETE FROM transactions WHERE day BETWEEN ? AND ?", (date_from, date_to))
+    rows = []
+    for tx in transactions:
+        rows.append((
+            tx['id'],
+            tx.get('account_id'),
+            str(tx.get('date', ''))[:10],
+            next_seq,
+            json.dumps(tx, ensure_ascii=False),
+        ))
+        next_seq += 1
+    conn.executemany(
+        "INSERT OR REPLACE INTO transactions (id, account_id, day, seq, payload) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    _set_state(conn, 'next_seq', next_seq)
+    return len(rows)
+
+
+def _sync_window(conn, account_ids, date_from, date_to):
+    """Загрузить окно из API и записать его в хранилище одной транзакцией"""
+    transactions = get_planned_transactions_range(account_ids, date_from, date_to)
+    with conn:
+        count = _replace_window(conn, date_from, date_to, transactions)
+    print(f"🔄 Окно {date_from} - {date_to}: {count} транзакций")
+    return count
+
+
+def _accounts_key(account_ids):
+    return ','.join(str(account_id) for account_id in sorted(account_ids))
+
+
+def full_resync(conn, account_ids, start_date):
+    """Полностью перезагрузить весь диапазон транзакций"""
+    range_from, range_to = get_transactions_window(start_date)
+    print(f"🔄 Полная синхронизация транзакций {range_from} - {range_to}...")
+    transactions = get_planned_transactions_range(account_ids, range_from, range_to)
+    with conn:
+        conn.execute("DELETE FROM transactions")
+        count = _replace_window(conn, range_from, range_to, transactions)
+        _set_state(conn, 'accounts', _accounts_key(account_ids))
+        _set_state(conn, 'range_from', range_from)
+        _set_state(conn, 'range_to', range_to)
+        _set_state(conn, 'slice_cursor', range_from)
+        _set_state(conn, 'last_full_sync', datetime.now().isoformat())
+        _set_state(conn, 'last_sync', datetime.now().isoformat())
+    print(f"✅ Полная синхронизация завершена: {count} транзакций")
+    return count
+
+
+def _needs_full_resync(conn, account_ids):
+    last_full_sync = _get_state(conn, 'last_full_sync')
+    if not last_full_sync:
+        return "хранилище пустое"
+    if _get_state(conn, 'accounts') != _accounts_key(account_ids):
+        return "изменился список счетов"
+    age = datetime.now() - datetime.fromisoformat(last_full_sync)
+    if age > timedelta(hours=SYNC_CONFIG['full_resync_hours']):
+        return f"последняя полная синхронизация {age} назад"
+    return None
+
+
+def incremental_sync(conn, account_ids, start_date):
+    """Обновить ближнее окно, новый хвост диапазона и очередное скользящее окно"""
+    range_from, range_to = get_transactions_window(start_date)
+    previous_range_to = _get_state(conn, 'range_to', range_to)
+
+    # Сдвиг диапазона при смене дня: удаляем ушедшее в прошлое, догружаем хвост
+    with conn:
+        conn.execute("DELETE FROM transactions WHERE day < ? OR day > ?", (range_from, range_to))
+    if previous_range_to < range_to:
+        _sync_window(conn, account_ids, _shift_date(previous_range_to, 1), range_to)
+
+    near_to = min(_shift_date(start_date, SYNC_CONFIG['near_days']), range_to)
+    _sync_window(conn, account_ids, start_date, near_to)
+
+    slice_from = _get_state(conn, 'slice_cursor', range_from)
+    if slice_from < range_from or slice_from > range_to:
+        slice_from = range_from
+    slice_to = min(_shift_date(slice_from, SYNC_CONFIG['slice_days'] - 1), range_to)
+    _sync_window(conn, account_ids, slice_from, slice_to)
+
+    with conn:
+        _set_state(conn, 'range_from', range_from)
+        _set_state(conn, 'range_to', range_to)
+        _set_state(conn, 'slice_cursor', _shift_date(slice_to, 1))
+        _set_state(conn, 'last_sync', datetime.now().isoformat())
+
+
+def check_consistency(conn, account_ids, start_date):
+    """
+    Локальные проверки целостности хранилища (без запросов к API).
+
+    Returns:
+        list: описания найденных проблем (пустой список - все в порядке)
+    """
+    problems = []
+    integrity = conn.execute("PRAGMA quick_check").fetchone()[0]
+    if integrity != 'ok':
+        problems.append(f"SQLite quick_check: {integrity}")
+
+    range_from, range_to = get_transactions_window(start_date)
+    outside = conn.execute(
+        "SELECT COUNT(*) FROM transactions WHERE day < ? OR day > ?", (range_from, range_to)
+    ).fetchone()[0]
+    if outside:
+        problems.append(f"{outside} транзакций вне диапазона {range_from} - {range_to}")
+
+    known_accounts = {str(account_id) for account_id in account_ids}
+    foreign = 0
+    split_parts = 0
+    for account_id, payload in conn.execute("SELECT account_id, payload FROM transactions"):
+        if str(account_id) not in known_accounts:
+            foreign += 1
+        if not is_counted_transaction(json.loads(payload)):
+            split_parts += 1
+    if foreign:
+        problems.append(f"{foreign} транзакций по неизвестным счетам")
+    if split_parts:
+        problems.append(f"{split_parts} частей разбитых операций в хранилище")
+    return problems
+
+
+def verify_window(conn, account_ids, date_from, date_to):
+    """
+    Сверить окно хранилища с API по набору ID транзакций.
+
+    Returns:
+        list: описания расхождений
+    """
+    api_ids = {tx['id'] for tx in get_planned_transactions_range(account_ids, date_from, date_to)}
+    store_ids = {
+        row[0] for row in conn.execute(
+            "SELECT id FROM transactions WHERE day BETWEEN ? AND ?", (date_from, date_to)
+        )
+    }
+    problems = []
+    if api_ids - store_ids:
+        problems.append(f"{len(api_ids - store_ids)} транзакций из API нет в хранилище ({date_from} - {date_to})")
+    if store_ids - api_ids:
+        problems.append(f"{len(store_ids - api_ids)} лишних транзакций в хранилище ({date_from} - {date_to})")
+    return problems
+
+
+def load_transactions_by_account(conn, date_from, date_to):
+    """Прочитать транзакции из хранилища в формате get_all_transactions_for_all_accounts()"""
+    transactions_by_account = {}
+    rows = conn.execute(
+        "SELECT account_id, payload FROM transactions WHERE day BETWEEN ? AND ? ORDER BY day, seq",
+        (date_from, date_to)
+    )
+    for account_id, payload in rows:
+        if account_id not in transactions_by_account:
+            transactions_by_account[account_id] = []
+        transactions_by_account[account_id].append(json.loads(payload))
+    return transactions_by_account
+
+
+def sync_transactions_for_all_accounts(account_ids, start_date, db_path=None):
+    """
+    Инкрементальная замена get_all_transactions_for_all_accounts().
+
+    Returns:
+        dict: {account_id: [transaction, ...]} - тот же формат, что и у полной загрузки
+    """
+    conn = open_store(db_path)
+    try:
+        reason = _needs_full_resync(conn, account_ids)
+        if reason:
+            print(f"📦 Полная синхронизация: {reason}")
+            full_resync(conn, account_ids, start_date)
+        else:
+            incremental_sync(conn, account_ids, start_date)
+            problems = check_consistency(conn, account_ids, start_date)
+            if problems:
+                print(f"⚠️ Проблемы хранилища транзакций: {'; '.join(problems)}")
+                full_resync(conn, account_ids, start_date)
+
+        range_from, range_to = get_transactions_window(start_date)
+        return load_transactions_by_account(conn, range_from, range_to)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    """Команды обслуживания хранилища: status, resync, check [--verify]"""
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else 'status'
+    start_date = datetime.now().strftime("%Y-%m-%d")
+    conn = open_store()
+    try:
+        if command == 'status':
+            count = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+            print(f"📦 {SYNC_CONFIG['db_path']}: {count} транзакций")
+            for key, value in conn.execute("SELECT key, value FROM sync_state ORDER BY key"):
+                print(f"   {key}: {value}")
+            return 0
+
+        accounts = get_all_accounts()
+        if not accounts:
+            print("❌ Не удалось получить список счетов")
+            return 1
+        account_ids = [account.get('id') for account in accounts]
+
+        if command == 'resync':
+            full_resync(conn, account_ids, start_date)
+            return 0
+
+        if command == 'check':
+            problems = check_consistency(conn, account_ids, start_date)
+            if '--verify' in argv:
+                near_to = _shift_date(start_date, SYNC_CONFIG['near_days'])
+                problems += verify_window(conn, account_ids, start_date, near_to)
+            if problems:
+                for problem in problems:
+                    print(f"❌ {problem}")
+                return 1
+            print("✅ Хранилище транзакций согласовано")
+            return 0
+
+        print(f"Неизвестная команда: {command}")
+        return 2
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест webhook_server.py с фейковым клиентом Telegram.
+
+finolog_stub.py (Finolog и sendMessage) запускается в отдельном процессе,
+сервер webhook - в отдельном потоке со своим циклом событий, а
+FakeTelegramClient как Telegram отправляет POST с обновлениями
+по нескольким keep-alive соединениям. Печатается скорость подтверждений
+(200), задержка подтверждения, число отказов 503 и скорость обработки до
+опустошения очереди. Лимиты рассылки Telegram в тесте сняты, если не заданы
+TELEGRAM_GLOBAL_RATE / TELEGRAM_PER_CHAT_RATE.
+
+Использование:
+    python3 webhook_loadtest.py
+    python3 webhook_loadtest.py --updates 20000 --connections 50 --chats 500 --queue-size 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Заглушки обязательных переменных: тест не обращается к настоящим сервисам
+for _name, _value in (
+    ("FINOLOG_API_KEY", "loadtest"),
+    ("FINOLOG_BIZ_ID", "1"),
+    ("MAIN_BOT_TOKEN", "loadtest"),
+    ("MAIN_BOT_ALLOWED_USERS", "1"),
+    ("TEST_BOT_TOKEN", "loadtest"),
+    ("TEST_BOT_ALLOWED_USERS", "1"),
+    ("TELEGRAM_GLOBAL_RATE", "100000"),
+    ("TELEGRAM_PER_CHAT_RATE", "100000"),
+    ("FORECAST_CACHE", "0"),
+    ("FORECAST_HISTORY", "0"),
+):
+    os.environ.setdefault(_name, _value)
+
+COMMANDS = ('/balance', '/breaches', '/forecast 100000', '/help')
+
+
+class FakeTelegramClient:
+    """Отправляет обновления на webhook как Telegram: POST JSON по keep-alive соединениям"""
+
+    def __init__(self, host, port, path, secret=None):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.statuses = {}
+        self.latencies = []
+
+    @staticmethod
+    def make_update(update_id, chat_id, text):
+        return {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Load'},
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': text,
+            },
+        }
+
+    async def _connection(self, updates):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            for update in updates:
+                body = json.dumps(update).encode('utf-8')
+                head = (f"POST {self.path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n")
+                if self.secret:
+                    head += f"X-Telegram-Bot-Api-Secret-Token: {self.secret}\r\n"
+                started = time.perf_counter()
+                writer.write(head.encode('ascii') + b"\r\n" + body)
+                await writer.drain()
+                status_line = await reader.readline()
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':', 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.latencies.append(time.perf_counter() - started)
+                status = int(status_line.split()[1])
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    async def post_updates(self, count, connections, chats):
+        """Отправить count обновлений от chats пользователей по connections соединениям"""
+        updates = [self.make_update(index + 1, index % chats + 1, COMMANDS[index % len(COMMANDS)])
+                   for index in range(count)]
+        await asyncio.gather(*(self._connection(updates[offset::connections]) for offset in range(connections)))
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест webhook_server.py")
+    parser.add_argument('--updates', type=int, default=5000, help="число обновлений")
+    parser.add_argument('--connections', type=int, default=20, help="параллельных соединений клиента")
+    parser.add_argument('--chats', type=int, default=200, help="число разных пользователей")
+    parser.add_argument('--queue-size', type=int, help="размер очереди (по умолчанию WEBHOOK_QUEUE_SIZE)")
+    parser.add_argument('--workers', type=int, help="воркеров очереди (по умолчанию WEBHOOK_WORKERS)")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа заглушки Telegram, секунд")
+    args = parser.parse_args(argv)
+
+    stub = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve().parent / "finolog_stub.py"),
+         "--accounts", "20", "--transactions", "2000", "--latency", str(args.latency)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    stub_url = f"http://127.0.0.1:{int(stub.stdout.readline())}"
+    os.environ['FINOLOG_BASE_URL'] = stub_url
+    os.environ['TELEGRAM_API_URL'] = stub_url
+
+    from bot_commands import AnalysisCache
+    from webhook_server import WebhookBot, WebhookServer
+
+    cache = AnalysisCache()
+    cache.get(wait=True)
+    bots = {'main': WebhookBot('main', 'loadtest', list(range(1, args.chats + 1)))}
+    server = WebhookServer(bots, cache, queue_size=args.queue_size, workers=args.workers)
+
+    # Сервер - в своем потоке и цикле событий, как отдельный процесс
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    host, port = asyncio.run_coroutine_threadsafe(server.start('127.0.0.1', 0), loop).result()
+
+    client = FakeTelegramClient(host, port, '/main')
+    started = time.perf_counter()
+    asyncio.run(client.post_updates(args.updates, args.connections, args.chats))
+    acked = time.perf_counter() - started
+    asyncio.run_coroutine_threadsafe(server.queue.join(), loop).result()
+    drained = time.perf_counter() - started
+
+    print(f"📨 Обновлений: {args.updates}, соединений {args.connections}, "
+          f"очередь {server.queue_size}, воркеров {server.workers}")
+    print(f"✅ Подтверждено за {acked:.2f} с: {args.updates / acked:,.0f} обновлений/с, "
+          f"коды {dict(sorted(client.statuses.items()))}")
+    print(f"⏱ Задержка подтверждения: p50 {_percentile(client.latencies, 0.5) * 1000:.2f} мс, "
+          f"p99 {_percentile(client.latencies, 0.99) * 1000:.2f} мс")
+    print(f"⚙️ Обработано за {drained:.2f} с: {server.stats['processed'] / drained:,.0f} обновлений/с, "
+          f"{server.stats}")
+
+    asyncio.run_coroutine_threadsafe(server.stop(drain=False), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    cache.close()
+    stub.terminate()
+    stub.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
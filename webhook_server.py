@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Прием обновлений Telegram через webhook (альтернатива long polling в bot_commands.py).
+
+Локальный HTTP сервер на asyncio принимает POST /<бот> (main, test из
+contacts.py), сразу отвечает 200 и кладет обновление в ограниченную очередь
+(WEBHOOK_QUEUE_SIZE). Воркеры очереди строят ответ из кеша анализа
+(AnalysisCache, без обращения к Finolog) и отправляют его в пуле потоков,
+поэтому цикл событий не блокируется ни на Finolog, ни на Telegram.
+Переполненная очередь отвечает 503 - Telegram повторит доставку позже.
+Если задан WEBHOOK_SECRET, принимаются только запросы с заголовком
+X-Telegram-Bot-Api-Secret-Token.
+
+Использование:
+    python3 webhook_server.py
+    python3 webhook_server.py --set-webhook https://example.org/watchdog
+Нагрузочный тест: webhook_loadtest.py
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+import sys
+
+from config import WEBHOOK_CONFIG
+from bot_commands import AnalysisCache, deliver_reply, reply_for_update
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+MAX_BODY_BYTES = 1024 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+
+class WebhookBot:
+    """Бот, обновления которого принимает сервер"""
+
+    def __init__(self, name, bot_token, allowed_users, is_test=False):
+        self.name = name
+        self.bot_token = bot_token
+        self.allowed_users = allowed_users
+        self.is_test = is_test
+
+    def send(self, chat_id, text):
+        from telegram_functions import send_telegram_message_wrapper
+        return send_telegram_message_wrapper(self.bot_token, chat_id, text, self.is_test, detailed=True)
+
+
+def bots_from_contacts():
+    """Основной и тестовый бот из contacts.py: {путь: WebhookBot}"""
+    from contacts import MAIN_BOT_CONFIG, TEST_BOT_CONFIG
+    return {
+        'main': WebhookBot('main', MAIN_BOT_CONFIG['bot_token'], MAIN_BOT_CONFIG['allowed_users']),
+        'test': WebhookBot('test', TEST_BOT_CONFIG['bot_token'], TEST_BOT_CONFIG['allowed_users'], is_test=True),
+    }
+
+
+class WebhookServer:
+    """HTTP сервер webhook с очередью задач и воркерами"""
+
+    def __init__(self, bots, cache, secret=None, queue_size=None, workers=None):
+        self.bots = bots
+        self.cache = cache
+        self.secret = secret
+        self.queue_size = queue_size or WEBHOOK_CONFIG['queue_size']
+        self.workers = workers or WEBHOOK_CONFIG['workers']
+        self.stats = {'received': 0, 'rejected': 0, 'processed': 0, 'replied': 0, 'failed': 0}
+        self.queue = None
+        self._server = None
+        self._tasks = []
+
+    async def start(self, host=None, port=None):
+        """Запустить прием и воркеры; возвращает (host, port)"""
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            WEBHOOK_CONFIG['host'] if host is None else host,
+            WEBHOOK_CONFIG['port'] if port is None else port
+        )
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self, drain=True):
+        """Остановить прием; при drain - дождаться обработки очереди"""
+        self._server.close()
+        await self._server.wait_closed()
+        if drain:
+            await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _handle_connection(self, reader, writer):
+        """Запросы одного keep-alive соединения"""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                if isinstance(request, int):
+                    status, keep_alive = request, False
+                else:
+                    status, keep_alive = self._accept(*request)
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Length: 0\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('ascii')
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """
+        (метод, путь, заголовки, тело), None, если клиент закрыл соединение,
+        или код ошибки, если запрос нельзя прочитать
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            return 400
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            return 400
+        if length < 0:
+            return 400
+        if length > MAX_BODY_BYTES:
+            return 413
+        body = await reader.readexactly(length) if length else b''
+        return parts[0], parts[1], headers, body
+
+    def _accept(self, method, path, headers, body):
+        """Проверить запрос и поставить обновление в очередь; возвращает (код, keep-alive)"""
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        bot = self.bots.get(path.strip('/'))
+        if bot is None:
+            return 404, keep_alive
+        if method != 'POST':
+            return 405, keep_alive
+        if self.secret and headers.get(SECRET_HEADER) != self.secret:
+            return 403, keep_alive
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return 400, keep_alive
+        if not isinstance(update, dict):
+            return 400, keep_alive
+
+        self.stats['received'] += 1
+        try:
+            self.queue.put_nowait((bot, update))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            return 503, keep_alive
+        return 200, keep_alive
+
+    async def _worker(self):
+        """Ответ из кеша в цикле событий, отправка - в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        while True:
+            bot, update = await self.queue.get()
+            try:
+                reply = reply_for_update(update, bot.allowed_users, self.cache)
+                if reply:
+                    chat_id, text = reply
+                    result = await loop.run_in_executor(None, deliver_reply, bot.send, chat_id, text)
+                    self.stats['replied' if result['ok'] else 'failed'] += 1
+            except Exception as e:
+                # Воркер не должен завершиться ни на каком обновлении
+                self.stats['failed'] += 1
+                print(f"❌ Ошибка обработки обновления {repr(update)[:200]}: {e}")
+            finally:
+                self.stats['processed'] += 1
+                self.queue.task_done()
+
+
+def set_webhooks(bots, public_url, secret=None):
+    """Зарегистрировать <public_url>/<бот> как webhook каждого бота"""
+    from telegram_functions import call_telegram_api
+
+    ok = True
+    for name, bot in bots.items():
+        data = {'url': f"{public_url.rstrip('/')}/{name}", 'allowed_updates': '["message"]'}
+        if secret:
+            data['secret_token'] = secret
+        result = call_telegram_api(bot.bot_token, 'setWebhook', data)
+        if result['ok']:
+            print(f"✅ Webhook {name}: {data['url']}")
+        else:
+            print(f"❌ Webhook {name}: {result['description']}")
+            ok = False
+    return ok
+
+
+async def serve(bots, cache, secret=None):
+    """Работать до SIGTERM/SIGINT"""
+    server = WebhookServer(bots, cache, secret=secret)
+    host, port = await server.start()
+    print(f"🚀 Webhook на http://{host}:{port}/{{{','.join(bots)}}}, очередь {server.queue_size}, "
+          f"воркеров {server.workers}", flush=True)
+    cache.refresh()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop_event.set)
+    await stop_event.wait()
+
+    print("🛑 Получен сигнал, завершаем работу...", flush=True)
+    await server.stop()
+    cache.close()
+    print(f"👋 Webhook остановлен: {server.stats}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Прием обновлений Telegram через webhook")
+    parser.add_argument('--set-webhook', metavar='URL', help="зарегистрировать URL/<бот> в Telegram и выйти")
+    args = parser.parse_args(argv)
+
+    bots = bots_from_contacts()
+    if args.set_webhook:
+        return 0 if set_webhooks(bots, args.set_webhook, WEBHOOK_CONFIG['secret']) else 1
+    asyncio.run(serve(bots, AnalysisCache(), WEBHOOK_CONFIG['secret']))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())